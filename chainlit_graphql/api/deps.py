@@ -1,5 +1,6 @@
 import typing
 
+from fastapi import Header, HTTPException
 from strawberry.permission import BasePermission
 from strawberry.types import Info
 from chainlit_graphql.service.apikey import ApikeyService
@@ -17,3 +18,14 @@ class IsValidApiKey(BasePermission):
         if apikey:
             return apikey_service.validate_apikey(apikey)
         return False
+
+
+async def valid_api_key(x_api_key: typing.Optional[str] = Header(default=None)):
+    """
+    FastAPI dependency for the REST endpoints, same check as `IsValidApiKey`.
+    """
+    apikey_service = ApikeyService(apikey_repo)
+    apikey = await apikey_service.validate_apikey(x_api_key) if x_api_key else None
+    if not apikey:
+        raise HTTPException(status_code=401, detail=IsValidApiKey.message)
+    return apikey
@@ -1,4 +1,4 @@
-from .endpoint import upload_routes
+from .endpoint import export_routes, import_routes, thread_routes, upload_routes
 from .graphql import graphql_app
 
 from fastapi import APIRouter
@@ -6,4 +6,7 @@ from fastapi import APIRouter
 api_router = APIRouter()
 
 api_router.include_router(upload_routes.router)
+api_router.include_router(import_routes.router)
+api_router.include_router(export_routes.router)
+api_router.include_router(thread_routes.router)
 api_router.include_router(graphql_app.router, prefix="/graphql")
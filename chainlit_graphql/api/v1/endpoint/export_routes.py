@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from chainlit_graphql.api.deps import valid_api_key
+from chainlit_graphql.service.bulk_export import ExportService
+from chainlit_graphql.repository.bulk_export import bulk_export_repo
+from datetime import datetime
+from typing import Optional
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+
+@router.get("", dependencies=[Depends(valid_api_key)])
+async def export_ndjson(
+    participantId: Optional[str] = None,
+    environment: Optional[str] = None,
+    createdAfter: Optional[datetime] = None,
+    createdBefore: Optional[datetime] = None,
+):
+    """
+    Streams the matching threads with their participants, steps and scores as
+    NDJSON, the format accepted by /import.
+    """
+    export_service = ExportService(bulk_export_repo)
+    return StreamingResponse(
+        export_service.export_ndjson(
+            participantId=participantId,
+            environment=environment,
+            createdAfter=createdAfter,
+            createdBefore=createdBefore,
+        ),
+        media_type="application/x-ndjson",
+    )
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from chainlit_graphql.api.deps import valid_api_key
+from chainlit_graphql.service.bulk_import import ImportService
+from chainlit_graphql.repository.bulk_import import bulk_import_repo
+from typing import AsyncIterable, AsyncIterator
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/import", tags=["import"])
+
+
+async def _iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    # The body is streamed in arbitrary chunks, split them back into lines
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+@router.post("", dependencies=[Depends(valid_api_key)])
+async def import_ndjson(request: Request):
+    """
+    Imports an NDJSON body of participants, threads, steps and scores.
+
+    The response streams one NDJSON progress report per written batch. Batches
+    are committed as they go and the import is idempotent, so a failed import
+    can be sent again.
+    """
+    import_service = ImportService(bulk_import_repo)
+    reports = import_service.import_ndjson(_iter_lines(request.stream()))
+
+    # An invalid record of the first batch is reported with the status
+    try:
+        first_report = await anext(reports)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def progress():
+        yield json.dumps(first_report) + "\n"
+        try:
+            async for report in reports:
+                yield json.dumps(report) + "\n"
+        except Exception as e:
+            # The status is already sent, report the failure in the stream
+            logger.exception("Import failed")
+            yield json.dumps({"error": str(e), "done": True}) + "\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
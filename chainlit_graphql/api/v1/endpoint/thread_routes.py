@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from chainlit_graphql.api.deps import valid_api_key
+from chainlit_graphql.service.thread_stream import CONTENT_TYPE, ThreadStreamService
+from chainlit_graphql.repository.thread_stream import thread_stream_repo
+
+router = APIRouter(prefix="/threads", tags=["threads"])
+
+
+@router.get("/{thread_id}/stream", dependencies=[Depends(valid_api_key)])
+async def stream_thread_detail(thread_id: str):
+    """
+    Streams the threadDetail of a thread as a multipart/mixed incremental
+    response: the thread first, then its steps chunk by chunk.
+    """
+    thread_stream_service = ThreadStreamService(thread_stream_repo)
+    return StreamingResponse(
+        thread_stream_service.stream_thread_detail(thread_id),
+        media_type=CONTENT_TYPE,
+    )
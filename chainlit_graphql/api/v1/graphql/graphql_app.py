@@ -1,7 +1,18 @@
 import strawberry
-from strawberry.fastapi import GraphQLRouter
+from strawberry.extensions import ParserCache, ValidationCache
+from chainlit_graphql.core.config import settings
+from .loaders import get_context
+from .router import ChainlitGraphQLRouter
 from .resolver.query import Query
 from .resolver.mutation import Mutation
 
-schema = strawberry.Schema(query=Query, mutation=Mutation)
-router = GraphQLRouter(schema)
+schema = strawberry.Schema(
+    query=Query,
+    mutation=Mutation,
+    # Repeated queries, persisted ones included, are parsed and validated once
+    extensions=[
+        ParserCache(maxsize=settings.PERSISTED_QUERY_CACHE_SIZE),
+        ValidationCache(maxsize=settings.PERSISTED_QUERY_CACHE_SIZE),
+    ],
+)
+router = ChainlitGraphQLRouter(schema, context_getter=get_context)
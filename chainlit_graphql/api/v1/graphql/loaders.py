@@ -0,0 +1,105 @@
+from datetime import datetime
+from typing import List, Optional
+
+from strawberry.dataloader import DataLoader
+from strawberry.types import Info
+
+from chainlit_graphql.core.mappers import MapperUtility
+from chainlit_graphql.repository.participant import participant_repo
+from chainlit_graphql.repository.score import score_repo
+from chainlit_graphql.repository.step import step_repo
+from .schema.participant import ParticipantType
+from .schema.score import Score
+from .schema.step import StepsType
+from .schema.thread import StepConnection
+from .selection import step_connection_projection
+
+
+class Loaders:
+    """
+    DataLoaders of a GraphQL request.
+
+    Related rows are only read when their field is selected, and the keys
+    requested by all the objects of a response are read with one query.
+    """
+
+    def __init__(self):
+        self.steps_by_thread_id = DataLoader(load_fn=self._load_steps)
+        self.scores_by_step_id = DataLoader(load_fn=self._load_scores)
+        self.participant_by_id = DataLoader(load_fn=self._load_participants)
+        # Keyed by (thread id, first, after, types, since, columns)
+        self.step_page = DataLoader(load_fn=self._load_step_pages)
+
+    @staticmethod
+    async def _load_steps(thread_ids: List[str]) -> List[List[StepsType]]:
+        steps = await step_repo.get_by_thread_ids(thread_ids)
+        return [
+            [
+                await MapperUtility.map_step_to_stepstype(step)
+                for step in steps.get(thread_id, [])
+            ]
+            for thread_id in thread_ids
+        ]
+
+    async def load_step_page(
+        self,
+        thread_id: str,
+        first: Optional[int],
+        after: Optional[str],
+        types: Optional[List[str]],
+        since: Optional[datetime],
+        info: Optional[Info] = None,
+    ) -> StepConnection:
+        columns = step_connection_projection(info)
+        return await self.step_page.load(
+            (
+                thread_id,
+                first,
+                after,
+                tuple(types) if types is not None else None,
+                since,
+                tuple(columns) if columns is not None else None,
+            )
+        )
+
+    @staticmethod
+    async def _load_step_pages(keys: List[tuple]) -> List[StepConnection]:
+        # One window query per distinct arguments, usually one for all threads
+        groups = {}
+        for thread_id, *arguments in keys:
+            groups.setdefault(tuple(arguments), []).append(thread_id)
+
+        pages = {}
+        for arguments, thread_ids in groups.items():
+            first, after, types, since, columns = arguments
+            for thread_id, page in (
+                await step_repo.get_pages(
+                    thread_ids,
+                    first=first,
+                    after=after,
+                    types=list(types) if types is not None else None,
+                    since=since,
+                    columns=list(columns) if columns is not None else None,
+                )
+            ).items():
+                pages[(thread_id, *arguments)] = page
+        return [pages[key] for key in keys]
+
+    @staticmethod
+    async def _load_scores(step_ids: List[str]) -> List[List[Score]]:
+        scores = await score_repo.get_by_step_ids(step_ids)
+        return [
+            await MapperUtility.map_scores_to_scoretypes(scores.get(step_id, []))
+            for step_id in step_ids
+        ]
+
+    @staticmethod
+    async def _load_participants(
+        participant_ids: List[str],
+    ) -> List[Optional[ParticipantType]]:
+        participants = await participant_repo.get_by_ids(participant_ids)
+        return [participants.get(participant_id) for participant_id in participant_ids]
+
+
+async def get_context() -> dict:
+    return {"loaders": Loaders()}
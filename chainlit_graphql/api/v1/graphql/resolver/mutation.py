@@ -1,6 +1,7 @@
-from chainlit_graphql.api.v1.graphql.schema.score import Score, ScoreType
+from chainlit_graphql.api.v1.graphql.schema.score import Score, ScoreInput, ScoreType
 from chainlit_graphql.service.score import ScoreService
 import strawberry
+from strawberry.types import Info
 from typing import Optional, List
 
 from chainlit_graphql.api.deps import IsValidApiKey
@@ -16,8 +17,10 @@ from ..schema.step import (
     ScorePayloadInput,
     StepsType,
     StepType,
+    StepInput,
     GenerationPayloadInput,
 )
+from ..selection import step_returning_columns
 from ..schema.thread import ThreadType
 from ..schema.participant import ParticipantType
 from ..scalars.json_scalar import Json
@@ -90,6 +93,7 @@ class Mutation:
         scores: Optional[List[ScorePayloadInput]] = None,
         generation: Optional[GenerationPayloadInput] = None,
         attachments: Optional[List[AttachmentPayloadInput]] = None,
+        info: Info = None,
     ) -> Optional[StepsType]:
         step_service = StepService(step_repo)
         return await step_service.upsert(
@@ -108,6 +112,16 @@ class Mutation:
             scores,
             generation,
             attachments,
+            returning=step_returning_columns(info),
+        )
+
+    @strawberry.mutation(permission_classes=[IsValidApiKey])
+    async def ingestSteps(
+        self, steps: List[StepInput], info: Info = None
+    ) -> List[StepsType]:
+        step_service = StepService(step_repo)
+        return await step_service.upsert_many(
+            steps, returning=step_returning_columns(info)
         )
 
     @strawberry.mutation(permission_classes=[IsValidApiKey])
@@ -148,6 +162,11 @@ class Mutation:
             tags=tags,
         )
 
+    @strawberry.mutation(permission_classes=[IsValidApiKey])
+    async def createScores(self, scores: List[ScoreInput]) -> List[Score]:
+        score_service = ScoreService(score_repository=score_repo)
+        return await score_service.add_scores(scores)
+
     @strawberry.mutation(permission_classes=[IsValidApiKey])
     async def updateScore(
         self,
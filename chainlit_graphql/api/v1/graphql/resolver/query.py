@@ -1,4 +1,5 @@
 import strawberry
+from strawberry.types import Info
 
 from chainlit_graphql.service.participant import ParticipantService
 from chainlit_graphql.service.thread import ThreadService
@@ -12,6 +13,7 @@ from ..schema.thread import (
     ThreadConnection,
     ThreadsOrderByInput,
 )
+from ..selection import thread_detail_projection, threads_projection
 from chainlit_graphql.api.deps import IsValidApiKey
 from datetime import datetime
 
@@ -29,9 +31,9 @@ class Query:
         return await participant_service.get_by_id(id, identifier)
 
     @strawberry.field(permission_classes=[IsValidApiKey])
-    async def threadDetail(self, id: str) -> ThreadType:
+    async def threadDetail(self, id: str, info: Info = None) -> ThreadType:
         thread_service = ThreadService(thread_repo)
-        return await thread_service.get_by_id(id)
+        return await thread_service.get_by_id(id, thread_detail_projection(info))
 
     @strawberry.field(permission_classes=[IsValidApiKey])
     async def participant(
@@ -52,6 +54,7 @@ class Query:
         last: Optional[int] = None,
         projectId: Optional[str] = None,
         skip: Optional[int] = None,
+        info: Info = None,
     ) -> ThreadConnection:
         # if filters.operator not in [
         #     operator.value for operator in FilterOperator
@@ -67,4 +70,6 @@ class Query:
             last=last,
             projectId=projectId,
             skip=skip,
+            projection=threads_projection(info),
+            orderBy=orderBy,
         )
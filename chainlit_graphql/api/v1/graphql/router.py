@@ -0,0 +1,215 @@
+import hashlib
+import json
+from typing import Optional
+
+from fastapi import Request, Response
+from graphql import DocumentNode, GraphQLError
+from strawberry.http import GraphQLRequestData
+from strawberry.http.async_base_view import AsyncHTTPRequestAdapter
+from strawberry.extensions import ParserCache
+from strawberry.http.exceptions import HTTPException
+from strawberry.fastapi import GraphQLRouter
+from strawberry.schema.execute import parse_document
+from strawberry.types import ExecutionResult
+from strawberry.unset import UNSET
+
+from chainlit_graphql.repository.apikey import apikey_repo
+from chainlit_graphql.service.apikey import ApikeyService
+from chainlit_graphql.service.idempotency import idempotency_service
+from chainlit_graphql.service.persisted_query import (
+    PersistedQueryError,
+    persisted_query_service,
+)
+from chainlit_graphql.service.thread_etag import thread_etag_service
+
+
+class ChainlitGraphQLRouter(GraphQLRouter):
+    """
+    GraphQL router honoring the Idempotency-Key and If-None-Match headers and
+    automatic persisted queries.
+
+    A POST sent again with the same key gets the response of the first one
+    without being executed, so a retried mutation is applied once. Queries
+    that only read threads get an ETag, and a 304 without being executed when
+    it matches If-None-Match. A query can be sent as the hash of a persisted
+    query, in a POST or a GET.
+    """
+
+    async def run(
+        self,
+        request: Request,
+        context: Optional[dict] = UNSET,
+        root_value: Optional[object] = UNSET,
+    ) -> Response:
+        idempotency_key = request.headers.get("idempotency-key")
+        if request.method != "POST" or not idempotency_key:
+            return await self._run_conditional(request, context, root_value)
+
+        # Keys are only unique per caller
+        key = hashlib.sha256(
+            f"{request.headers.get('x-api-key', '')}\0{idempotency_key}".encode()
+        ).hexdigest()
+        fingerprint = hashlib.sha256(await request.body()).hexdigest()
+
+        record = await idempotency_service.claim(key, fingerprint)
+        if record is not None:
+            stored_fingerprint, stored_response = record
+            if stored_fingerprint != fingerprint:
+                raise HTTPException(
+                    422, "Idempotency-Key was already used for another request"
+                )
+            if stored_response is None:
+                raise HTTPException(
+                    409, "A request with this Idempotency-Key is in progress"
+                )
+            return Response(
+                stored_response,
+                media_type="application/json",
+                headers={"Idempotent-Replayed": "true"},
+            )
+
+        try:
+            response = await super().run(request, context, root_value)
+        except BaseException:
+            await idempotency_service.release(key)
+            raise
+
+        # Failed requests are not remembered, their retry is executed again
+        if response.status_code == 200 and not json.loads(response.body).get("errors"):
+            await idempotency_service.complete(key, fingerprint, response.body.decode())
+        else:
+            await idempotency_service.release(key)
+
+        return response
+
+    async def _run_conditional(
+        self, request: Request, context: Optional[dict], root_value: Optional[object]
+    ) -> Response:
+        params = await _graphql_params(request)
+        document = self._parse_document(params["query"]) if params else None
+        if document is None or not thread_etag_service.reads_threads(
+            document, params["operation_name"]
+        ):
+            return await super().run(request, context, root_value)
+
+        # No ETag work for a request whose resolvers would reject it
+        if not await _valid_apikey(request):
+            return await super().run(request, context, root_value)
+
+        if_none_match = {
+            tag.strip() for tag in request.headers.get("if-none-match", "").split(",")
+        }
+        etag = await thread_etag_service.etag(self.schema, document, **params)
+        if etag in if_none_match:
+            # Known before executing the query, the resolvers are skipped
+            return Response(status_code=304, headers={"ETag": etag})
+
+        response = await super().run(request, context, root_value)
+        if (
+            etag is None
+            or response.status_code != 200
+            or json.loads(response.body).get("errors")
+        ):
+            return response
+
+        response.headers["ETag"] = etag
+        if request.method == "GET":
+            # Responses depend on the api key, clients revalidate them
+            response.headers["Cache-Control"] = "private, no-cache"
+            response.headers["Vary"] = "x-api-key"
+        return response
+
+    def _parse_document(self, query: Optional[str]) -> Optional[DocumentNode]:
+        # Through the ParserCache of the schema, the execution of the query
+        # reuses the document
+        if not query:
+            return None
+        parse = parse_document
+        for extension in self.schema.extensions:
+            if isinstance(extension, ParserCache):
+                parse = extension.cached_parse_document
+        try:
+            return parse(query)
+        except GraphQLError:
+            return None
+
+    async def parse_http_body(
+        self, request: AsyncHTTPRequestAdapter
+    ) -> GraphQLRequestData:
+        content_type = request.content_type or ""
+
+        if "application/json" in content_type:
+            data = self.parse_json(await request.get_body())
+        elif content_type.startswith("multipart/form-data"):
+            data = await self.parse_multipart(request)
+        elif request.method == "GET":
+            data = self.parse_query_params(request.query_params)
+        else:
+            raise HTTPException(400, "Unsupported content type")
+
+        extensions = data.get("extensions")
+        if isinstance(extensions, str):
+            # JSON encoded in the query string of a GET
+            extensions = self.parse_json(extensions)
+
+        query = await persisted_query_service.resolve(data.get("query"), extensions)
+        if data.get("query") is not None and isinstance(extensions, dict):
+            # Registered by execute_operation, once the request has succeeded
+            request.request.state.persisted_query = (query, extensions)
+        return GraphQLRequestData(
+            query=query,
+            variables=data.get("variables"),
+            operation_name=data.get("operationName"),
+        )
+
+    async def execute_operation(
+        self, request: Request, context: dict, root_value: Optional[object]
+    ) -> ExecutionResult:
+        try:
+            result = await super().execute_operation(request, context, root_value)
+        except PersistedQueryError as e:
+            # The client sends the query text along with its hash again
+            return ExecutionResult(
+                data=None, errors=[GraphQLError(str(e), extensions={"code": e.code})]
+            )
+
+        # Unauthenticated clients cannot fill the persisted queries, a query
+        # without resolvers succeeds without an api key
+        registration = getattr(request.state, "persisted_query", None)
+        if registration and not result.errors and await _valid_apikey(request):
+            await persisted_query_service.register(*registration)
+        return result
+
+
+async def _valid_apikey(request: Request) -> bool:
+    apikey = request.headers.get("x-api-key")
+    if not apikey:
+        return False
+    return bool(await ApikeyService(apikey_repo).validate_apikey(apikey))
+
+
+async def _graphql_params(request: Request) -> Optional[dict]:
+    # The query of a GET or JSON POST request, None for other requests
+    try:
+        if request.method == "GET":
+            data = dict(request.query_params)
+            for name in ("variables", "extensions"):
+                data[name] = json.loads(data[name]) if data.get(name) else None
+        elif request.method == "POST" and request.headers.get(
+            "content-type", ""
+        ).startswith("application/json"):
+            data = json.loads(await request.body())
+        else:
+            return None
+        if not isinstance(data, dict):
+            return None
+        return {
+            "query": await persisted_query_service.resolve(
+                data.get("query"), data.get("extensions")
+            ),
+            "variables": data.get("variables"),
+            "operation_name": data.get("operationName"),
+        }
+    except ValueError:
+        # Including PersistedQueryError, reported when the query is executed
+        return None
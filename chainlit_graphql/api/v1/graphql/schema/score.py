@@ -20,3 +20,15 @@ class Score:
     datasetExperimentItemId: Optional[str]
     comment: Optional[str]
     tags: Optional[List[str]]
+
+
+@strawberry.input
+class ScoreInput:
+    name: str
+    type: ScoreType
+    value: float
+    stepId: Optional[str] = None
+    generationId: Optional[str] = None
+    datasetExperimentItemId: Optional[str] = None
+    comment: Optional[str] = None
+    tags: Optional[List[str]] = None
@@ -1,5 +1,6 @@
 from chainlit_graphql.api.v1.graphql.schema.score import Score, ScoreType
 import strawberry
+from strawberry.types import Info
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
@@ -108,6 +109,24 @@ class ScorePayloadInput:
     value: float
 
 
+@strawberry.input
+class StepInput:
+    id: str
+    threadId: Optional[str] = None
+    startTime: Optional[datetime] = None
+    endTime: Optional[datetime] = None
+    type: Optional[StepType] = None
+    error: Optional[str] = None
+    input: Optional[Json] = None
+    output: Optional[Json] = None
+    metadata: Optional[Json] = None
+    parentId: Optional[str] = None
+    name: Optional[str] = None
+    tags: Optional[List[str]] = None
+    generation: Optional[GenerationPayloadInput] = None
+    attachments: Optional[List[AttachmentPayloadInput]] = None
+
+
 @strawberry.type
 class StepsType:
     id: str
@@ -123,8 +142,15 @@ class StepsType:
     output: Optional[Json] = None
     metadata: Optional[Json] = None
     name: Optional[str] = None
-    scores: Optional[List[Score]] = None
     generation: Optional[GenerationType] = None
     attachments: Optional[List[AttachmentType]] = None
     ok: Optional[bool] = True
     message: Optional[str] = "Step added success"
+    # Set when loaded with the step, otherwise resolved by the request's loaders
+    preloaded_scores: strawberry.Private[Optional[List[Score]]] = None
+
+    @strawberry.field
+    async def scores(self, info: Info) -> Optional[List[Score]]:
+        if self.preloaded_scores is not None:
+            return self.preloaded_scores
+        return await info.context["loaders"].scores_by_step_id.load(self.id)
@@ -1,13 +1,33 @@
 import strawberry
 from strawberry import relay
-from .step import StepsType
+from strawberry.types import Info
+from .step import StepsType, StepType
 from .participant import ParticipantType
 from ..scalars.json_scalar import Json, Unknown
-from typing import Optional, List
+from typing import Awaitable, Callable, Optional, List
 from datetime import datetime
 from enum import Enum
 
 
+@strawberry.type
+class PageInfo:
+    has_next_page: Optional[bool] = None
+    has_previous_page: Optional[bool] = None
+    start_cursor: Optional[str] = None
+    end_cursor: Optional[str] = None
+
+
+@strawberry.type
+class StepEdge(relay.Edge):
+    node: Optional[StepsType] = None
+
+
+@strawberry.type
+class StepConnection(relay.Connection):
+    edges: Optional[List[StepEdge]] = None
+    page_info: Optional[PageInfo] = None
+
+
 @strawberry.type
 class ThreadType(relay.Node):
     id: relay.NodeID[str]
@@ -18,9 +38,46 @@ class ThreadType(relay.Node):
     tags: Optional[List[str]] = None
     createdAt: datetime = None
     participant_id: Optional[str] = None
-    steps: Optional[List[StepsType]] = None
-    participant: Optional[ParticipantType] = None
     duration: Optional[int] = None
+    # Set when loaded with the thread, otherwise resolved by the request's loaders
+    preloaded_steps: strawberry.Private[Optional[List[StepsType]]] = None
+    preloaded_participant: strawberry.Private[Optional[ParticipantType]] = None
+
+    @strawberry.field
+    async def steps(self, info: Info) -> Optional[List[StepsType]]:
+        if self.preloaded_steps is not None:
+            return self.preloaded_steps
+        return await info.context["loaders"].steps_by_thread_id.load(self.id)
+
+    @strawberry.field
+    async def steps_connection(
+        self,
+        info: Info,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        types: Optional[List[StepType]] = None,
+        since: Optional[datetime] = None,
+    ) -> StepConnection:
+        # A window of the steps in creation order, for threads too long to list.
+        # steps stays the whole list, which Chainlit's data layer reads
+        return await info.context["loaders"].load_step_page(
+            self.id,
+            first,
+            after,
+            [type.value for type in types] if types is not None else None,
+            since,
+            info,
+        )
+
+    @strawberry.field
+    async def participant(self, info: Info) -> Optional[ParticipantType]:
+        if self.preloaded_participant is not None:
+            return self.preloaded_participant
+        if self.participant_id is None:
+            return None
+        return await info.context["loaders"].participant_by_id.load(
+            self.participant_id
+        )
 
 
 @strawberry.type
@@ -28,19 +85,20 @@ class ThreadEdge(relay.Edge):
     node: Optional[ThreadType] = None
 
 
-@strawberry.type
-class PageInfo:
-    has_next_page: Optional[bool] = None
-    has_previous_page: Optional[bool] = None
-    start_cursor: Optional[str] = None
-    end_cursor: Optional[str] = None
-
-
 @strawberry.type
 class ThreadConnection(relay.Connection):
     edges: Optional[List[ThreadEdge]] = None
     page_info: Optional[PageInfo] = None
-    total_count: Optional[int] = None
+    # Counts the threads of the query, only called when totalCount is selected
+    count_threads: strawberry.Private[
+        Optional[Callable[[bool], Awaitable[Optional[int]]]]
+    ] = None
+
+    @strawberry.field
+    async def total_count(self, estimated: bool = False) -> Optional[int]:
+        if self.count_threads is None:
+            return None
+        return await self.count_threads(estimated)
 
 
 @strawberry.enum
@@ -146,6 +204,7 @@ class ThreadsFieldEnumType(Enum):
     participantId = "participantId"
     participantIdentifiers = "participantIdentifiers"
     scoreValue = "scoreValue"
+    stepInput = "stepInput"
     stepName = "stepName"
     stepOutput = "stepOutput"
     stepType = "stepType"
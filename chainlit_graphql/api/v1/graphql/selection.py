@@ -0,0 +1,209 @@
+from typing import List, Optional, Set
+
+from strawberry.types import Info
+from strawberry.types.nodes import Selection, SelectedField
+
+# StepsType fields that are plain columns of the steps table
+STEP_COLUMNS_BY_FIELD = {
+    "id": "id",
+    "threadId": "thread_id",
+    "parentId": "parent_id",
+    "startTime": "start_time",
+    "endTime": "end_time",
+    "createdAt": "createdAt",
+    "type": "type",
+    "error": "error",
+    "input": "input",
+    "output": "output",
+    "tags": "tags",
+    "metadata": "meta_data",
+    "name": "name",
+}
+
+# StepsType fields mapped from a JSON payload column
+STEP_PAYLOAD_COLUMNS_BY_FIELD = {
+    "generation": "generation",
+    "attachments": "attachments",
+}
+
+# StepsType fields answered without reading the database
+STEP_ACKNOWLEDGEMENT_FIELDS = {"ok", "message", "__typename"}
+
+# Step columns always loaded, they key the mapped step and its attachments
+STEP_KEY_COLUMNS = {"id", "thread_id", "createdAt"}
+
+# ThreadType fields that are plain columns of the threads table
+THREAD_COLUMNS_BY_FIELD = {
+    "id": "id",
+    "name": "name",
+    "metadata": "meta_data",
+    "environment": "environment",
+    "tags": "tags",
+    "createdAt": "createdAt",
+    "participantId": "participant_id",
+    "tokenCount": "token_count",
+    "duration": "duration",
+}
+
+# Thread columns always loaded, they key the thread, its cursor and its participant
+THREAD_KEY_COLUMNS = {"id", "createdAt", "participant_id"}
+
+
+class ThreadProjection:
+    """
+    The part of the threads table and of its relations a query selects.
+
+    :param thread_columns: The thread columns to load.
+    :param step_columns: The step columns to load with the threads, or None when
+        the steps are not selected.
+    :param step_scores: Whether the scores of the steps are selected.
+    :param participant: Whether the participant of the threads is selected.
+    """
+
+    def __init__(
+        self,
+        thread_columns: List[str],
+        step_columns: Optional[List[str]] = None,
+        step_scores: bool = False,
+        participant: bool = False,
+    ):
+        self.thread_columns = thread_columns
+        self.step_columns = step_columns
+        self.step_scores = step_scores
+        self.participant = participant
+
+
+def selected_field_names(selections: List[Selection]) -> Set[str]:
+    """
+    Names of the fields in a selection set, including the ones in fragments.
+    """
+    names = set()
+    for selection in selections:
+        if isinstance(selection, SelectedField):
+            names.add(selection.name)
+        else:
+            names |= selected_field_names(selection.selections)
+    return names
+
+
+def child_selections(selections: List[Selection], name: str) -> List[Selection]:
+    """
+    The selections of the fields with the given name, including the ones in fragments.
+    """
+    children = []
+    for selection in selections:
+        if isinstance(selection, SelectedField):
+            if selection.name == name:
+                children.extend(selection.selections)
+        else:
+            children.extend(child_selections(selection.selections, name))
+    return children
+
+
+def step_projection(selections: List[Selection]) -> List[str]:
+    """
+    The columns selected on a StepsType.
+    """
+    field_names = selected_field_names(selections)
+    return sorted(
+        STEP_KEY_COLUMNS
+        | {
+            columns[name]
+            for columns in (STEP_COLUMNS_BY_FIELD, STEP_PAYLOAD_COLUMNS_BY_FIELD)
+            for name in field_names
+            if name in columns
+        }
+    )
+
+
+def thread_projection(selections: List[Selection]) -> ThreadProjection:
+    """
+    The columns and relations selected on a ThreadType.
+    """
+    field_names = selected_field_names(selections)
+    thread_columns = THREAD_KEY_COLUMNS | {
+        THREAD_COLUMNS_BY_FIELD[name]
+        for name in field_names
+        if name in THREAD_COLUMNS_BY_FIELD
+    }
+
+    step_columns = None
+    step_scores = False
+    if "steps" in field_names:
+        step_selections = child_selections(selections, "steps")
+        step_columns = step_projection(step_selections)
+        step_scores = "scores" in selected_field_names(step_selections)
+
+    return ThreadProjection(
+        thread_columns=sorted(thread_columns),
+        step_columns=step_columns,
+        step_scores=step_scores,
+        participant="participant" in field_names,
+    )
+
+
+def thread_detail_projection(info: Optional[Info]) -> Optional[ThreadProjection]:
+    """
+    The projection of a field returning a ThreadType, None loads whole threads.
+    """
+    if info is None:
+        return None
+
+    selections = []
+    for field in info.selected_fields:
+        selections.extend(field.selections)
+    return thread_projection(selections)
+
+
+def threads_projection(info: Optional[Info]) -> Optional[ThreadProjection]:
+    """
+    The projection of the nodes of a field returning a ThreadConnection, None
+    loads whole threads.
+    """
+    if info is None:
+        return None
+
+    selections = []
+    for field in info.selected_fields:
+        selections.extend(field.selections)
+    return thread_projection(
+        child_selections(child_selections(selections, "edges"), "node")
+    )
+
+
+def step_connection_projection(info: Optional[Info]) -> Optional[List[str]]:
+    """
+    The columns of the nodes of a field returning a StepConnection, None loads
+    whole steps.
+    """
+    if info is None:
+        return None
+
+    selections = []
+    for field in info.selected_fields:
+        selections.extend(field.selections)
+    return step_projection(
+        child_selections(child_selections(selections, "edges"), "node")
+    )
+
+
+def step_returning_columns(info: Optional[Info]) -> Optional[List[str]]:
+    """
+    The step columns a mutation has to return, or None when the selection needs
+    the fully mapped step (scores, generation or attachments).
+    """
+    if info is None:
+        return None
+
+    field_names = set()
+    for field in info.selected_fields:
+        field_names |= selected_field_names(field.selections)
+
+    if not field_names <= STEP_COLUMNS_BY_FIELD.keys() | STEP_ACKNOWLEDGEMENT_FIELDS:
+        return None
+
+    return sorted(
+        STEP_COLUMNS_BY_FIELD[name]
+        for name in field_names
+        if name in STEP_COLUMNS_BY_FIELD
+    )
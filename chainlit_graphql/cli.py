@@ -0,0 +1,89 @@
+"""
+Command line tools.
+
+    python -m chainlit_graphql.cli import history.ndjson
+    python -m chainlit_graphql.cli export history.ndjson --environment production
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from contextlib import nullcontext
+from datetime import datetime
+from typing import AsyncIterator
+
+from chainlit_graphql.db.base import create_all
+from chainlit_graphql.db.database import db
+from chainlit_graphql.repository.bulk_export import bulk_export_repo
+from chainlit_graphql.repository.bulk_import import bulk_import_repo
+from chainlit_graphql.service.bulk_export import ExportService
+from chainlit_graphql.service.bulk_import import ImportService
+
+
+async def _read_lines(path: str) -> AsyncIterator[str]:
+    # The std streams are left open for the rest of the process
+    with nullcontext(sys.stdin) if path == "-" else open(path) as file:
+        for line in file:
+            yield line
+
+
+async def import_file(path: str):
+    await create_all()
+    try:
+        import_service = ImportService(bulk_import_repo)
+        async for report in import_service.import_ndjson(_read_lines(path)):
+            print(json.dumps(report), flush=True)
+    finally:
+        await db.close()
+
+
+async def export_file(path: str, **filters):
+    try:
+        export_service = ExportService(bulk_export_repo)
+        with nullcontext(sys.stdout) if path == "-" else open(path, "w") as file:
+            async for chunk in export_service.export_ndjson(**filters):
+                file.write(chunk)
+    finally:
+        await db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m chainlit_graphql.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser(
+        "import", help="Import participants, threads, steps and scores from NDJSON"
+    )
+    import_parser.add_argument("path", help="NDJSON file, - reads stdin")
+
+    export_parser = commands.add_parser(
+        "export", help="Export threads with their participants, steps and scores"
+    )
+    export_parser.add_argument("path", help="NDJSON file, - writes stdout")
+    export_parser.add_argument("--participant-id")
+    export_parser.add_argument("--environment")
+    export_parser.add_argument(
+        "--created-after", type=datetime.fromisoformat, help="ISO 8601 datetime"
+    )
+    export_parser.add_argument(
+        "--created-before", type=datetime.fromisoformat, help="ISO 8601 datetime"
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "import":
+        asyncio.run(import_file(args.path))
+    elif args.command == "export":
+        asyncio.run(
+            export_file(
+                args.path,
+                participantId=args.participant_id,
+                environment=args.environment,
+                createdAfter=args.created_after,
+                createdBefore=args.created_before,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -41,6 +41,77 @@ class Settings(BaseSettings):
 
     LITERAL_API_KEY: Optional[str] = None
 
+    # Ingestion configurations
+    # Steps received before their thread are discarded after this many seconds
+    PENDING_STEP_TTL_SECONDS: int = 60 * 60
+    # "async" acknowledges ingestStep/upsertThread before writing them
+    INGEST_MODE: Literal["sync", "async"] = "sync"
+    INGEST_WORKERS: int = 2
+    INGEST_QUEUE_SIZE: int = 10_000
+    INGEST_BATCH_SIZE: int = 100
+    INGEST_DRAIN_TIMEOUT_SECONDS: int = 30
+    # Items still queued at shutdown or failing every attempt are saved here and
+    # replayed at startup
+    INGEST_SPOOL_PATH: Optional[str] = None
+    INGEST_WRITE_ATTEMPTS: int = 3
+    # Delay before the second attempt, doubled before each following one
+    INGEST_RETRY_DELAY_MS: int = 100
+    # Updates of a step within this window are merged into one write, 0 disables.
+    # Only used with INGEST_MODE "async": the window is held in memory, so sync
+    # mode keeps acknowledging steps once they are written
+    STEP_COALESCE_WINDOW_MS: int = 0
+
+    # Bulk import configurations
+    # Records written per COPY/merge transaction
+    IMPORT_BATCH_SIZE: int = 5_000
+    # Rows fetched per server-side cursor round trip, and lines per chunk
+    EXPORT_FETCH_SIZE: int = 1_000
+
+    # Idempotency-Key header of GraphQL requests
+    # Responses kept in memory, the idempotency_keys table keeps all of them
+    IDEMPOTENCY_CACHE_SIZE: int = 1_000
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 60 * 60
+    # A claimed key whose request has not completed after this long can be retried
+    IDEMPOTENCY_LOCK_SECONDS: int = 60
+
+    # Automatic persisted queries of the GraphQL endpoint
+    # Queries kept in memory by hash, also the size of the parsed and
+    # validated document caches
+    PERSISTED_QUERY_CACHE_SIZE: int = 1_000
+    # Also keep them in the persisted_queries table, shared by all the replicas
+    PERSISTED_QUERY_STORE_DB: bool = False
+    # Rows of the persisted_queries table are deleted after this long
+    PERSISTED_QUERY_TTL_SECONDS: int = 7 * 24 * 60 * 60
+
+    # totalCount of the threads query
+    # Counts are cached per project and filters for this long
+    THREAD_COUNT_CACHE_TTL_SECONDS: int = 30
+    # Estimated counts are only used from this many threads on
+    THREAD_COUNT_ESTIMATE_MIN_ROWS: int = 100_000
+
+    # threadDetail results cached until their thread changes
+    # Size of the in-process cache, 0 disables it
+    THREAD_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # Below the expiry of the signed attachment urls of the cached steps
+    THREAD_CACHE_TTL_SECONDS: int = 30 * 60
+    # "package.module:factory" of a ThreadCacheBackend shared by the replicas,
+    # replaces the in-process cache
+    THREAD_CACHE_BACKEND: Optional[str] = None
+
+    # ETags of the threadDetail and threads responses also change after this
+    # long, below the expiry of the signed attachment urls
+    THREAD_ETAG_WINDOW_SECONDS: int = 30 * 60
+
+    # Streamed threadDetail (/api/threads/{id}/stream)
+    # Steps fetched per server-side cursor round trip and sent per part
+    THREAD_STREAM_CHUNK_SIZE: int = 100
+
+    # Startup migration of json columns to jsonb
+    # Rows copied per transaction while the tables stay writable
+    JSONB_MIGRATION_BATCH_SIZE: int = 10_000
+    # Threads whose step aggregates are recomputed per transaction
+    THREAD_AGGREGATE_BATCH_SIZE: int = 1_000
+
     # User registration details
     USER_EMAIL: Optional[str] = (
         "initial@example.com"  # Placeholder, user should replace with actual email
@@ -5,14 +5,64 @@ from chainlit_graphql.api.v1.graphql.schema.step import (
     StepsType,
 )
 from tenacity import retry, stop_after_attempt, wait_fixed
+from sqlalchemy import inspect
 
 from typing import Optional, List
+from datetime import datetime
 
+import base64
+import json
 import boto3
 
 
 class MapperUtility:
 
+    @staticmethod
+    def decode_id(id: Optional[str]) -> Optional[str]:
+        if id is None:
+            return None
+        try:
+            # Attempt to decode as base64
+            decoded_id = base64.b64decode(id).decode()
+            # Extract the ID part if it follows the 'Type:id' format
+            if ":" in decoded_id:
+                id = decoded_id.split(":")[1]
+        except (base64.binascii.Error, UnicodeDecodeError):
+            # If decoding fails, assume it's a regular UUID and do nothing
+            pass
+        return id
+
+    @staticmethod
+    def encode_cursor(position: list) -> str:
+        """
+        Opaque keyset cursor, the values of the sort keys of a row.
+        """
+        position = [
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in position
+        ]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Optional[list]:
+        """
+        The values of an `encode_cursor` cursor, None for another kind of cursor.
+        """
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor))
+        except (ValueError, TypeError):
+            return None
+        if not isinstance(position, list) or not position:
+            return None
+        return position
+
+    @staticmethod
+    def loaded_value(model, name: str):
+        # Deferred columns map to None instead of being loaded one row at a time
+        if name in inspect(model).unloaded:
+            return None
+        return getattr(model, name)
+
     @staticmethod
     async def map_scores_to_scoretypes(scores_models) -> List[Score]:
 
@@ -94,6 +144,24 @@ class MapperUtility:
 
         return serialized_list
 
+    @staticmethod
+    def serialize_step_row(step_values: dict) -> dict:
+        return {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in step_values.items()
+        }
+
+    @staticmethod
+    def deserialize_step_row(json_data: dict) -> dict:
+        return {
+            key: (
+                datetime.fromisoformat(value)
+                if key in ("start_time", "end_time", "createdAt") and value
+                else value
+            )
+            for key, value in json_data.items()
+        }
+
     @staticmethod
     def deserialize_generation_payload(json_data) -> Optional[GenerationType]:
         if json_data is None:
@@ -167,37 +235,52 @@ class MapperUtility:
 
         return attachments
 
+    @staticmethod
+    def map_step_row_to_stepstype(row) -> StepsType:
+        # Partial row returned by an upsert, only the selected columns are set
+        return StepsType(
+            **{
+                ("metadata" if column == "meta_data" else column): value
+                for column, value in row.items()
+            },
+            ok=True,
+            message="Step added successfully",
+        )
+
     @staticmethod
     async def map_step_to_stepstype(step_model) -> StepsType:
-        # Fetch and convert score for the step
+        # Scores that were not loaded with the step are resolved on demand
         score_type = None
-        if step_model.scores:
+        if "scores" not in inspect(step_model).unloaded:
             score_type = await MapperUtility.map_scores_to_scoretypes(step_model.scores)
 
+        # Columns left out of a projected query are None
+        value = MapperUtility.loaded_value
+
         generation_payload = MapperUtility.deserialize_generation_payload(
-            step_model.generation
+            value(step_model, "generation")
         )
 
         attachments_payload = MapperUtility.deserialize_attachments_payload(
-            step_model.attachments, step_model.thread_id, step_model.id
+            value(step_model, "attachments"), step_model.thread_id, step_model.id
         )
 
         # Convert the Step model to StepsType
         return StepsType(
             id=step_model.id,
             thread_id=step_model.thread_id,
-            parent_id=step_model.parent_id,
-            start_time=step_model.start_time,
-            end_time=step_model.end_time,
+            parent_id=value(step_model, "parent_id"),
+            start_time=value(step_model, "start_time"),
+            end_time=value(step_model, "end_time"),
             createdAt=step_model.createdAt,
-            type=step_model.type,
-            error=step_model.error,
-            input=step_model.input,
-            tags=step_model.tags,
-            output=step_model.output,
-            metadata=step_model.meta_data,
-            name=step_model.name,
-            scores=score_type,
+            type=value(step_model, "type"),
+            error=value(step_model, "error"),
+            input=value(step_model, "input"),
+            tags=value(step_model, "tags"),
+            output=value(step_model, "output"),
+            metadata=value(step_model, "meta_data"),
+            name=value(step_model, "name"),
+            preloaded_scores=score_type,
             generation=generation_payload,
             attachments=attachments_payload,
             ok=True,
@@ -0,0 +1,147 @@
+from chainlit_graphql.core.config import settings
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from importlib import import_module
+from typing import Awaitable, Callable, Optional, Tuple
+import pickle
+import time
+
+
+class ThreadCacheBackend(ABC):
+    """
+    Storage of the threadDetail cache.
+
+    Entries are keyed by thread id, `threads.version` and projection, and a
+    write to a thread gives it a new version in the database, so stale entries
+    are never read again on any replica and simply expire. A backend shared by
+    the replicas (Redis, memcached) implements these methods, see
+    THREAD_CACHE_BACKEND.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: int):
+        ...
+
+
+class MemoryThreadCacheBackend(ThreadCacheBackend):
+    """
+    In-process LRU bounded by the size of the cached values.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        # key -> (expires at, value)
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._evict(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str):
+        _, value = self._entries.pop(key)
+        self.size -= len(value)
+
+
+class ThreadCache:
+    """
+    Results of threadDetail, served as long as their thread is unchanged.
+
+    The version of the thread is read first, with a primary key lookup, and
+    the result is stored under it. A thread changed while it is loaded was
+    read at least as new as that version, and is read under its new version
+    afterwards.
+    """
+
+    def __init__(self, backend: Optional[ThreadCacheBackend] = None):
+        self._backend = backend
+
+    @property
+    def backend(self) -> Optional[ThreadCacheBackend]:
+        if self._backend is None:
+            if settings.THREAD_CACHE_BACKEND:
+                # "package.module:factory", called without arguments
+                module, name = settings.THREAD_CACHE_BACKEND.split(":")
+                self._backend = getattr(import_module(module), name)()
+            elif settings.THREAD_CACHE_MAX_BYTES > 0:
+                self._backend = MemoryThreadCacheBackend(
+                    settings.THREAD_CACHE_MAX_BYTES
+                )
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend: Optional[ThreadCacheBackend]):
+        self._backend = backend
+
+    async def get_or_load(
+        self,
+        id: str,
+        projection,
+        version: Callable[[], Awaitable[Optional[int]]],
+        load: Callable[[], Awaitable[Optional[object]]],
+    ):
+        """
+        The cached thread, or the one returned by `load`, which is then cached.
+
+        :param id: The thread id.
+        :param projection: The ThreadProjection of the query, None for whole
+            threads. Each projection is cached separately.
+        :param version: Reads the current version of the thread, None when the
+            thread does not exist.
+        :param load: Reads the thread from the database.
+        """
+        backend = self.backend
+        if backend is None:
+            return await load()
+
+        current = await version()
+        if current is None:
+            return await load()
+        key = f"{id}:{current}:{_projection_key(projection)}"
+        cached = await backend.get(key)
+        if cached is not None:
+            return pickle.loads(cached)
+
+        thread = await load()
+        if thread is not None:
+            await backend.set(
+                key, pickle.dumps(thread), settings.THREAD_CACHE_TTL_SECONDS
+            )
+        return thread
+
+
+def _projection_key(projection) -> str:
+    if projection is None:
+        return "*"
+    step_columns = projection.step_columns
+    return repr(
+        (
+            sorted(projection.thread_columns),
+            sorted(step_columns) if step_columns is not None else None,
+            projection.step_scores,
+            projection.participant,
+        )
+    )
+
+
+thread_cache = ThreadCache()
@@ -1,4 +1,9 @@
 from .database import db
+from .jsonb_migration import migrate_json_columns
+from chainlit_graphql.model.thread import Thread
+from chainlit_graphql.repository.thread_aggregate import thread_aggregate_repo
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
 from sqlmodel import SQLModel
 
 
@@ -6,6 +11,39 @@ async def create_all():
     async with db.engine.begin() as conn:
         # Use SQLModel's meta_data to create all tables
         await conn.run_sync(SQLModel.metadata.create_all)
+        # create_all skips existing tables, add columns declared since then
+        added_columns = await conn.run_sync(create_missing_columns)
+    # Before the indexes, some of them only apply to jsonb
+    await migrate_json_columns()
+    if any(column.table is Thread.__table__ for column in added_columns):
+        # The step aggregates of the existing threads
+        await thread_aggregate_repo.refresh_all()
+    async with db.engine.begin() as conn:
+        # create_all skips existing tables, add indexes declared since then
+        await conn.run_sync(create_missing_indexes)
+
+
+def create_missing_columns(conn) -> list:
+    added_columns = []
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            conn.execute(
+                text(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN '
+                    f"{CreateColumn(column).compile(dialect=conn.dialect)}"
+                )
+            )
+            added_columns.append(column)
+    return added_columns
+
+
+def create_missing_indexes(conn):
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
 
 
 async def drop_all():
@@ -0,0 +1,104 @@
+from .database import db
+from chainlit_graphql.core.config import settings
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import SQLModel
+
+# Held for the whole migration, other instances starting meanwhile wait for it
+MIGRATION_LOCK_KEY = "chainlit_graphql.jsonb_migration"
+
+
+async def migrate_json_columns():
+    """
+    Convert the columns declared as JSONB that are still json in the database.
+
+    Each column is copied into a jsonb shadow column kept in sync by a trigger,
+    existing rows are backfilled in small transactions so that the table stays
+    writable, then the columns are swapped in one short transaction.
+    """
+    async with db.engine.connect() as lock:
+        await lock.execute(
+            text("SELECT pg_advisory_lock(hashtext(:key))"),
+            {"key": MIGRATION_LOCK_KEY},
+        )
+        try:
+            for table in SQLModel.metadata.sorted_tables:
+                for column in table.columns:
+                    if not isinstance(column.type, JSONB):
+                        continue
+                    if await _column_type(table.name, column.name) == "json":
+                        await _migrate_column(table.name, column.name)
+        finally:
+            await lock.execute(
+                text("SELECT pg_advisory_unlock(hashtext(:key))"),
+                {"key": MIGRATION_LOCK_KEY},
+            )
+            await lock.commit()
+
+
+async def _column_type(table: str, column: str):
+    async with db.engine.connect() as conn:
+        return await conn.scalar(
+            text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_schema = current_schema() "
+                "AND table_name = :table AND column_name = :column"
+            ),
+            {"table": table, "column": column},
+        )
+
+
+async def _migrate_column(table: str, column: str):
+    print(f"Migrating {table}.{column} to jsonb")
+    shadow = f"{column}__jsonb"
+    function = f"{table}_{column}__jsonb_sync"
+
+    # Rows written from now on fill the shadow column themselves
+    async with db.engine.begin() as conn:
+        await conn.execute(
+            text(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "{shadow}" jsonb')
+        )
+        await conn.execute(
+            text(
+                f'CREATE OR REPLACE FUNCTION "{function}"() RETURNS trigger AS $$ '
+                f'BEGIN NEW."{shadow}" := NEW."{column}"::jsonb; RETURN NEW; END '
+                "$$ LANGUAGE plpgsql"
+            )
+        )
+        await conn.execute(text(f'DROP TRIGGER IF EXISTS "{function}" ON "{table}"'))
+        await conn.execute(
+            text(
+                f'CREATE TRIGGER "{function}" BEFORE INSERT OR UPDATE ON "{table}" '
+                f'FOR EACH ROW EXECUTE FUNCTION "{function}"()'
+            )
+        )
+
+    # Existing rows in primary key order, one committed batch at a time
+    after = ""
+    while True:
+        async with db.engine.begin() as conn:
+            last = await conn.scalar(
+                text(
+                    f"WITH batch AS ("
+                    f'SELECT id FROM "{table}" WHERE id > :after '
+                    f"ORDER BY id LIMIT :limit), "
+                    f'updated AS (UPDATE "{table}" SET "{shadow}" = "{column}"::jsonb '
+                    f'FROM batch WHERE "{table}".id = batch.id '
+                    f'RETURNING "{table}".id) '
+                    "SELECT max(id) FROM updated"
+                ),
+                {"after": after, "limit": settings.JSONB_MIGRATION_BATCH_SIZE},
+            )
+        if last is None:
+            break
+        after = last
+
+    # Indexes on the old column go with it, create_missing_indexes adds them back
+    async with db.engine.begin() as conn:
+        await conn.execute(text(f'LOCK TABLE "{table}" IN ACCESS EXCLUSIVE MODE'))
+        await conn.execute(text(f'DROP TRIGGER "{function}" ON "{table}"'))
+        await conn.execute(text(f'DROP FUNCTION "{function}"()'))
+        await conn.execute(text(f'ALTER TABLE "{table}" DROP COLUMN "{column}"'))
+        await conn.execute(
+            text(f'ALTER TABLE "{table}" RENAME COLUMN "{shadow}" TO "{column}"')
+        )
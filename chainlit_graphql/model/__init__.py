@@ -4,3 +4,6 @@ from .thread import Thread  # noqa: F401
 from .step import Step  # noqa: F401
 from .score import Score  # noqa: F401
 from .apikey import ApiKey  # noqa: F401
+from .pending_step import PendingStep  # noqa: F401
+from .idempotency_key import IdempotencyKey  # noqa: F401
+from .persisted_query import PersistedQuery  # noqa: F401
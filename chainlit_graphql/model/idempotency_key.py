@@ -0,0 +1,24 @@
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Text
+from sqlalchemy.sql import func
+
+
+class IdempotencyKey(SQLModel, table=True):
+    __tablename__ = "idempotency_keys"
+
+    # Responses of the GraphQL requests sent with an Idempotency-Key header
+    key: str = Field(primary_key=True)
+    fingerprint: str
+    # None while the request is running
+    response: Optional[str] = Field(default=None, sa_column=Column(Text))
+    createdAt: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(
+            DateTime(timezone=True), default=func.now(), nullable=False, index=True
+        ),
+    )
+
+    class Config:
+        arbitrary_types_allowed = True
@@ -1,7 +1,8 @@
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List, Dict
 from datetime import datetime
-from sqlalchemy import Column, DateTime, JSON
+from sqlalchemy import Column, DateTime, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 import uuid
 from typing import TYPE_CHECKING
@@ -12,12 +13,21 @@ if TYPE_CHECKING:
 
 class Participant(SQLModel, table=True):
     __tablename__ = "participants"
+    # metadata containment and jsonpath searches
+    __table_args__ = (
+        Index(
+            "ix_participants_meta_data",
+            "meta_data",
+            postgresql_using="gin",
+            postgresql_ops={"meta_data": "jsonb_path_ops"},
+        ),
+    )
 
     id: Optional[str] = Field(
         default_factory=lambda: str(uuid.uuid4()), primary_key=True
     )
-    identifier: Optional[str] = None
-    meta_data: Optional[Dict] = Field(default=None, sa_column=Column(JSON))
+    identifier: Optional[str] = Field(default=None, index=True)
+    meta_data: Optional[Dict] = Field(default=None, sa_column=Column(JSONB))
     createdAt: datetime = Field(
         sa_column=Column(DateTime(timezone=True), default=func.now(), nullable=False)
     )
@@ -0,0 +1,24 @@
+from sqlmodel import SQLModel, Field
+from typing import Optional, Dict
+from datetime import datetime
+from sqlalchemy import Column, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+
+
+class PendingStep(SQLModel, table=True):
+    __tablename__ = "pending_steps"
+
+    # Steps whose thread does not exist yet, flushed when the thread is created
+    id: str = Field(primary_key=True)
+    thread_id: str = Field(index=True)
+    payload: Dict = Field(sa_column=Column(JSONB, nullable=False))
+    createdAt: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(
+            DateTime(timezone=True), default=func.now(), nullable=False, index=True
+        ),
+    )
+
+    class Config:
+        arbitrary_types_allowed = True
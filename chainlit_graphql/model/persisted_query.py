@@ -0,0 +1,22 @@
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Text
+from sqlalchemy.sql import func
+
+
+class PersistedQuery(SQLModel, table=True):
+    __tablename__ = "persisted_queries"
+
+    # Queries registered by automatic persisted query clients, by sha256 hash
+    hash: str = Field(primary_key=True)
+    query: str = Field(sa_column=Column(Text, nullable=False))
+    createdAt: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(
+            DateTime(timezone=True), default=func.now(), nullable=False, index=True
+        ),
+    )
+
+    class Config:
+        arbitrary_types_allowed = True
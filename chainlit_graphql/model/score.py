@@ -1,6 +1,7 @@
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column
+from sqlalchemy.dialects.postgresql import JSONB
 import uuid
 from typing import TYPE_CHECKING
 
@@ -18,8 +19,8 @@ class Score(SQLModel, table=True):
     type: Optional[str]
     value: Optional[float]
     comment: Optional[str] = None
-    tags: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
-    step_id: Optional[str] = Field(default=None, foreign_key="steps.id")
+    tags: Optional[List[str]] = Field(default=None, sa_column=Column(JSONB))
+    step_id: Optional[str] = Field(default=None, foreign_key="steps.id", index=True)
     generation_id: Optional[str] = None
     dataset_experiment_item_id: Optional[str] = None
 
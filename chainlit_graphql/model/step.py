@@ -1,7 +1,8 @@
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List, Dict
 from datetime import datetime, timezone
-from sqlalchemy import Column, DateTime, JSON
+from sqlalchemy import Column, DateTime, Index, JSON, func, literal_column, text
+from sqlalchemy.dialects.postgresql import JSONB
 import uuid
 
 from typing import TYPE_CHECKING
@@ -10,9 +11,30 @@ if TYPE_CHECKING:
     from .thread import Thread
     from .score import Score
 
+# Words of the string values of a JSONB column, searches have to use the same
+# expression (step_search_vector) to be answered from the index
+SEARCH_VECTOR_SQL = (
+    "jsonb_to_tsvector('simple'::regconfig, {}, '[\"string\"]'::jsonb)"
+)
+
 
 class Step(SQLModel, table=True):
     __tablename__ = "steps"
+    __table_args__ = (
+        # Steps of a thread in order, and their keyset pagination
+        Index("ix_steps_thread_id_createdAt_id", "thread_id", "createdAt", "id"),
+        # Full-text search of step contents
+        Index(
+            "ix_steps_input_search",
+            text(SEARCH_VECTOR_SQL.format("input")),
+            postgresql_using="gin",
+        ),
+        Index(
+            "ix_steps_output_search",
+            text(SEARCH_VECTOR_SQL.format("output")),
+            postgresql_using="gin",
+        ),
+    )
 
     id: Optional[str] = Field(
         default_factory=lambda: str(uuid.uuid4()), primary_key=True
@@ -23,12 +45,12 @@ class Step(SQLModel, table=True):
     end_time: Optional[datetime] = Field(sa_column=Column(DateTime(timezone=True)))
     type: Optional[str] = None
     error: Optional[str] = None
-    input: Optional[Dict] = Field(default=None, sa_column=Column(JSON))
-    output: Optional[Dict] = Field(default=None, sa_column=Column(JSON))
+    input: Optional[Dict] = Field(default=None, sa_column=Column(JSONB))
+    output: Optional[Dict] = Field(default=None, sa_column=Column(JSONB))
     tags: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
-    meta_data: Optional[Dict] = Field(default=None, sa_column=Column(JSON))
+    meta_data: Optional[Dict] = Field(default=None, sa_column=Column(JSONB))
     name: Optional[str] = None
-    generation: Optional[Dict] = Field(default=None, sa_column=Column(JSON))
+    generation: Optional[Dict] = Field(default=None, sa_column=Column(JSONB))
     attachments: Optional[Dict] = Field(default=None, sa_column=Column(JSON))
     createdAt: Optional[datetime] = Field(
         default_factory=lambda: datetime.now(timezone.utc),
@@ -43,3 +65,12 @@ class Step(SQLModel, table=True):
 
     class Config:
         arbitrary_types_allowed = True
+
+
+def step_search_vector(column):
+    # SEARCH_VECTOR_SQL of a column
+    return func.jsonb_to_tsvector(
+        literal_column("'simple'::regconfig"),
+        column,
+        literal_column("""'["string"]'::jsonb"""),
+    )
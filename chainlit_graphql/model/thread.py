@@ -1,7 +1,20 @@
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List, Dict
 from datetime import datetime
-from sqlalchemy import Column, DateTime, String, JSON, ARRAY
+from sqlalchemy import (
+    ARRAY,
+    BigInteger,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    Sequence,
+    String,
+    literal_column,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from typing import TYPE_CHECKING
 
@@ -9,27 +22,95 @@ if TYPE_CHECKING:
     from .participant import Participant
     from .step import Step
 
+# Threads without participant sort first, the orderBy has to use the same
+# expression (participant_sort_key) to be answered from the index
+PARTICIPANT_SORT_SQL = "coalesce(participant_id, '')"
+
+# Thread versions, every write to a thread takes a new value
+THREAD_VERSION_SEQUENCE = Sequence("threads_version_seq", metadata=SQLModel.metadata)
+
 
 class Thread(SQLModel, table=True):
     __tablename__ = "threads"
+    __table_args__ = (
+        # Keyset pagination order of the threads list
+        Index("ix_threads_createdAt_id", "createdAt", "id"),
+        # tags filters, && and @> use it
+        Index("ix_threads_tags", "tags", postgresql_using="gin"),
+        # orderBy participant and tokenCount, in both directions
+        Index("ix_threads_participant_order", text(PARTICIPANT_SORT_SQL), "id"),
+        Index("ix_threads_token_count_id", "token_count", "id"),
+        # Filters on the step aggregates, tokenCount uses the index above
+        Index("ix_threads_duration", "duration"),
+        # Stamp of the threads list ETag
+        Index("ix_threads_version", "version"),
+        # metadata filters, @> and jsonpath @? use it
+        Index(
+            "ix_threads_meta_data",
+            "meta_data",
+            postgresql_using="gin",
+            postgresql_ops={"meta_data": "jsonb_path_ops"},
+        ),
+    )
 
     # Existing fields
     id: Optional[str] = Field(sa_column=Column(String, primary_key=True, index=True))
     name: Optional[str]
-    meta_data: Optional[Dict] = Field(default=None, sa_column=Column(JSON))
-    environment: Optional[str]
+    meta_data: Optional[Dict] = Field(default=None, sa_column=Column(JSONB))
+    environment: Optional[str] = Field(default=None, index=True)
     tags: Optional[List[str]] = Field(sa_column=Column(ARRAY(String)), default=[])
     createdAt: datetime = Field(
         sa_column=Column(DateTime(timezone=True), default=func.now(), nullable=False)
     )
     participant_id: Optional[str] = Field(
-        default=None, foreign_key="participants.id"
+        default=None, foreign_key="participants.id", index=True
     )  # Foreign key to Participant
+    # Changed by the writes to the thread, its participant, steps and scores
+    version: Optional[int] = Field(
+        sa_column=Column(
+            BigInteger,
+            default=THREAD_VERSION_SEQUENCE.next_value(),
+            server_default=THREAD_VERSION_SEQUENCE.next_value(),
+            nullable=False,
+        )
+    )
+    # Aggregates of the steps, maintained by the step upserts
+    step_count: Optional[int] = Field(
+        default=0, sa_column=Column(Integer, default=0, server_default="0")
+    )
+    token_count: Optional[int] = Field(
+        default=0, sa_column=Column(Integer, default=0, server_default="0")
+    )
+    input_token_count: Optional[int] = Field(
+        default=0, sa_column=Column(Integer, default=0, server_default="0")
+    )
+    output_token_count: Optional[int] = Field(
+        default=0, sa_column=Column(Integer, default=0, server_default="0")
+    )
+    # Earliest step start and latest step end, duration is the seconds between them
+    steps_started_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True))
+    )
+    steps_ended_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True))
+    )
+    duration: Optional[float] = Field(default=None, sa_column=Column(Float))
+    last_activity_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True))
+    )
     participant: "Participant" = Relationship(back_populates="threads")
     steps: List["Step"] = Relationship(
         back_populates="thread",
-        sa_relationship_kwargs={"cascade": "all, delete-orphan"},
+        sa_relationship_kwargs={
+            "cascade": "all, delete-orphan",
+            "order_by": "Step.createdAt",
+        },
     )
 
     class Config:
         arbitrary_types_allowed = True
+
+
+def participant_sort_key():
+    # PARTICIPANT_SORT_SQL as an expression of the threads table
+    return func.coalesce(Thread.participant_id, literal_column("''"))
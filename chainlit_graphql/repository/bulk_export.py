@@ -0,0 +1,73 @@
+from chainlit_graphql.model.participant import Participant
+from chainlit_graphql.model.thread import Thread
+from chainlit_graphql.model.step import Step
+from chainlit_graphql.model.score import Score
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.db.database import db
+from sqlalchemy.sql import select
+from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
+
+
+class BulkExportRepository:
+    """
+    Reads threads, their participants, steps and scores for export.
+
+    Every table is read with a server-side cursor, so memory stays bounded by
+    the fetch size whatever the size of the history.
+    """
+
+    async def export_records(
+        self,
+        participantId: Optional[str] = None,
+        environment: Optional[str] = None,
+        createdAfter: Optional[datetime] = None,
+        createdBefore: Optional[datetime] = None,
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Yields the records of the matching threads, parents before children.
+
+        :param participantId: Only threads of this participant.
+        :param environment: Only threads of this environment.
+        :param createdAfter: Only threads created at or after this time.
+        :param createdBefore: Only threads created before this time.
+        :return: (kind, row) pairs, the rows use the column names of their table.
+        """
+        conditions = []
+        if participantId is not None:
+            conditions.append(Thread.participant_id == participantId)
+        if environment is not None:
+            conditions.append(Thread.environment == environment)
+        if createdAfter is not None:
+            conditions.append(Thread.createdAt >= createdAfter)
+        if createdBefore is not None:
+            conditions.append(Thread.createdAt < createdBefore)
+
+        thread_ids = select(Thread.id).where(*conditions)
+        step_ids = select(Step.id).where(Step.thread_id.in_(thread_ids))
+        queries = [
+            (
+                "participant",
+                select(Participant.__table__).where(
+                    Participant.id.in_(select(Thread.participant_id).where(*conditions))
+                ),
+            ),
+            ("thread", select(Thread.__table__).where(*conditions)),
+            ("step", select(Step.__table__).where(Step.thread_id.in_(thread_ids))),
+            ("score", select(Score.__table__).where(Score.step_id.in_(step_ids))),
+        ]
+
+        async with db.SessionLocal() as session:
+            # One snapshot for all the tables, so every child has its parent
+            await session.connection(
+                execution_options={"isolation_level": "REPEATABLE READ"}
+            )
+            for kind, query in queries:
+                result = await session.stream(
+                    query.execution_options(yield_per=settings.EXPORT_FETCH_SIZE)
+                )
+                async for row in result.mappings():
+                    yield kind, dict(row)
+
+
+bulk_export_repo = BulkExportRepository()
@@ -0,0 +1,176 @@
+from chainlit_graphql.model.participant import Participant
+from chainlit_graphql.model.thread import Thread
+from chainlit_graphql.model.step import Step
+from chainlit_graphql.model.score import Score
+from chainlit_graphql.db.database import db
+from chainlit_graphql.repository.thread_aggregate import thread_aggregate_repo
+from chainlit_graphql.repository.thread_version import thread_version_repo
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Column,
+    DateTime,
+    MetaData,
+    Table,
+    exists,
+    func,
+    or_,
+    select,
+)
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime
+from typing import Dict, List
+import json
+
+# Columns assigned by the database, their imported values are ignored
+GENERATED_COLUMNS = {"version"}
+
+# Record kinds in the order they are merged, parents before children
+IMPORT_MODELS = {
+    "participant": Participant,
+    "thread": Thread,
+    "step": Step,
+    "score": Score,
+}
+
+
+class BulkImportRepository:
+    """
+    Writes batches of imported records.
+
+    Each kind is copied with COPY into a temporary table and merged into its
+    table with a single INSERT ... SELECT ... ON CONFLICT statement.
+    """
+
+    async def import_records(self, records: Dict[str, List[dict]]) -> Dict[str, int]:
+        """
+        Imports a batch of records in a single transaction.
+
+        Imported values overwrite the stored ones, missing values keep them. Rows
+        referencing a parent that does not exist are skipped, as are all but the
+        last row of a repeated id.
+
+        :param records: Rows keyed by record kind, with the column names of its
+            table as keys.
+        :return: The number of rows written per kind.
+        """
+        async with db.SessionLocal() as session:
+            async with session.begin():  # Start a transaction
+                try:
+                    written = {}
+                    for kind, model in IMPORT_MODELS.items():
+                        if records.get(kind):
+                            written[kind] = await self._copy_and_merge(
+                                model.__table__, records[kind], session
+                            )
+
+                    # Imported aggregates are not trusted, they follow the steps
+                    thread_ids = {
+                        row["id"] for row in records.get("thread") or []
+                    } | {
+                        row.get("thread_id") for row in records.get("step") or []
+                    }
+                    thread_ids.discard(None)
+                    if thread_ids:
+                        await thread_aggregate_repo.refresh(thread_ids, session)
+
+                    # The refresh gave these threads new versions
+                    await thread_version_repo.touch_steps(
+                        [row.get("step_id") for row in records.get("score") or []],
+                        session,
+                    )
+
+                except Exception as e:
+                    await session.rollback()
+                    raise e
+
+            return written
+
+    @staticmethod
+    def _record_value(column: Column, value):
+        if value is None:
+            return None
+        if isinstance(column.type, JSON):
+            # COPY sends json columns as text
+            return json.dumps(value)
+        if isinstance(column.type, DateTime) and isinstance(value, str):
+            return datetime.fromisoformat(value)
+        return value
+
+    async def _copy_and_merge(self, table: Table, rows: List[dict], session) -> int:
+        unknown_columns = {key for row in rows for key in row} - set(table.c.keys())
+        if unknown_columns:
+            raise ValueError(
+                f"Unknown {table.name} columns: {', '.join(sorted(unknown_columns))}"
+            )
+        if any(row.get("id") is None for row in rows):
+            raise ValueError(f"Imported {table.name} must have an id.")
+
+        names = [name for name in table.c.keys() if name not in GENERATED_COLUMNS]
+        staging = Table(
+            f"import_{table.name}",
+            MetaData(),
+            *(Column(name, table.c[name].type) for name in names),
+            Column("import_seq", BigInteger),
+            prefixes=["TEMPORARY"],
+            postgresql_on_commit="DROP",
+        )
+        await session.run_sync(
+            lambda sync_session: staging.create(sync_session.connection())
+        )
+
+        # COPY goes through the asyncpg connection of the session's transaction
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            staging.name,
+            records=[
+                tuple(self._record_value(table.c[name], row.get(name)) for name in names)
+                + (seq,)
+                for seq, row in enumerate(rows)
+            ],
+            columns=names + ["import_seq"],
+        )
+
+        # The last row of an id wins, rows of a missing parent are left out. A
+        # missing createdAt keeps the stored one, and is only now() on insert
+        source = (
+            select(
+                *(
+                    (
+                        func.coalesce(
+                            staging.c[name],
+                            select(table.c[name])
+                            .where(table.c.id == staging.c.id)
+                            .scalar_subquery(),
+                            func.now(),
+                        ).label(name)
+                        if name == "createdAt"
+                        else staging.c[name]
+                    )
+                    for name in names
+                )
+            )
+            .distinct(staging.c.id)
+            .order_by(staging.c.id, staging.c.import_seq.desc())
+        )
+        for foreign_key in table.foreign_keys:
+            reference = staging.c[foreign_key.parent.name]
+            source = source.where(
+                or_(reference.is_(None), exists().where(foreign_key.column == reference))
+            )
+
+        stmt = insert(table).from_select(names, source)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={
+                name: func.coalesce(stmt.excluded[name], table.c[name])
+                for name in names
+                if name != "id"
+            },
+        )
+        result = await session.execute(stmt)
+        return result.rowcount
+
+
+bulk_import_repo = BulkImportRepository()
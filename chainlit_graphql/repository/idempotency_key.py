@@ -0,0 +1,87 @@
+from chainlit_graphql.model.idempotency_key import IdempotencyKey
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.db.database import db
+from sqlalchemy.sql import select
+from sqlalchemy import delete as sql_delete, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+
+class IdempotencyKeyRepository:
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Claims a key for a request about to be executed.
+
+        A key is free when it was never used, when it expired or when the request
+        that claimed it did not complete in time.
+
+        :return: None when the key was claimed, otherwise the fingerprint and
+            response (None while running) of the request that holds it.
+        """
+        now = datetime.now(timezone.utc)
+        expired_before = now - timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+        stale_before = now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+
+        async with db.SessionLocal() as session:
+            async with session.begin():  # Start a transaction
+                stmt = insert(IdempotencyKey).values(
+                    key=key, fingerprint=fingerprint, response=None, createdAt=now
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["key"],
+                    set_={
+                        "fingerprint": stmt.excluded.fingerprint,
+                        "response": None,
+                        "createdAt": stmt.excluded.createdAt,
+                    },
+                    where=or_(
+                        IdempotencyKey.createdAt < expired_before,
+                        IdempotencyKey.response.is_(None)
+                        & (IdempotencyKey.createdAt < stale_before),
+                    ),
+                )
+                claimed = await session.execute(stmt.returning(IdempotencyKey.key))
+                if claimed.first() is not None:
+                    return None
+
+                result = await session.execute(
+                    select(IdempotencyKey.fingerprint, IdempotencyKey.response).where(
+                        IdempotencyKey.key == key
+                    )
+                )
+                return tuple(result.one())
+
+    async def complete(self, key: str, response: str):
+        async with db.SessionLocal() as session:
+            async with session.begin():  # Start a transaction
+                await session.execute(
+                    update(IdempotencyKey)
+                    .where(IdempotencyKey.key == key)
+                    .values(response=response)
+                )
+
+    async def release(self, key: str):
+        async with db.SessionLocal() as session:
+            async with session.begin():  # Start a transaction
+                await session.execute(
+                    sql_delete(IdempotencyKey).where(
+                        IdempotencyKey.key == key, IdempotencyKey.response.is_(None)
+                    )
+                )
+
+    async def purge_expired(self):
+        expired_before = datetime.now(timezone.utc) - timedelta(
+            seconds=settings.IDEMPOTENCY_TTL_SECONDS
+        )
+        async with db.SessionLocal() as session:
+            async with session.begin():  # Start a transaction
+                await session.execute(
+                    sql_delete(IdempotencyKey).where(
+                        IdempotencyKey.createdAt < expired_before
+                    )
+                )
+
+
+idempotency_key_repo = IdempotencyKeyRepository()
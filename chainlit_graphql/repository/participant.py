@@ -1,9 +1,11 @@
 from chainlit_graphql.model.participant import Participant
 from chainlit_graphql.api.v1.graphql.schema.participant import ParticipantType
 from chainlit_graphql.db.database import db
+from chainlit_graphql.repository.thread_version import thread_version_repo
 from sqlalchemy.sql import select
 from sqlalchemy import delete as sql_delete, or_
-from typing import Optional
+from sqlalchemy.orm import noload
+from typing import Dict, List, Optional
 
 
 class ParticipantRepository:
@@ -78,6 +80,8 @@ class ParticipantRepository:
 
                     # Refresh the instance to get any updated attributes from the database
                     await session.refresh(existing_participant)
+                    # Its threads are read with the participant
+                    await thread_version_repo.touch_participant(participant.id, session)
 
                     # Commit the transaction
                     await session.commit()
@@ -109,6 +113,28 @@ class ParticipantRepository:
             # Return None if no participant is found
             return None
 
+    @staticmethod
+    async def get_by_ids(participant_ids: List[str]) -> Dict[str, ParticipantType]:
+        """
+        Several participants with one query, keyed by id.
+        """
+        async with db.SessionLocal() as session:
+            result = await session.scalars(
+                select(Participant)
+                .where(Participant.id.in_(participant_ids))
+                # Their threads are never needed here
+                .options(noload(Participant.threads))
+            )
+            return {
+                participant.id: ParticipantType(
+                    id=participant.id,
+                    identifier=participant.identifier,
+                    metadata=participant.meta_data,
+                    createdAt=participant.createdAt,
+                )
+                for participant in result.all()
+            }
+
     @staticmethod
     async def get_by_id_or_identifier(
         id: Optional[str] = None, identifier: Optional[str] = None
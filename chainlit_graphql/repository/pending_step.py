@@ -0,0 +1,73 @@
+from chainlit_graphql.model.pending_step import PendingStep
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.core.mappers import MapperUtility
+from sqlalchemy.sql import select
+from sqlalchemy import delete as sql_delete, func
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+
+class PendingStepRepository:
+    """
+    Parks steps whose thread does not exist yet.
+
+    Parked steps are kept in the `pending_steps` table, so they survive a
+    restart and can be flushed by any replica. Parking and flushing take the
+    same per-thread advisory lock, which guarantees a step is either written
+    directly or seen by the transaction that creates its thread.
+    """
+
+    @staticmethod
+    async def lock_thread(thread_id: str, session):
+        await session.execute(
+            select(func.pg_advisory_xact_lock(func.hashtext(thread_id)))
+        )
+
+    async def park(self, rows: List[dict], session):
+        now = datetime.now(timezone.utc)
+        await self._purge_expired(now, session)
+
+        stmt = insert(PendingStep).values(
+            [
+                {
+                    "id": values["id"],
+                    "thread_id": values["thread_id"],
+                    "payload": MapperUtility.serialize_step_row(values),
+                }
+                for values in rows
+            ]
+        )
+        # Later updates of a parked step are merged into its payload
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"payload": PendingStep.__table__.c.payload.op("||")(stmt.excluded.payload)},
+        )
+        await session.execute(stmt)
+
+    async def take(self, thread_id: str, session) -> List[dict]:
+        """
+        Removes and returns the steps parked for a thread.
+
+        The payloads are the merged updates of every replica, the steps are
+        only gone once the session commits.
+        """
+        result = await session.execute(
+            sql_delete(PendingStep)
+            .where(PendingStep.thread_id == thread_id)
+            .returning(PendingStep.payload)
+        )
+
+        return [
+            MapperUtility.deserialize_step_row(payload)
+            for payload in result.scalars().all()
+        ]
+
+    async def _purge_expired(self, now: datetime, session):
+        expires_before = now - timedelta(seconds=settings.PENDING_STEP_TTL_SECONDS)
+        await session.execute(
+            sql_delete(PendingStep).where(PendingStep.createdAt < expires_before)
+        )
+
+
+pending_step_repo = PendingStepRepository()
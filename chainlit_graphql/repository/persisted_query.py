@@ -0,0 +1,54 @@
+from chainlit_graphql.model.persisted_query import PersistedQuery
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.db.database import db
+from sqlalchemy.sql import select
+from sqlalchemy import delete as sql_delete, func
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+
+class PersistedQueryRepository:
+    """
+    Queries registered by hash, kept for PERSISTED_QUERY_TTL_SECONDS.
+
+    Clients send the text of an expired query again when it is not found, so
+    the table only holds the queries in use.
+    """
+
+    async def get(self, hash: str) -> Optional[str]:
+        async with db.SessionLocal() as session:
+            return await session.scalar(
+                select(PersistedQuery.query).where(
+                    PersistedQuery.hash == hash,
+                    PersistedQuery.createdAt >= self._expires_before(),
+                )
+            )
+
+    async def save(self, hash: str, query: str):
+        """
+        Stores a query, a hash stored again starts a new time to live.
+        """
+        async with db.SessionLocal() as session:
+            async with session.begin():  # Start a transaction
+                await session.execute(
+                    sql_delete(PersistedQuery).where(
+                        PersistedQuery.createdAt < self._expires_before()
+                    )
+                )
+                stmt = insert(PersistedQuery).values(hash=hash, query=query)
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["hash"],
+                        set_={"query": stmt.excluded.query, "createdAt": func.now()},
+                    )
+                )
+
+    @staticmethod
+    def _expires_before() -> datetime:
+        return datetime.now(timezone.utc) - timedelta(
+            seconds=settings.PERSISTED_QUERY_TTL_SECONDS
+        )
+
+
+persisted_query_repo = PersistedQueryRepository()
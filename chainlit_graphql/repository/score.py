@@ -1,7 +1,10 @@
 from chainlit_graphql.model.score import Score
+from chainlit_graphql.model.step import Step
 from chainlit_graphql.db.database import db
+from chainlit_graphql.repository.thread_version import thread_version_repo
 from sqlalchemy.sql import select
-from typing import Optional
+from sqlalchemy import insert
+from typing import Dict, List, Optional
 import base64
 
 
@@ -12,6 +15,8 @@ class ScoreRepository:
         async with db as session:
             async with session.begin():
                 session.add(score_data)
+                # The thread of the step is read with its scores
+                await thread_version_repo.touch_steps([score_data.step_id], session)
             await session.commit()
 
             result = await session.execute(
@@ -21,6 +26,49 @@ class ScoreRepository:
 
             return score
 
+    @staticmethod
+    async def create_many(scores: List[Score]) -> List[Score]:
+        """
+        Inserts a batch of scores with one multi-row statement.
+
+        :param scores: The scores to insert, with their ids set.
+        :return: The created scores, in input order.
+        """
+        if not scores:
+            return []
+
+        columns = Score.__table__.c.keys()
+        async with db.SessionLocal() as session:
+            async with session.begin():  # Start a transaction
+                try:
+                    step_ids = {score.step_id for score in scores} - {None}
+                    if step_ids:
+                        # One query for all the referenced steps
+                        result = await session.execute(
+                            select(Step.id).where(Step.id.in_(step_ids))
+                        )
+                        missing_step_ids = step_ids - set(result.scalars().all())
+                        if missing_step_ids:
+                            raise ValueError(
+                                f"Steps not found: {', '.join(sorted(missing_step_ids))}"
+                            )
+
+                    result = await session.scalars(
+                        insert(Score).returning(Score, sort_by_parameter_order=True),
+                        [
+                            {column: getattr(score, column) for column in columns}
+                            for score in scores
+                        ],
+                    )
+                    created = result.all()
+                    await thread_version_repo.touch_steps(step_ids, session)
+
+                except Exception as e:
+                    await session.rollback()
+                    raise e
+
+            return created
+
     @staticmethod
     async def update(id: str, model: Score) -> Optional[Score]:
         async with db as session:
@@ -29,6 +77,7 @@ class ScoreRepository:
             existing_model = result.scalars().first()
 
             if existing_model:
+                step_ids = [existing_model.step_id, model.step_id]
                 # Update the fields based on the provided model
                 existing_model.name = model.name
                 existing_model.type = model.type
@@ -40,11 +89,25 @@ class ScoreRepository:
                     model.dataset_experiment_item_id
                 )
 
+                await thread_version_repo.touch_steps(step_ids, session)
                 await session.commit()
                 return existing_model
             else:
                 return None
 
+    async def get_by_step_ids(self, step_ids: List[str]) -> Dict[str, List[Score]]:
+        """
+        Scores of several steps with one query.
+
+        :return: The scores keyed by step id.
+        """
+        async with db.SessionLocal() as session:
+            result = await session.scalars(select(Score).where(Score.step_id.in_(step_ids)))
+            scores = {}
+            for score in result.all():
+                scores.setdefault(score.step_id, []).append(score)
+            return scores
+
     async def get_by_id(self, id: str, session) -> Optional[Score]:
         try:
             stmt = select(Score).where(Score.id == id)
@@ -72,6 +135,9 @@ class ScoreRepository:
                 # If the score exists, delete it
                 if score_to_delete:
                     await session.delete(score_to_delete)
+                    await thread_version_repo.touch_steps(
+                        [score_to_delete.step_id], session
+                    )
                     await session.commit()
 
                     return score_to_delete  # Return ID of the deleted score
@@ -1,25 +1,33 @@
 from chainlit_graphql.model.step import Step
-from chainlit_graphql.repository.thread import thread_repo
+from chainlit_graphql.model.thread import Thread
+from chainlit_graphql.repository.pending_step import pending_step_repo
+from chainlit_graphql.repository.thread_aggregate import thread_aggregate_repo
 from chainlit_graphql.api.v1.graphql.schema.step import (
     AttachmentPayloadInput,
     ScorePayloadInput,
     StepsType,
     GenerationPayloadInput,
 )
+from chainlit_graphql.api.v1.graphql.schema.thread import (
+    PageInfo,
+    StepConnection,
+    StepEdge,
+)
 from chainlit_graphql.db.database import db
 from datetime import datetime, timezone
-import asyncio
-from typing import Optional, List
+from typing import Dict, Optional, List
 from ..core.mappers import MapperUtility
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import aliased, load_only, selectinload
+from sqlalchemy.sql import select
+from sqlalchemy import func, null, true, tuple_
 from sqlalchemy.dialects.postgresql import insert
 from ..api.v1.graphql.scalars.json_scalar import Json
 
 
 class StepRepository:
 
-    async def upsert_step(
-        self,
+    @staticmethod
+    def build_step_row(
         id: str,
         threadId: str,
         startTime: Optional[datetime] = None,
@@ -31,90 +39,425 @@ class StepRepository:
         metadata: Optional[Json] = None,
         parentId: Optional[str] = None,
         name: Optional[str] = None,
-        tags: Optional[List[str]] = None, 
+        tags: Optional[List[str]] = None,
         scores: Optional[List[ScorePayloadInput]] = None,
         generation: Optional[GenerationPayloadInput] = None,
         attachments: Optional[List[AttachmentPayloadInput]] = None,
-    ) -> StepsType:
+    ) -> dict:
+        """
+        The row of an ingestStep call, as written by `upsert_rows`.
+
+        Only the provided fields are in the row, so an update never clears a
+        column.
+        """
+        return {
+            key: value
+            for key, value in {
+                "id": id,
+                "thread_id": threadId,
+                "start_time": startTime,
+                "end_time": endTime,
+                "type": type,
+                "error": error,
+                "input": input,
+                "output": output,
+                "meta_data": metadata,
+                "parent_id": parentId,
+                "name": name,
+                "tags": tags,
+                "generation": (
+                    MapperUtility.serialize_generation_payload(generation)
+                    if generation is not None
+                    else None
+                ),
+                "attachments": (
+                    MapperUtility.serialize_attachments_payload(attachments)
+                    if attachments is not None
+                    else None
+                ),
+                "createdAt": datetime.now(timezone.utc),
+            }.items()
+            if value is not None
+        }
+
+    @staticmethod
+    def _pending_step_type(values: dict) -> StepsType:
+        return StepsType(
+            id=values["id"],
+            thread_id=values.get("thread_id"),
+            createdAt=values["createdAt"],
+            ok=True,
+            message="Step pending until its thread is created",
+        )
+
+    @staticmethod
+    async def _upsert_rows(
+        rows: List[dict], session, returning: Optional[List[str]] = None
+    ) -> dict:
+        columns = {key for values in rows for key in values}
+        # Missing values are rendered as SQL NULL (not JSON null) so the
+        # coalesce below keeps the stored value
+        insert_rows = [
+            {column: values.get(column, null()) for column in columns}
+            for values in rows
+        ]
+
+        # The aggregates of the threads change with their steps, in this transaction
+        stored_steps = await thread_aggregate_repo.lock(rows, session)
+
+        stmt = insert(Step).values(insert_rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            # createdAt is the keyset of the step pages, an update keeps the
+            # stored one
+            set_={
+                column: func.coalesce(stmt.excluded[column], Step.__table__.c[column])
+                for column in columns
+                if column not in ("id", "createdAt")
+            },
+        )
+
+        if returning is not None:
+            # Only the requested columns come back, the step is neither
+            # reloaded with its scores nor mapped
+            result = await session.execute(
+                stmt.returning(
+                    *(
+                        Step.__table__.c[column]
+                        for column in sorted({"id", "createdAt", *returning})
+                    )
+                )
+            )
+            upserted = {
+                row.id: MapperUtility.map_step_row_to_stepstype(row._mapping)
+                for row in result.all()
+            }
+        else:
+            result = await session.scalars(
+                stmt.returning(Step)
+                .options(selectinload(Step.scores))
+                .execution_options(populate_existing=True)
+            )
+            upserted = {
+                step.id: await MapperUtility.map_step_to_stepstype(step)
+                for step in result.all()
+            }
+
+        # Also gives the threads new versions, both threads of a moved step
+        await thread_aggregate_repo.add_steps(rows, stored_steps, session)
+        return upserted
+
+    async def _missing_thread_ids(self, thread_ids: set, session) -> set:
+        # Primary key lookup only, the thread and its steps are never loaded
+        result = await session.execute(
+            select(Thread.id).where(Thread.id.in_(thread_ids - {None}))
+        )
+        return thread_ids - set(result.scalars().all())
+
+    async def upsert_steps(
+        self, steps: List[dict], returning: Optional[List[str]] = None
+    ) -> List[StepsType]:
+        """
+        Upserts a batch of steps in a single transaction.
+
+        Steps whose thread does not exist yet are parked and written when the
+        thread is created.
+
+        :param steps: Keyword arguments of `upsert_step`, one dict per step.
+        :param returning: Step columns to return, None returns the mapped steps
+            with their scores, generation and attachments.
+        :return: The upserted steps, in the order they were first seen.
+        """
+        return await self.upsert_rows(
+            [StepRepository.build_step_row(**step) for step in steps], returning
+        )
+
+    async def upsert_rows(
+        self, step_rows: List[dict], returning: Optional[List[str]] = None
+    ) -> List[StepsType]:
+        """
+        Same as `upsert_steps`, for rows built by `build_step_row`.
+        """
+        # Merge repeated ids so the statement never touches a row twice
+        rows = {}
+        for values in step_rows:
+            rows.setdefault(values["id"], {}).update(values)
+
+        if not rows:
+            return []
+
         async with db.SessionLocal() as session:
             async with session.begin():  # Start a transaction
                 try:
-                    # Polling to check if the parent thread exists and is ready
-                    max_attempts = 10
-                    attempt = 0
-                    parent_thread_ready = False
-                    while attempt < max_attempts and not parent_thread_ready:
-                        parent_thread = await thread_repo.get_by_id(threadId, session)
-                        if parent_thread is not None:
-                            parent_thread_ready = True
-                        else:
-                            await asyncio.sleep(0.2)
-                            attempt += 1
-
-                    if not parent_thread_ready:
-                        raise Exception("Parent thread not ready within expected time.")
-
-                    insert_values = {
-                        key: value
-                        for key, value in {
-                            "id": id,
-                            "thread_id": threadId,
-                            "start_time": startTime,
-                            "end_time": endTime,
-                            "type": type,
-                            "error": error,
-                            "input": input,
-                            "output": output,
-                            "meta_data": metadata,
-                            "parent_id": parentId,
-                            "name": name,
-                            "tags": tags, 
-                            "scores": scores,
-                            "generation": (
-                                MapperUtility.serialize_generation_payload(generation)
-                                if generation is not None
-                                else None
-                            ),
-                            "attachments": (
-                                MapperUtility.serialize_attachments_payload(attachments)
-                                if attachments is not None
-                                else None
-                            ),
-                            "createdAt": datetime.now(timezone.utc),
-                        }.items()
-                        if value is not None
-                    }
+                    thread_ids = {values.get("thread_id") for values in rows.values()}
+                    missing_thread_ids = await self._missing_thread_ids(
+                        thread_ids, session
+                    )
+                    if None in missing_thread_ids:
+                        raise ValueError("Steps must reference a thread.")
 
-                    # Execute an upsert using SQLAlchemy's Core expression language
-                    stmt = (
-                        insert(Step)
-                        .values(**insert_values)
-                        .on_conflict_do_update(
-                            index_elements=[
-                                "id"
-                            ],  # Specify the constraint (primary key) causing the conflict
-                            set_={
-                                k: v
-                                for k, v in insert_values.items()
-                                if v is not None and k != "id"
-                            },
+                    if missing_thread_ids:
+                        # Re-check under the thread locks, a thread created
+                        # meanwhile has either committed or will flush the steps
+                        for thread_id in sorted(missing_thread_ids):
+                            await pending_step_repo.lock_thread(thread_id, session)
+                        missing_thread_ids = await self._missing_thread_ids(
+                            missing_thread_ids, session
                         )
-                    )
-                    await session.execute(stmt)
 
-                    # Retrieve the updated/inserted step
-                    updated_step = await session.get(
-                        Step, id, options=[joinedload(Step.scores)]
-                    )
+                    pending_rows = [
+                        values
+                        for values in rows.values()
+                        if values["thread_id"] in missing_thread_ids
+                    ]
+                    ready_rows = [
+                        values
+                        for values in rows.values()
+                        if values["thread_id"] not in missing_thread_ids
+                    ]
 
-                    # Map the updated_step to the schema
-                    step_type = await MapperUtility.map_step_to_stepstype(updated_step)
+                    upserted_steps = {}
+                    if ready_rows:
+                        upserted_steps = await self._upsert_rows(
+                            ready_rows, session, returning
+                        )
+                    if pending_rows:
+                        await pending_step_repo.park(pending_rows, session)
 
-                    return step_type
+                    upserted = [
+                        upserted_steps.get(id)
+                        or StepRepository._pending_step_type(values)
+                        for id, values in rows.items()
+                    ]
 
                 except Exception as e:
                     await session.rollback()
                     raise e
 
+            return upserted
+
+    async def flush_pending(self, thread_id: str, session) -> int:
+        """
+        Writes the steps parked for a thread, inside the caller's transaction.
+
+        :return: The number of steps written.
+        """
+        await pending_step_repo.lock_thread(thread_id, session)
+        rows = await pending_step_repo.take(thread_id, session)
+        if rows:
+            await self._upsert_rows(rows, session, returning=["id"])
+        return len(rows)
+
+    async def get_by_thread_ids(self, thread_ids: List[str]) -> Dict[str, List[Step]]:
+        """
+        Steps of several threads with one query, ordered by creation time.
+
+        :return: The steps keyed by thread id, without their scores.
+        """
+        async with db.SessionLocal() as session:
+            result = await session.scalars(
+                select(Step)
+                .where(Step.thread_id.in_(thread_ids))
+                .order_by(Step.createdAt)
+            )
+            steps = {}
+            for step in result.all():
+                steps.setdefault(step.thread_id, []).append(step)
+            return steps
+
+    async def get_page(
+        self,
+        thread_id: str,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        types: Optional[List[str]] = None,
+        since: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+    ) -> StepConnection:
+        """
+        A page of the steps of a thread in creation order, see `get_pages`.
+        """
+        pages = await self.get_pages(
+            [thread_id],
+            first=first,
+            after=after,
+            types=types,
+            since=since,
+            columns=columns,
+        )
+        return pages[thread_id]
+
+    async def get_pages(
+        self,
+        thread_ids: List[str],
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        types: Optional[List[str]] = None,
+        since: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+    ) -> Dict[str, StepConnection]:
+        """
+        A page of the steps of several threads in creation order, with one query.
+
+        Pages are read with keyset conditions on (createdAt, id), backed by the
+        (thread_id, createdAt, id) index, so reading a page late in a long
+        thread costs the same as reading the first one.
+
+        :param types: Only steps of these types.
+        :param since: Only steps created at or after this time.
+        :param columns: Step columns to load, None loads whole steps. Scores are
+            left to the resolvers.
+        :return: The pages keyed by thread id.
+        """
+        async with db.SessionLocal() as session:
+            sort_keys = [Step.createdAt, Step.id]
+            # The page of each thread is a lateral subquery walking the
+            # (thread_id, createdAt, id) index, which stops after the page
+            if columns is not None:
+                page = select(
+                    *(
+                        getattr(Step, column)
+                        for column in sorted({*columns, "id", "thread_id", "createdAt"})
+                    )
+                )
+            else:
+                page = select(Step)
+            page = page.where(Step.thread_id == Thread.id).order_by(*sort_keys)
+            if types:
+                page = page.where(Step.type.in_(types))
+            if since is not None:
+                page = page.where(Step.createdAt >= since)
+            # A cursor of a deleted step has no position, the pages are empty
+            # instead of starting over from the first one
+            if after:
+                cursor = await StepRepository._decode_cursor(after, session)
+                if cursor is None:
+                    return {
+                        thread_id: StepRepository._empty_connection()
+                        for thread_id in thread_ids
+                    }
+                page = page.where(tuple_(*sort_keys) > tuple_(*cursor))
+            # One more row tells whether there is another page
+            if first is not None:
+                page = page.limit(first + 1)
+            page = page.lateral()
+
+            page_step = aliased(Step, page)
+            query = (
+                select(page_step)
+                .select_from(Thread)
+                .join(page, true())
+                .where(Thread.id.in_(thread_ids))
+            )
+            if columns is not None:
+                query = query.options(
+                    load_only(
+                        *(
+                            getattr(page_step, column)
+                            for column in sorted({*columns, "thread_id", "createdAt"})
+                        )
+                    )
+                )
+
+            steps_by_thread_id = {thread_id: [] for thread_id in thread_ids}
+            for step in (await session.scalars(query)).all():
+                steps_by_thread_id[step.thread_id].append(step)
+
+            pages = {}
+            for thread_id, steps in steps_by_thread_id.items():
+                steps.sort(key=lambda step: (step.createdAt, step.id))
+                has_next_page = first is not None and len(steps) > first
+                steps = steps[:first]
+
+                edges = [
+                    StepEdge(
+                        node=await MapperUtility.map_step_to_stepstype(step),
+                        cursor=MapperUtility.encode_cursor([step.createdAt, step.id]),
+                    )
+                    for step in steps
+                ]
+                pages[thread_id] = StepConnection(
+                    edges=edges,
+                    page_info=PageInfo(
+                        has_next_page=has_next_page,
+                        has_previous_page=after is not None,
+                        start_cursor=edges[0].cursor if edges else None,
+                        end_cursor=edges[-1].cursor if edges else None,
+                    ),
+                )
+            return pages
+
+    @staticmethod
+    def _empty_connection() -> StepConnection:
+        return StepConnection(
+            edges=[],
+            page_info=PageInfo(
+                has_next_page=False,
+                has_previous_page=False,
+                start_cursor=None,
+                end_cursor=None,
+            ),
+        )
+
+    @staticmethod
+    async def _decode_cursor(cursor: str, session) -> Optional[list]:
+        # Other cursors are taken for a step id, None when the step does not exist
+        position = MapperUtility.decode_cursor(cursor)
+        if position is not None and len(position) == 2:
+            try:
+                return [datetime.fromisoformat(position[0]), position[1]]
+            except (ValueError, TypeError):
+                pass
+        id = position[-1] if position is not None else MapperUtility.decode_id(cursor)
+        row = (
+            await session.execute(
+                select(Step.createdAt, Step.id).where(Step.id == id)
+            )
+        ).first()
+        return list(row) if row is not None else None
+
+    async def upsert_step(
+        self,
+        id: str,
+        threadId: str,
+        startTime: Optional[datetime] = None,
+        endTime: Optional[datetime] = None,
+        type: Optional[str] = None,
+        error: Optional[str] = None,
+        input: Optional[Json] = None,
+        output: Optional[Json] = None,
+        metadata: Optional[Json] = None,
+        parentId: Optional[str] = None,
+        name: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        scores: Optional[List[ScorePayloadInput]] = None,
+        generation: Optional[GenerationPayloadInput] = None,
+        attachments: Optional[List[AttachmentPayloadInput]] = None,
+        returning: Optional[List[str]] = None,
+    ) -> StepsType:
+        (step_type,) = await self.upsert_steps(
+            [
+                {
+                    "id": id,
+                    "threadId": threadId,
+                    "startTime": startTime,
+                    "endTime": endTime,
+                    "type": type,
+                    "error": error,
+                    "input": input,
+                    "output": output,
+                    "metadata": metadata,
+                    "parentId": parentId,
+                    "name": name,
+                    "tags": tags,
+                    "scores": scores,
+                    "generation": generation,
+                    "attachments": attachments,
+                }
+            ],
+            returning,
+        )
+        return step_type
+
 
 step_repo = StepRepository()
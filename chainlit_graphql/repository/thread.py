@@ -1,5 +1,9 @@
+from chainlit_graphql.model.thread import (
+    THREAD_VERSION_SEQUENCE,
+    Thread,
+    participant_sort_key,
+)
 from chainlit_graphql.model.participant import Participant
-from chainlit_graphql.model.thread import Thread
 from chainlit_graphql.model.step import Step
 import strawberry
 from chainlit_graphql.api.v1.graphql.scalars.json_scalar import Json
@@ -10,18 +14,46 @@ from chainlit_graphql.api.v1.graphql.schema.thread import (
     PageInfo,
     ParticipantType,
     ThreadsInputType,
+    ThreadsOrderByInput,
+    ThreadsOrderByInputColumn,
+    Direction,
 )
+from chainlit_graphql.api.v1.graphql.selection import ThreadProjection
 from chainlit_graphql.db.database import db
+from chainlit_graphql.repository.step import step_repo
+from chainlit_graphql.repository.thread_filter import ThreadFilterCompiler
 from sqlalchemy.sql import select
-from sqlalchemy.orm import selectinload, joinedload
-from sqlalchemy import desc, update, text
+from sqlalchemy.orm import joinedload, load_only, selectinload
+from sqlalchemy import (
+    DateTime,
+    String,
+    cast,
+    desc,
+    func,
+    inspect,
+    literal_column,
+    null,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONB, insert
 from sqlalchemy.exc import SQLAlchemyError
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import datetime, timezone
 import base64
 
+from chainlit_graphql.core.config import settings
 from chainlit_graphql.core.mappers import MapperUtility
 
+# Sort key of each orderBy column, the thread id breaks ties
+THREAD_SORT_KEYS = {
+    ThreadsOrderByInputColumn.createdAt: Thread.createdAt,
+    ThreadsOrderByInputColumn.participant: participant_sort_key(),
+    ThreadsOrderByInputColumn.tokenCount: Thread.token_count,
+}
+
 
 class ThreadRepository:
 
@@ -35,113 +67,92 @@ class ThreadRepository:
         last: Optional[int] = None,
         projectId: Optional[str] = None,
         skip: Optional[int] = None,
+        projection: Optional[ThreadProjection] = None,
+        orderBy: Optional[ThreadsOrderByInput] = None,
     ) -> ThreadConnection:
         async for session in db.get_db():
             try:
-                # Base query
-                query = (
-                    select(Thread)
-                    .options(
-                        selectinload(Thread.steps).selectinload(Step.scores),
-                        selectinload(Thread.participant),
-                    )
-                    .order_by(desc(Thread.createdAt))
+                # Paging backwards reads the rows before the cursor in reverse order
+                backward = before is not None and after is None
+                page_size = last if backward and last is not None else first
+                if page_size is None:
+                    page_size = last
+
+                sort_keys, descending = ThreadRepository._sort_keys(orderBy, filters)
+                ascending = descending if backward else not descending
+
+                # Base query, only the selected columns and relations are loaded
+                query = select(Thread, *sort_keys[:-1]).options(
+                    *ThreadRepository._projection_options(projection)
                 )
+                if ascending:
+                    query = query.order_by(*sort_keys)
+                else:
+                    query = query.order_by(*(desc(key) for key in sort_keys))
 
-                # Apply cursor anchor conditions
+                # Threads created after the anchor are left out, pages stay stable
                 if cursorAnchor:
-                    if after:
-                        query = query.where(Thread.createdAt > cursorAnchor)
-                    elif before:
-                        query = query.where(Thread.createdAt < cursorAnchor)
+                    query = query.where(Thread.createdAt <= cursorAnchor)
 
-                # Apply cursor-based pagination
+                # Keyset pagination, backed by the (sort key, id) index of the order
+                # A cursor of a deleted thread has no position, the page is empty
+                # instead of starting over from the first one
                 if after:
-                    cursor_id = base64.b64decode(after).decode().split(":")[1]
-                    query = query.where(Thread.id > cursor_id)
+                    cursor = await ThreadRepository._decode_cursor(
+                        after, sort_keys, session
+                    )
+                    if cursor is None:
+                        return ThreadRepository._empty_connection()
+                    query = query.where(
+                        tuple_(*sort_keys).op("<" if descending else ">")(
+                            tuple_(*cursor)
+                        )
+                    )
                 if before:
-                    cursor_id = base64.b64decode(before).decode().split(":")[1]
-                    query = query.where(Thread.id < cursor_id)
+                    cursor = await ThreadRepository._decode_cursor(
+                        before, sort_keys, session
+                    )
+                    if cursor is None:
+                        return ThreadRepository._empty_connection()
+                    query = query.where(
+                        tuple_(*sort_keys).op(">" if descending else "<")(
+                            tuple_(*cursor)
+                        )
+                    )
 
                 # Apply additional filters (if provided)
-                if filters:
-                    for filter in filters:
-                        if filter.field == "participantId":
-                            # Extract the operator and values from the filter
-                            operator = filter.operator
-                            identifiers = filter.value
-
-                            # Apply filter based on the operator
-                            if operator == "eq":
-                                query = query.where(Thread.participantId == identifiers)
-                            elif operator == "in":
-                                participant_ids = await session.execute(
-                                    select(Participant.id).where(
-                                        Participant.identifier.in_(identifiers)
-                                    )
-                                )
-                                participant_ids_list = [id[0] for id in participant_ids]
-                                query = query.join(Thread.participant).where(
-                                    Participant.id.in_(participant_ids_list)
-                                )
-                            elif operator == "nin":
-                                participant_ids = await session.execute(
-                                    select(Participant.id).where(
-                                        Participant.identifier.in_(identifiers)
-                                    )
-                                )
-                                participant_ids_list = [id[0] for id in participant_ids]
-                                query = query.join(Thread.participant).where(
-                                    ~Participant.id.in_(participant_ids_list)
-                                )
-
-                # Skip and limit
+                query = query.where(*ThreadFilterCompiler.compile(filters))
+
+                # Skip and limit, one more row tells whether there is another page
                 if skip is not None:
                     query = query.offset(skip)
-                if first is not None:
-                    query = query.limit(first)
-                elif last is not None:
-                    query = query.limit(last)
+                if page_size is not None:
+                    query = query.limit(page_size + 1)
 
                 # Execute query for threads
                 result = await session.execute(query)
-                threads = result.scalars().all()
-                # Manually fetch steps and participant for each thread
+                rows = result.all()
+
+                has_more = page_size is not None and len(rows) > page_size
+                rows = rows[:page_size]
+                if backward:
+                    rows.reverse()
+                    has_next_page, has_previous_page = True, has_more
+                else:
+                    has_next_page, has_previous_page = has_more, after is not None
+
                 edges = []
-                for thread in threads:
+                for thread, *position in rows:
                     thread_type = await ThreadRepository.map_to_thread_type(thread)
                     edges.append(
                         ThreadEdge(
                             node=thread_type,
-                            cursor=base64.b64encode(
-                                f"Thread:{thread.id}".encode()
-                            ).decode(),
+                            cursor=ThreadRepository.encode_cursor(
+                                [*position, thread.id]
+                            ),
                         )
                     )
 
-                # Check for more pages
-                has_next_page = False
-                has_previous_page = False
-
-                if len(threads) > 0 and first is not None:
-                    next_page_check_query = select(Thread).where(
-                        Thread.id > threads[-1].id
-                    )
-                    next_page_check_result = await session.execute(
-                        next_page_check_query
-                    )
-                    has_next_page = next_page_check_result.scalar() is not None
-
-                if len(threads) > 0 and (after is not None or before is not None):
-                    prev_page_check_query = select(Thread).where(
-                        Thread.id < threads[0].id
-                    )
-                    prev_page_check_result = await session.execute(
-                        prev_page_check_query
-                    )
-                    has_previous_page = prev_page_check_result.scalar() is not None
-
-                # PageInfo using first and last thread IDs for cursors
                 start_cursor = edges[0].cursor if edges else None
                 end_cursor = edges[-1].cursor if edges else None
 
@@ -152,13 +163,201 @@ class ThreadRepository:
                     end_cursor=end_cursor,
                 )
 
-                return ThreadConnection(
-                    edges=edges, page_info=page_info, total_count=len(edges)
-                )
+                return ThreadConnection(edges=edges, page_info=page_info)
             except Exception as e:
                 print("Failed to get paginated threads: %s", e)
                 raise e
 
+    async def count_threads(
+        self,
+        cursorAnchor: Optional[datetime] = None,
+        filters: Optional[List[ThreadsInputType]] = None,
+        estimated: bool = False,
+    ) -> int:
+        """
+        Number of threads matching the filters of a threads query.
+
+        :param estimated: Return the planner's row estimate instead of counting
+            when the threads table holds at least THREAD_COUNT_ESTIMATE_MIN_ROWS
+            rows, pg_class.reltuples without filters and the EXPLAIN estimate
+            with filters.
+        """
+        async for session in db.get_db():
+            try:
+                query = select(Thread.id)
+                if cursorAnchor:
+                    query = query.where(Thread.createdAt <= cursorAnchor)
+                query = query.where(*ThreadFilterCompiler.compile(filters))
+
+                if estimated:
+                    # reltuples is -1 until the table has been analyzed
+                    table_rows = await session.scalar(
+                        text(
+                            "SELECT reltuples::bigint FROM pg_class "
+                            "WHERE oid = 'threads'::regclass"
+                        )
+                    )
+                    if table_rows >= settings.THREAD_COUNT_ESTIMATE_MIN_ROWS:
+                        if query.whereclause is None:
+                            return table_rows
+                        return await ThreadRepository._estimate_rows(query, session)
+
+                return await session.scalar(
+                    select(func.count()).select_from(query.subquery())
+                )
+            except Exception as e:
+                print("Failed to count threads: %s", e)
+                raise e
+
+    @staticmethod
+    async def _estimate_rows(query, session) -> int:
+        compiled = query.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+        plan = await session.scalar(
+            text("EXPLAIN (FORMAT JSON) " + str(compiled).replace(":", r"\:"))
+        )
+        return plan[0]["Plan"]["Plan Rows"]
+
+    @staticmethod
+    def _sort_keys(
+        orderBy: Optional[ThreadsOrderByInput],
+        filters: Optional[List[ThreadsInputType]],
+    ) -> Tuple[list, bool]:
+        """
+        The sort keys of a threads query, the thread id last, and whether they
+        are sorted in descending order.
+
+        Threads are listed by relevance when their steps are searched and no
+        order is given, otherwise by the ordered column.
+        """
+        column = orderBy.column if orderBy is not None else None
+        descending = orderBy is None or orderBy.direction != Direction.ASC
+
+        if column is None:
+            rank = ThreadFilterCompiler.rank(filters)
+            if rank is not None:
+                return [rank, Thread.createdAt, Thread.id], True
+            column = ThreadsOrderByInputColumn.createdAt
+        return [THREAD_SORT_KEYS[column], Thread.id], descending
+
+    @staticmethod
+    def encode_cursor(position: list) -> str:
+        """
+        Opaque cursor of a thread, its values of the sort keys of the query.
+        """
+        return MapperUtility.encode_cursor(position)
+
+    @staticmethod
+    async def _decode_cursor(cursor: str, sort_keys: list, session) -> Optional[list]:
+        """
+        The values of the sort keys at a cursor.
+
+        Cursors of another order, of the "Thread:<id>" form and plain thread ids
+        are looked up by thread id, None when the thread does not exist.
+        """
+        position = MapperUtility.decode_cursor(cursor)
+        if position is not None:
+            id = position[-1]
+        else:
+            id = MapperUtility.decode_id(cursor)
+
+        if position is not None and len(position) == len(sort_keys):
+            try:
+                return [
+                    ThreadRepository._cursor_value(key, value)
+                    for key, value in zip(sort_keys, position)
+                ]
+            except (ValueError, TypeError):
+                # Values of another order's keys
+                pass
+
+        row = (
+            await session.execute(select(*sort_keys).where(Thread.id == id))
+        ).first()
+        return list(row) if row is not None else None
+
+    @staticmethod
+    def _empty_connection() -> ThreadConnection:
+        return ThreadConnection(
+            edges=[],
+            page_info=PageInfo(
+                has_next_page=False,
+                has_previous_page=False,
+                start_cursor=None,
+                end_cursor=None,
+            ),
+        )
+
+    @staticmethod
+    def _cursor_value(key, value):
+        if isinstance(key.type, DateTime):
+            return datetime.fromisoformat(value)
+        if isinstance(key.type, String):
+            if not isinstance(value, str):
+                raise TypeError(f"Not a string: {value!r}")
+        elif isinstance(value, (bool, str)) or value is None:
+            raise TypeError(f"Not a number: {value!r}")
+        return value
+
+    @staticmethod
+    def _projection_options(projection: Optional[ThreadProjection]) -> list:
+        """
+        Loader options reading only the columns and relations of a projection.
+
+        Without a projection whole threads are loaded and their relations are left
+        to the resolvers.
+        """
+        if projection is None:
+            return []
+
+        options = [
+            load_only(*(getattr(Thread, column) for column in projection.thread_columns))
+        ]
+        if projection.step_columns is not None:
+            # Step payloads are only read when they are selected
+            steps = selectinload(Thread.steps).load_only(
+                *(getattr(Step, column) for column in projection.step_columns)
+            )
+            if projection.step_scores:
+                steps = steps.selectinload(Step.scores)
+            options.append(steps)
+        if projection.participant:
+            # The other threads of the participant are never needed here
+            options.append(
+                selectinload(Thread.participant).noload(Participant.threads)
+            )
+        return options
+
+    @staticmethod
+    def _merge_metadata(stored, incoming):
+        # jsonb `||` merges the keys server-side, a missing or JSON null stored
+        # value counts as an empty object and no incoming metadata keeps it as is
+        merged = func.coalesce(
+            func.nullif(stored, literal_column("'null'::jsonb")),
+            literal_column("'{}'::jsonb"),
+        ).op("||")(cast(incoming, JSONB))
+        return func.coalesce(merged, stored)
+
+    @staticmethod
+    def map_row_to_thread_type(row) -> ThreadType:
+        # Thread row only, steps and participant are not loaded
+        return ThreadType(
+            id=row.id,
+            name=row.name,
+            metadata=row.meta_data,
+            environment=row.environment,
+            tags=row.tags,
+            createdAt=row.createdAt,
+            participant_id=row.participant_id,
+            tokenCount=row.token_count,
+            duration=ThreadRepository._seconds(row.duration),
+        )
+
+    @staticmethod
+    def _seconds(duration: Optional[float]) -> Optional[int]:
+        return None if duration is None else round(duration)
+
     async def upsert_thread(
         self,
         id: Optional[str],
@@ -167,84 +366,95 @@ class ThreadRepository:
         metadata: Optional[Json],
         participantId: Optional[str] = None,
         environment: Optional[str] = None,
-    ) -> ThreadType:
+    ) -> Optional[ThreadType]:
+        """
+        Creates or updates a thread with a single statement.
+
+        Provided fields overwrite the stored ones, metadata is merged into the
+        stored metadata. The cost does not depend on the number of steps of the
+        thread, which are neither loaded nor returned.
+
+        :return: The thread row, or None when the thread does not exist and no
+            participant is given.
+        """
+        if not id:
+            return None
+
+        id = MapperUtility.decode_id(id)
+        # Missing values are rendered as SQL NULL so the coalesce keeps the stored value
+        values = {
+            "name": name if name is not None else null(),
+            "meta_data": metadata if metadata is not None else null(),
+            "environment": environment if environment is not None else null(),
+            "tags": tags if tags is not None else null(),
+        }
+        columns = Thread.__table__.c
+
         async with db.SessionLocal() as session:
             async with session.begin():  # Start a transaction
                 try:
-                    if id:
-                        try:
-                            # Attempt to decode as base64
-                            decoded_id = base64.b64decode(id).decode()
-                            # Extract the ID part if it follows the 'Type:id' format
-                            if ":" in decoded_id:
-                                id = decoded_id.split(":")[1]
-                        except (base64.binascii.Error, UnicodeDecodeError):
-                            # If decoding fails, assume it's a regular UUID and do nothing
-                            pass
-                        existing_thread = await thread_repo.get_by_id(id, session)
-                        if existing_thread:
-                            if name is not None:
-                                existing_thread.name = name
-                            if metadata is not None:
-                                # Ensure existing metadata is a dictionary
-                                if existing_thread.meta_data is None:
-                                    existing_thread.meta_data = {}
-
-                                # Update existing meta_data with new meta_data
-                                for key, value in metadata.items():
-                                    existing_thread.meta_data[key] = value
-                            if environment is not None:
-                                existing_thread.environment = environment
-                            if tags is not None:
-                                existing_thread.tags = tags
-
-                            updated_thread = await ThreadRepository.update(
-                                id, existing_thread, session
-                            )
-
-                            # await session.commit()
-
-                            thread_type = await ThreadRepository.map_to_thread_type(
-                                updated_thread
-                            )
-
-                            if not updated_thread:
-                                raise ValueError(f"Thread with id {id} not found")
-
-                            return thread_type
-
-                        else:
-                            # Check for inferred deletion context
-                            if participantId is None:
-                                # Skip insertion since it might be a deletion context
-                                return None
-                            thread_to_create = Thread(
-                                id=id,
-                                name=name,
-                                meta_data=metadata,
-                                participant_id=participantId,
-                                environment=environment,
-                                tags=tags,
-                                createdAt=datetime.now(timezone.utc),
-                            )
-                            created_thread = await ThreadRepository.create(
-                                thread_to_create, session
+                    if participantId is None:
+                        # Skip insertion since it might be a deletion context
+                        stmt = (
+                            update(Thread)
+                            .where(Thread.id == id)
+                            .values(
+                                name=func.coalesce(values["name"], columns.name),
+                                meta_data=ThreadRepository._merge_metadata(
+                                    columns.meta_data, values["meta_data"]
+                                ),
+                                environment=func.coalesce(
+                                    values["environment"], columns.environment
+                                ),
+                                tags=func.coalesce(values["tags"], columns.tags),
+                                version=THREAD_VERSION_SEQUENCE.next_value(),
                             )
+                            .returning(*columns, literal_column("false").label("inserted"))
+                        )
+                    else:
+                        stmt = insert(Thread).values(
+                            id=id,
+                            participant_id=participantId,
+                            createdAt=datetime.now(timezone.utc),
+                            **values,
+                        )
+                        stmt = stmt.on_conflict_do_update(
+                            index_elements=["id"],
+                            set_={
+                                "name": func.coalesce(stmt.excluded.name, columns.name),
+                                "meta_data": ThreadRepository._merge_metadata(
+                                    columns.meta_data, stmt.excluded.meta_data
+                                ),
+                                "environment": func.coalesce(
+                                    stmt.excluded.environment, columns.environment
+                                ),
+                                "tags": func.coalesce(stmt.excluded.tags, columns.tags),
+                                "version": THREAD_VERSION_SEQUENCE.next_value(),
+                            },
+                        ).returning(
+                            # xmax is 0 for a row version created by an insert
+                            *columns, literal_column("xmax = 0").label("inserted")
+                        )
 
-                            thread_type = await ThreadRepository.map_to_thread_type(
-                                created_thread
-                            )
+                    row = (await session.execute(stmt)).first()
+                    if row is None:
+                        return None
 
-                            # await session.commit()
-                            return thread_type
+                    if row.inserted:
+                        # Write the steps that were ingested before the thread existed
+                        await step_repo.flush_pending(id, session)
 
-                    return None
+                    thread = ThreadRepository.map_row_to_thread_type(row)
 
                 except Exception as e:
                     await session.rollback()
                     raise e
 
-    async def _get_by_id_with_session(self, id: str) -> Optional[Thread]:
+            return thread
+
+    async def _get_by_id_with_session(
+        self, id: str, projection: Optional[ThreadProjection] = None
+    ) -> Optional[ThreadType]:
         async for session in db.get_db():
             try:  # Attempt to decode as base64
                 decoded_id = base64.b64decode(id).decode()
@@ -254,14 +464,11 @@ class ThreadRepository:
             except (base64.binascii.Error, UnicodeDecodeError):
                 # If decoding fails, assume it's a regular UUID and do nothing
                 pass
+            # Only the selected columns and relations are loaded
             stmt = (
                 select(Thread)
                 .where(Thread.id == id)
-                .options(
-                    joinedload(Thread.steps).joinedload(Step.scores),
-                    joinedload(Thread.participant),
-                )
-                .order_by(text('"steps_1"."createdAt"'))
+                .options(*ThreadRepository._projection_options(projection))
             )
 
             result = await session.execute(stmt)
@@ -292,69 +499,21 @@ class ThreadRepository:
             await session.rollback()
             raise e
 
-    @staticmethod
-    async def update(id: Optional[str], model: Thread, session) -> Optional[Thread]:
-        if id:
-            # Construct the update statement
-            stmt = (
-                update(Thread)
-                .where(Thread.id == id)
-                .values(
-                    name=model.name,
-                    meta_data=model.meta_data,
-                    environment=model.environment,
-                    tags=model.tags,
-                )
-            )
-
-            # Execute the update statement
-            await session.execute(stmt)
-            await session.flush()
-
-            # Retrieve the updated model with eager loading for steps and their score, and participant
-            result = await session.execute(
-                select(Thread)
-                .where(Thread.id == id)
-                .options(
-                    selectinload(Thread.steps).selectinload(Step.scores),
-                    selectinload(Thread.participant),
-                )
-            )
-            updated_model = result.scalars().first()
-
-            return updated_model
-        else:
-            return None
-
-    @staticmethod
-    async def create(thread_data: Thread, session) -> Thread:
-        # Add the new Thread to the session
-        session.add(thread_data)
-        await session.flush()
-
-        # Retrieve the created Thread with eager loading for steps and their scores, and participant
-        result = await session.execute(
-            select(Thread)
-            .where(Thread.id == thread_data.id)
-            .options(
-                selectinload(Thread.steps).selectinload(Step.scores),
-                selectinload(Thread.participant),
-            )
-        )
-        created_thread = result.scalars().first()
-
-        return created_thread
-
     @staticmethod
     async def map_to_thread_type(thread_model) -> ThreadType:
         try:
-            steps_types = [
-                await MapperUtility.map_step_to_stepstype(step)
-                for step in thread_model.steps
-            ]
+            # Relationships that were not loaded with the thread are resolved on demand
+            unloaded = inspect(thread_model).unloaded
+
+            steps_types = None
+            if "steps" not in unloaded:
+                steps_types = [
+                    await MapperUtility.map_step_to_stepstype(step)
+                    for step in thread_model.steps
+                ]
 
             participant = None
-            if thread_model.participant:
+            if "participant" not in unloaded and thread_model.participant:
                 participant = ParticipantType(
                     id=thread_model.participant.id,
                     identifier=thread_model.participant.identifier,
@@ -362,17 +521,20 @@ class ThreadRepository:
                     createdAt=thread_model.participant.createdAt,
                 )
 
-            # Return ThreadType with all mapped information
+            # Return ThreadType with all mapped information, unselected columns are None
+            value = MapperUtility.loaded_value
             return ThreadType(
                 id=thread_model.id,
-                name=thread_model.name,
-                metadata=thread_model.meta_data,
-                environment=thread_model.environment,
-                tags=thread_model.tags,
-                createdAt=thread_model.createdAt,
-                participant_id=thread_model.participant_id,
-                steps=steps_types,
-                participant=participant,
+                name=value(thread_model, "name"),
+                metadata=value(thread_model, "meta_data"),
+                environment=value(thread_model, "environment"),
+                tags=value(thread_model, "tags"),
+                createdAt=value(thread_model, "createdAt"),
+                participant_id=value(thread_model, "participant_id"),
+                tokenCount=value(thread_model, "token_count"),
+                duration=ThreadRepository._seconds(value(thread_model, "duration")),
+                preloaded_steps=steps_types,
+                preloaded_participant=participant,
             )
 
         except SQLAlchemyError as e:
@@ -0,0 +1,270 @@
+from chainlit_graphql.model.step import Step
+from chainlit_graphql.model.thread import THREAD_VERSION_SEQUENCE, Thread
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.db.database import db
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    String,
+    cast,
+    column,
+    func,
+    select,
+    update,
+    values as sql_values,
+)
+from sqlalchemy.sql.elements import ColumnElement
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Token counters of a thread, in the order of `generation_tokens`
+TOKEN_COLUMNS = ("token_count", "input_token_count", "output_token_count")
+
+
+def generation_tokens(generation: Optional[dict]) -> Tuple[int, int, int]:
+    """
+    Total, input and output tokens of a step generation.
+
+    The total is the tokenCount of the generation, or its input and output
+    counts when it has none.
+    """
+    if not generation:
+        return 0, 0, 0
+    input_tokens = int(generation.get("inputTokenCount") or 0)
+    output_tokens = int(generation.get("outputTokenCount") or 0)
+    total = generation.get("tokenCount")
+    if total is None:
+        total = input_tokens + output_tokens
+    return int(total), input_tokens, output_tokens
+
+
+def generation_token_columns(generation) -> Tuple[ColumnElement, ...]:
+    """
+    SQL counterpart of `generation_tokens` for a generation column.
+    """
+    input_tokens = func.coalesce(
+        cast(generation.op("->>")("inputTokenCount"), Integer), 0
+    )
+    output_tokens = func.coalesce(
+        cast(generation.op("->>")("outputTokenCount"), Integer), 0
+    )
+    total = func.coalesce(
+        cast(generation.op("->>")("tokenCount"), Integer),
+        input_tokens + output_tokens,
+    )
+    return total, input_tokens, output_tokens
+
+
+class ThreadAggregateRepository:
+    """
+    Keeps the step aggregates of the threads table up to date.
+
+    Step upserts apply the difference they make to their threads inside their
+    own transaction, so reading or filtering on the aggregates never touches
+    the steps. The timestamps only grow, a step moved to a later start keeps
+    the earlier one until the thread is refreshed.
+    """
+
+    @staticmethod
+    async def lock(rows: List[dict], session) -> Dict[str, tuple]:
+        """
+        Locks the threads of the step rows and reads the stored steps.
+
+        Steps of a thread are then written one transaction at a time, so the
+        stored values cannot change before `add_steps` applies the difference.
+
+        :return: The thread id, tokens, start and end time of the stored steps,
+            keyed by step id.
+        """
+        thread_ids = sorted({values["thread_id"] for values in rows})
+        await session.execute(
+            select(Thread.id)
+            .where(Thread.id.in_(thread_ids))
+            .order_by(Thread.id)
+            .with_for_update(key_share=True)
+        )
+        result = await session.execute(
+            select(
+                Step.id,
+                Step.thread_id,
+                Step.start_time,
+                Step.end_time,
+                *generation_token_columns(Step.generation),
+            ).where(Step.id.in_([values["id"] for values in rows]))
+        )
+        return {
+            row[0]: (row[1], tuple(row[4:]), row[2], row[3]) for row in result.all()
+        }
+
+    @staticmethod
+    async def add_steps(rows: List[dict], stored: Dict[str, tuple], session):
+        """
+        Applies the upsert of the step rows to the aggregates of their threads.
+
+        :param rows: The upserted step values, missing keys kept the stored value.
+        :param stored: The steps before the upsert, as returned by `lock`.
+        """
+        deltas = {}
+
+        def delta(thread_id: str) -> dict:
+            return deltas.setdefault(
+                thread_id,
+                {
+                    "id": thread_id,
+                    "step_count": 0,
+                    **{name: 0 for name in TOKEN_COLUMNS},
+                    "started": None,
+                    "ended": None,
+                    "activity": None,
+                },
+            )
+
+        for values in rows:
+            previous_thread_id, previous_tokens, start_time, end_time = stored.get(
+                values["id"], (None, (0, 0, 0), None, None)
+            )
+            thread_id = values.get("thread_id") or previous_thread_id
+            tokens = (
+                generation_tokens(values["generation"])
+                if "generation" in values
+                else previous_tokens
+            )
+
+            if previous_thread_id is not None:
+                previous = delta(previous_thread_id)
+                if previous_thread_id != thread_id:
+                    previous["step_count"] -= 1
+                for name, count in zip(TOKEN_COLUMNS, previous_tokens):
+                    previous[name] -= count
+
+            current = delta(thread_id)
+            if previous_thread_id != thread_id:
+                current["step_count"] += 1
+            for name, count in zip(TOKEN_COLUMNS, tokens):
+                current[name] += count
+            current["started"] = _earliest(
+                current["started"], values.get("start_time", start_time)
+            )
+            current["ended"] = _latest(current["ended"], values.get("end_time", end_time))
+            current["activity"] = _latest(current["activity"], values.get("createdAt"))
+
+        if not deltas:
+            return
+
+        data = sql_values(
+            column("id", String),
+            column("step_count", Integer),
+            *(column(name, Integer) for name in TOKEN_COLUMNS),
+            column("started", DateTime(timezone=True)),
+            column("ended", DateTime(timezone=True)),
+            column("activity", DateTime(timezone=True)),
+            name="step_delta",
+        ).data([tuple(thread_delta.values()) for thread_delta in deltas.values()])
+
+        # VALUES types a column of NULLs as text, hence the casts. least/greatest
+        # ignore NULL, a thread without timestamps takes the new ones
+        timestamp = DateTime(timezone=True)
+        started = func.least(Thread.steps_started_at, cast(data.c.started, timestamp))
+        ended = func.greatest(Thread.steps_ended_at, cast(data.c.ended, timestamp))
+        await session.execute(
+            update(Thread)
+            .where(Thread.id == data.c.id)
+            .values(
+                step_count=func.coalesce(Thread.step_count, 0) + data.c.step_count,
+                **{
+                    name: func.coalesce(Thread.__table__.c[name], 0) + data.c[name]
+                    for name in TOKEN_COLUMNS
+                },
+                steps_started_at=started,
+                steps_ended_at=ended,
+                duration=func.extract("epoch", ended - started),
+                last_activity_at=func.greatest(
+                    Thread.last_activity_at, cast(data.c.activity, timestamp)
+                ),
+                version=THREAD_VERSION_SEQUENCE.next_value(),
+            )
+        )
+
+    @staticmethod
+    async def refresh(thread_ids: Optional[Iterable[str]], session):
+        """
+        Recomputes the aggregates of threads from all their steps.
+
+        :param thread_ids: The threads to refresh, None refreshes every thread.
+        """
+        steps = select(
+            Step.thread_id,
+            func.count().label("step_count"),
+            *(
+                func.sum(tokens).label(name)
+                for name, tokens in zip(
+                    TOKEN_COLUMNS, generation_token_columns(Step.generation)
+                )
+            ),
+            func.min(Step.start_time).label("started"),
+            func.max(Step.end_time).label("ended"),
+            func.max(Step.createdAt).label("activity"),
+        ).group_by(Step.thread_id)
+        reset = update(Thread).values(
+            step_count=0,
+            **{name: 0 for name in TOKEN_COLUMNS},
+            steps_started_at=None,
+            steps_ended_at=None,
+            duration=None,
+            last_activity_at=None,
+            version=THREAD_VERSION_SEQUENCE.next_value(),
+        )
+        if thread_ids is not None:
+            thread_ids = list(thread_ids)
+            steps = steps.where(Step.thread_id.in_(thread_ids))
+            reset = reset.where(Thread.id.in_(thread_ids))
+
+        await session.execute(reset)
+        steps = steps.subquery()
+        await session.execute(
+            update(Thread)
+            .where(Thread.id == steps.c.thread_id)
+            .values(
+                step_count=steps.c.step_count,
+                **{name: steps.c[name] for name in TOKEN_COLUMNS},
+                steps_started_at=steps.c.started,
+                steps_ended_at=steps.c.ended,
+                duration=func.extract("epoch", steps.c.ended - steps.c.started),
+                last_activity_at=steps.c.activity,
+            )
+        )
+
+    async def refresh_all(self):
+        """
+        Recomputes the aggregates of every thread, one batch per transaction.
+        """
+        after = ""
+        while True:
+            async with db.SessionLocal() as session:
+                async with session.begin():  # Start a transaction
+                    thread_ids = (
+                        await session.scalars(
+                            select(Thread.id)
+                            .where(Thread.id > after)
+                            .order_by(Thread.id)
+                            .limit(settings.THREAD_AGGREGATE_BATCH_SIZE)
+                        )
+                    ).all()
+                    if not thread_ids:
+                        return
+                    await self.refresh(thread_ids, session)
+            after = thread_ids[-1]
+
+
+def _earliest(current, value):
+    if value is None or (current is not None and current <= value):
+        return current
+    return value
+
+
+def _latest(current, value):
+    if value is None or (current is not None and current >= value):
+        return current
+    return value
+
+
+thread_aggregate_repo = ThreadAggregateRepository()
@@ -0,0 +1,424 @@
+from chainlit_graphql.model.participant import Participant
+from chainlit_graphql.model.thread import Thread
+from chainlit_graphql.model.step import Step, step_search_vector
+from chainlit_graphql.model.score import Score
+from chainlit_graphql.api.v1.graphql.schema.thread import (
+    FilterAccessorEnum,
+    FilterOperatorEnum as Op,
+    ThreadsFieldEnumType as Field,
+    ThreadsInputType,
+)
+from sqlalchemy import (
+    ARRAY,
+    Float,
+    String,
+    Text,
+    and_,
+    cast,
+    exists,
+    func,
+    literal,
+    literal_column,
+    not_,
+    or_,
+    select,
+)
+from sqlalchemy.dialects.postgresql import JSONB, JSONPATH
+from sqlalchemy.sql.elements import ColumnElement
+from datetime import datetime
+import json
+from typing import List, Optional
+
+# Operators matching the rows their counterpart does not match
+NEGATED_OPERATORS = {
+    Op.neq: Op.eq,
+    Op.alternate_neq: Op.eq,
+    Op.nin: Op.eq,
+    Op.ngt: Op.gt,
+    Op.nlt: Op.lt,
+    Op.nlike: Op.like,
+    Op.nilike: Op.ilike,
+    Op.nregexp: Op.regexp,
+    Op.nilike_regexp: Op.ilike_regexp,
+}
+
+# Operators of each kind of value, negated operators are allowed with their counterpart
+STRING_OPERATORS = {
+    Op.eq,
+    Op.double_eq,
+    Op.null_safe_eq,
+    Op.like,
+    Op.ilike,
+    Op.match,
+    Op.regexp,
+    Op.regexp_match,
+    Op.ilike_regexp,
+    Op.text_search,
+    Op.text_search_or,
+    Op.exists,
+    Op.nis,
+}
+ORDERED_OPERATORS = {
+    Op.eq,
+    Op.double_eq,
+    Op.null_safe_eq,
+    Op.gt,
+    Op.gte,
+    Op.lt,
+    Op.lte,
+    Op.exists,
+    Op.nis,
+}
+TAGS_OPERATORS = {Op.eq, Op.double_eq, Op.overlap, Op.exists, Op.nis}
+JSON_OPERATORS = STRING_OPERATORS | ORDERED_OPERATORS | {Op.exists_key}
+
+SEARCH_OPERATORS = {Op.text_search, Op.text_search_or}
+# Text search configuration, the one of the step search indexes
+SEARCH_CONFIG = literal_column("'simple'::regconfig")
+
+# Step fields holding the contents of the messages
+STEP_CONTENT_FIELDS = {Field.stepInput, Field.stepOutput}
+
+# Columns of the threads table filtered directly
+THREAD_COLUMNS = {
+    Field.createdAt: Thread.__table__.c.createdAt,
+    Field.environment: Thread.__table__.c.environment,
+    Field.id: Thread.__table__.c.id,
+    Field.name: Thread.__table__.c.name,
+    Field.participantId: Thread.__table__.c.participant_id,
+}
+
+
+class ThreadFilterCompiler:
+    """
+    Translates the filters of the threads query into SQL conditions on threads.
+
+    Conditions on steps, scores and participants are correlated EXISTS
+    subqueries, so a filtered query stays a single statement on threads that
+    the planner can run from the indexes of each table.
+    """
+
+    @staticmethod
+    def compile(filters: Optional[List[ThreadsInputType]]) -> List[ColumnElement]:
+        """
+        The conditions of the filters, to be combined with AND.
+
+        :raises ValueError: When an operator is not supported on its field.
+        """
+        return [ThreadFilterCompiler.compile_filter(filter) for filter in filters or []]
+
+    @staticmethod
+    def compile_filter(filter: ThreadsInputType) -> ColumnElement:
+        field, operator, value = filter.field, filter.operator, filter.value
+        negated = operator in NEGATED_OPERATORS
+        positive = NEGATED_OPERATORS.get(operator, operator)
+
+        if field in THREAD_COLUMNS:
+            column = THREAD_COLUMNS[field]
+            ThreadFilterCompiler._check(
+                field,
+                positive,
+                ORDERED_OPERATORS if field == Field.createdAt else STRING_OPERATORS,
+            )
+            if field == Field.createdAt:
+                value = ThreadFilterCompiler._map_value(value, _parse_datetime)
+            condition = ThreadFilterCompiler._compare(column, positive, value)
+            if not negated:
+                return condition
+            # Rows without a value do not match the positive condition either
+            if column.nullable:
+                return or_(column.is_(None), not_(condition))
+            return not_(condition)
+
+        if field == Field.tags:
+            ThreadFilterCompiler._check(field, positive, TAGS_OPERATORS)
+            condition = ThreadFilterCompiler._compare_tags(positive, value)
+            if negated:
+                return or_(Thread.tags.is_(None), not_(condition))
+            return condition
+
+        if field == Field.metadata:
+            ThreadFilterCompiler._check(field, positive, JSON_OPERATORS)
+            condition = ThreadFilterCompiler._compare_json(
+                Thread.meta_data, filter, positive
+            )
+            return not_(condition) if negated else condition
+
+        if field in (Field.duration, Field.tokenCount):
+            ThreadFilterCompiler._check(field, positive, ORDERED_OPERATORS)
+            # Step aggregates maintained on the thread rows
+            aggregate = (
+                Thread.__table__.c.duration
+                if field == Field.duration
+                else Thread.__table__.c.token_count
+            )
+            condition = ThreadFilterCompiler._compare(
+                aggregate, positive, ThreadFilterCompiler._map_value(value, _number)
+            )
+            return not_(condition) if negated else condition
+
+        # Conditions on related rows, negated operators match threads without any
+        if field == Field.participantIdentifiers:
+            ThreadFilterCompiler._check(field, positive, STRING_OPERATORS)
+            condition = exists().where(
+                Participant.id == Thread.participant_id,
+                ThreadFilterCompiler._compare(Participant.identifier, positive, value),
+            )
+        elif field in (Field.stepName, Field.stepType):
+            ThreadFilterCompiler._check(field, positive, STRING_OPERATORS)
+            column = Step.name if field == Field.stepName else Step.type
+            condition = exists().where(
+                Step.thread_id == Thread.id,
+                ThreadFilterCompiler._compare(column, positive, value),
+            )
+        elif field in STEP_CONTENT_FIELDS and positive in SEARCH_OPERATORS:
+            # Answered from the search index of the step contents
+            vector, query = ThreadFilterCompiler._search_steps(filter)
+            condition = exists().where(
+                Step.thread_id == Thread.id, vector.bool_op("@@")(query)
+            )
+        elif field in STEP_CONTENT_FIELDS:
+            ThreadFilterCompiler._check(field, positive, JSON_OPERATORS)
+            column = Step.input if field == Field.stepInput else Step.output
+            condition = exists().where(
+                Step.thread_id == Thread.id,
+                ThreadFilterCompiler._compare_json(column, filter, positive),
+            )
+        elif field == Field.scoreValue:
+            ThreadFilterCompiler._check(field, positive, ORDERED_OPERATORS)
+            # The first path element names the score
+            score_name = _path(filter)[:1]
+            condition = exists(
+                select(Score.id)
+                .join(Step, Step.id == Score.step_id)
+                .where(
+                    Step.thread_id == Thread.id,
+                    *(Score.name == name for name in score_name),
+                    ThreadFilterCompiler._compare(
+                        Score.value,
+                        positive,
+                        ThreadFilterCompiler._map_value(value, float),
+                    ),
+                )
+            )
+        else:
+            raise ValueError(f"Filtering threads on {field.value} is not supported.")
+
+        return not_(condition) if negated else condition
+
+    @staticmethod
+    def _check(field: Field, operator: Op, allowed: set):
+        if operator not in allowed:
+            raise ValueError(
+                f"Operator {operator.value} is not supported on {field.value}."
+            )
+
+    @staticmethod
+    def _map_value(value, convert):
+        if value is None:
+            return None
+        if isinstance(value, list):
+            return [convert(item) for item in value]
+        return convert(value)
+
+    @staticmethod
+    def _compare(column, operator: Op, value) -> ColumnElement:
+        if operator in (Op.eq, Op.double_eq):
+            # A list of values matches any of them
+            if isinstance(value, list):
+                return column.in_(value)
+            if value is None:
+                return column.is_(None)
+            return column == value
+        if operator == Op.null_safe_eq:
+            return column.is_not_distinct_from(value)
+        if operator == Op.exists:
+            return column.is_not(None)
+        if operator == Op.nis:
+            # IS NOT only takes NULL, other values compare with IS DISTINCT FROM
+            if value is None:
+                return column.is_not(None)
+            if isinstance(value, list):
+                raise ValueError(f"Operator {operator.value} takes a single value.")
+            return column.is_distinct_from(value)
+        if operator == Op.gt:
+            return column > value
+        if operator == Op.gte:
+            return column >= value
+        if operator == Op.lt:
+            return column < value
+        if operator == Op.lte:
+            return column <= value
+        if operator == Op.like:
+            return column.like(value)
+        if operator == Op.ilike:
+            return column.ilike(value)
+        if operator == Op.match:
+            return column.ilike(f"%{value}%")
+        if operator in (Op.regexp, Op.regexp_match):
+            return column.regexp_match(value)
+        if operator == Op.ilike_regexp:
+            return column.regexp_match(value, flags="i")
+        if operator in (Op.text_search, Op.text_search_or):
+            return func.to_tsvector(SEARCH_CONFIG, column).bool_op("@@")(
+                ThreadFilterCompiler._tsquery(operator, value)
+            )
+        raise ValueError(f"Operator {operator.value} is not supported.")
+
+    @staticmethod
+    def _tsquery(operator: Op, value) -> ColumnElement:
+        # text_search matches all the words, text_search_or any of them
+        if operator == Op.text_search:
+            return func.plainto_tsquery(SEARCH_CONFIG, str(value))
+        words = str(value).split() or [""]
+        query = func.plainto_tsquery(SEARCH_CONFIG, words[0])
+        for word in words[1:]:
+            query = query.op("||")(func.plainto_tsquery(SEARCH_CONFIG, word))
+        return query
+
+    @staticmethod
+    def _search_steps(filter: ThreadsInputType):
+        # The step search vector and query of a text search on step contents
+        column = Step.input if filter.field == Field.stepInput else Step.output
+        return step_search_vector(column), ThreadFilterCompiler._tsquery(
+            filter.operator, filter.value
+        )
+
+    @staticmethod
+    def rank(filters: Optional[List[ThreadsInputType]]) -> Optional[ColumnElement]:
+        """
+        Relevance of the threads for the text searches on step contents, the best
+        ts_rank of their matching steps, or None without such a search.
+        """
+        ranks = []
+        for filter in filters or []:
+            if (
+                filter.field in STEP_CONTENT_FIELDS
+                and filter.operator in SEARCH_OPERATORS
+            ):
+                vector, query = ThreadFilterCompiler._search_steps(filter)
+                ranks.append(
+                    select(func.max(func.ts_rank(vector, query)))
+                    .where(Step.thread_id == Thread.id, vector.bool_op("@@")(query))
+                    .scalar_subquery()
+                )
+        if not ranks:
+            return None
+        rank = func.coalesce(ranks[0], 0)
+        for other in ranks[1:]:
+            rank = rank + func.coalesce(other, 0)
+        return rank
+
+    @staticmethod
+    def _compare_tags(operator: Op, value) -> ColumnElement:
+        if operator == Op.exists:
+            return and_(Thread.tags.is_not(None), func.cardinality(Thread.tags) > 0)
+        if operator == Op.nis:
+            if value is None:
+                return Thread.tags.is_not(None)
+            if not isinstance(value, list):
+                raise ValueError(f"Operator {operator.value} takes a list of tags.")
+            return Thread.tags.is_distinct_from(cast(value, ARRAY(String)))
+        # Like other fields a list matches any of its tags, a single tag has to be
+        # present. Both operators can use the GIN index on tags
+        if operator == Op.overlap or isinstance(value, list):
+            values = value if isinstance(value, list) else [value]
+            return Thread.tags.bool_op("&&")(cast(values, ARRAY(String)))
+        return Thread.tags.bool_op("@>")(cast([value], ARRAY(String)))
+
+    @staticmethod
+    def _compare_json(column, filter: ThreadsInputType, operator: Op) -> ColumnElement:
+        document = column
+        path = _path(filter)
+
+        if operator == Op.exists_key:
+            # A jsonpath, the jsonb_path_ops indexes answer @? but not ?
+            keys = _keys(filter)
+            if keys is not None:
+                return document.bool_op("@?")(
+                    ThreadFilterCompiler._jsonpath([*keys, str(filter.value)])
+                )
+            if path:
+                document = document.op("#>")(literal(path, ARRAY(Text)))
+            return document.op("?")(str(filter.value))
+
+        containment = ThreadFilterCompiler._containment(document, filter, operator)
+
+        if filter.accessor == FilterAccessorEnum.json_get:
+            target = document.op("#>")(literal(path, ARRAY(Text))) if path else document
+            if operator in (Op.eq, Op.double_eq, Op.null_safe_eq) and not isinstance(
+                filter.value, list
+            ):
+                return and_(*containment, target == _jsonb(filter.value))
+            target = cast(target, Text)
+        elif path:
+            target = document.op("#>>")(literal(path, ARRAY(Text)))
+        else:
+            target = cast(document, Text)
+
+        value = filter.value
+        numbers = value if isinstance(value, list) else [value]
+        if numbers and all(
+            isinstance(number, (int, float)) and not isinstance(number, bool)
+            for number in numbers
+        ):
+            # Numbers are compared as numbers, not as their text
+            target = cast(target, Float)
+        return and_(
+            *containment, ThreadFilterCompiler._compare(target, operator, value)
+        )
+
+    @staticmethod
+    def _containment(document, filter: ThreadsInputType, operator: Op) -> list:
+        # Equality on a path of keys also as a @> condition, which the
+        # jsonb_path_ops indexes answer, the exact comparison rechecks the rows
+        keys = _keys(filter)
+        value = filter.value
+        if operator not in (Op.eq, Op.double_eq) or keys is None or value is None:
+            return []
+        if filter.accessor != FilterAccessorEnum.json_get and not isinstance(
+            value, str
+        ):
+            return []
+        for key in reversed(keys):
+            value = {key: value}
+        return [document.bool_op("@>")(_jsonb(value))]
+
+    @staticmethod
+    def _jsonpath(keys: List[str]) -> ColumnElement:
+        path = "strict $" + "".join(f".{json.dumps(key)}" for key in keys)
+        return literal(path, JSONPATH)
+
+
+def _path(filter: ThreadsInputType) -> List[str]:
+    path = []
+    for element in filter.path or []:
+        if element.stringValue is not None:
+            path.append(element.stringValue)
+        elif element.floatValue is not None:
+            path.append(str(int(element.floatValue)))
+    return path
+
+
+def _jsonb(value) -> ColumnElement:
+    # Rendered as a string cast, estimated counts compile the query with its values
+    return cast(literal(json.dumps(value)), JSONB)
+
+
+def _keys(filter: ThreadsInputType) -> Optional[List[str]]:
+    # The path as object keys, None when it indexes into an array
+    if any(element.stringValue is None for element in filter.path or []):
+        return None
+    return [element.stringValue for element in filter.path or []]
+
+
+def _number(value):
+    # Whole numbers stay integers, an integer column is then compared as is
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def _parse_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
@@ -0,0 +1,63 @@
+from chainlit_graphql.model.thread import Thread
+from chainlit_graphql.model.step import Step
+from chainlit_graphql.model.score import Score
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.db.database import db
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql import select
+from typing import AsyncIterator, Dict, List, Tuple
+
+
+class ThreadStreamRepository:
+    """
+    Reads a thread and its steps for incremental delivery.
+
+    The steps are read with a server-side cursor, so memory stays bounded by
+    the chunk size whatever the length of the thread.
+    """
+
+    async def stream_thread(self, id: str) -> AsyncIterator[Tuple[str, object]]:
+        """
+        Yields the thread, then its steps in creation order, chunk by chunk.
+
+        :param id: The thread id.
+        :return: ("thread", Thread or None) first, then ("steps", steps) pairs
+            where steps are (Step, scores) tuples, at most
+            THREAD_STREAM_CHUNK_SIZE per chunk. Nothing follows a missing thread.
+        """
+        async with db.SessionLocal() as session:
+            # One snapshot for the thread and all its steps
+            await session.connection(
+                execution_options={"isolation_level": "REPEATABLE READ"}
+            )
+            thread = (
+                await session.scalars(
+                    select(Thread)
+                    .where(Thread.id == id)
+                    .options(selectinload(Thread.participant))
+                )
+            ).first()
+            yield "thread", thread
+            if thread is None:
+                return
+
+            result = await session.stream_scalars(
+                select(Step)
+                .where(Step.thread_id == id)
+                .order_by(Step.createdAt, Step.id)
+                .execution_options(yield_per=settings.THREAD_STREAM_CHUNK_SIZE)
+            )
+            async for steps in result.partitions():
+                scores = await self._scores(session, [step.id for step in steps])
+                yield "steps", [(step, scores.get(step.id, [])) for step in steps]
+
+    @staticmethod
+    async def _scores(session, step_ids: List[str]) -> Dict[str, List[Score]]:
+        result = await session.scalars(select(Score).where(Score.step_id.in_(step_ids)))
+        scores = {}
+        for score in result.all():
+            scores.setdefault(score.step_id, []).append(score)
+        return scores
+
+
+thread_stream_repo = ThreadStreamRepository()
@@ -0,0 +1,100 @@
+from chainlit_graphql.model.thread import THREAD_VERSION_SEQUENCE, Thread
+from chainlit_graphql.model.step import Step
+from chainlit_graphql.api.v1.graphql.schema.thread import ThreadsInputType
+from chainlit_graphql.db.database import db
+from chainlit_graphql.repository.thread_filter import ThreadFilterCompiler
+from sqlalchemy import func, select, update
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class ThreadVersionRepository:
+    """
+    Version stamps of the threads.
+
+    Every write to a thread, its participant, steps or scores gives the thread
+    a new version from THREAD_VERSION_SEQUENCE, in the transaction of the write.
+    Thread and step writes set it in their own statements, the other writes go
+    through the methods below.
+    """
+
+    @staticmethod
+    async def touch(condition, session) -> List[str]:
+        """
+        Gives the threads matching a condition a new version.
+
+        :return: The ids of the threads.
+        """
+        result = await session.scalars(
+            update(Thread)
+            .where(condition)
+            .values(version=THREAD_VERSION_SEQUENCE.next_value())
+            .returning(Thread.id)
+        )
+        return result.all()
+
+    async def touch_steps(self, step_ids: Iterable[Optional[str]], session):
+        """
+        New versions for the threads of steps, when their scores change.
+        """
+        step_ids = set(step_ids) - {None}
+        if step_ids:
+            await self.touch(
+                Thread.id.in_(select(Step.thread_id).where(Step.id.in_(step_ids))),
+                session,
+            )
+
+    async def touch_participant(self, participant_id: str, session):
+        """
+        New versions for the threads of a participant, when it changes.
+        """
+        await self.touch(Thread.participant_id == participant_id, session)
+
+    async def get_version(self, thread_id: str) -> Optional[int]:
+        """
+        The version of a thread, None when it does not exist.
+        """
+        async with db.SessionLocal() as session:
+            return await session.scalar(
+                select(Thread.version).where(Thread.id == thread_id)
+            )
+
+    async def get_versions(self, thread_ids: List[str]) -> Dict[str, int]:
+        """
+        The versions of threads keyed by id, missing threads are left out.
+        """
+        async with db.SessionLocal() as session:
+            result = await session.execute(
+                select(Thread.id, Thread.version).where(Thread.id.in_(thread_ids))
+            )
+            return dict(result.all())
+
+    async def get_stamp(
+        self,
+        filters: Optional[List[ThreadsInputType]] = None,
+        cursorAnchor: Optional[datetime] = None,
+    ) -> Tuple[int, int, Optional[int]]:
+        """
+        Number, sum and maximum of the versions of the threads a threads query
+        pages through.
+
+        Versions only grow and are never reused, so a committed write to one of
+        the threads, or a thread entering or leaving them, changes the stamp.
+        The sum catches writes committed out of sequence order, which leave the
+        maximum unchanged.
+
+        :raises ValueError: When an operator is not supported on its field.
+        """
+        query = select(
+            func.count(Thread.version),
+            func.coalesce(func.sum(Thread.version), 0),
+            func.max(Thread.version),
+        ).where(*ThreadFilterCompiler.compile(filters))
+        if cursorAnchor:
+            query = query.where(Thread.createdAt <= cursorAnchor)
+        async with db.SessionLocal() as session:
+            count, total, latest = (await session.execute(query)).one()
+            return count, int(total), latest
+
+
+thread_version_repo = ThreadVersionRepository()
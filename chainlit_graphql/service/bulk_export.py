@@ -0,0 +1,40 @@
+from chainlit_graphql.repository.bulk_export import BulkExportRepository
+from chainlit_graphql.core.config import settings
+from datetime import datetime
+from typing import AsyncIterator, Optional
+import json
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ExportService:
+    def __init__(self, bulk_export_repository: BulkExportRepository):
+        self.bulk_export_repository = bulk_export_repository
+
+    async def export_ndjson(
+        self,
+        participantId: Optional[str] = None,
+        environment: Optional[str] = None,
+        createdAfter: Optional[datetime] = None,
+        createdBefore: Optional[datetime] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Exports the matching threads as NDJSON, in the format read by the import.
+
+        :return: Chunks of up to EXPORT_FETCH_SIZE lines.
+        """
+        lines = []
+        async for kind, row in self.bulk_export_repository.export_records(
+            participantId, environment, createdAfter, createdBefore
+        ):
+            lines.append(json.dumps({"kind": kind, **row}, default=_json_default))
+            if len(lines) >= settings.EXPORT_FETCH_SIZE:
+                yield "\n".join(lines) + "\n"
+                lines = []
+
+        if lines:
+            yield "\n".join(lines) + "\n"
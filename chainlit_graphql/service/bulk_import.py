@@ -0,0 +1,75 @@
+from chainlit_graphql.repository.bulk_import import (
+    IMPORT_MODELS,
+    BulkImportRepository,
+)
+from chainlit_graphql.core.config import settings
+from collections import Counter
+from typing import AsyncIterable, AsyncIterator, Dict, List, Union
+import json
+import time
+
+
+class ImportService:
+    def __init__(self, bulk_import_repository: BulkImportRepository):
+        self.bulk_import_repository = bulk_import_repository
+
+    async def import_ndjson(
+        self, lines: AsyncIterable[Union[str, bytes]]
+    ) -> AsyncIterator[dict]:
+        """
+        Imports NDJSON records, one JSON object per line.
+
+        Each record has a "kind" (participant, thread, step or score) and the
+        column names of its table as keys, the format written by the export.
+        Records are written in batches of IMPORT_BATCH_SIZE, parents should come
+        before their children or in the same batch.
+
+        :param lines: The NDJSON lines.
+        :return: A progress report after each batch, the last one has "done".
+        """
+        started = time.monotonic()
+        progress = {"rows": 0, "written": Counter(), "skipped": 0}
+        batch: Dict[str, List[dict]] = {}
+        batch_rows = 0
+
+        line_number = 0
+        async for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+            kind = record.pop("kind", None)
+            if kind not in IMPORT_MODELS:
+                raise ValueError(f"Line {line_number}: unknown record kind {kind!r}")
+            batch.setdefault(kind, []).append(record)
+            batch_rows += 1
+
+            if batch_rows >= settings.IMPORT_BATCH_SIZE:
+                yield await self._write_batch(batch, batch_rows, progress, started)
+                batch, batch_rows = {}, 0
+
+        if batch_rows:
+            yield await self._write_batch(batch, batch_rows, progress, started)
+
+        yield self._report(progress, started, done=True)
+
+    async def _write_batch(
+        self, batch: Dict[str, List[dict]], batch_rows: int, progress: dict, started: float
+    ) -> dict:
+        written = await self.bulk_import_repository.import_records(batch)
+        progress["rows"] += batch_rows
+        progress["written"].update(written)
+        progress["skipped"] += batch_rows - sum(written.values())
+        return self._report(progress, started)
+
+    @staticmethod
+    def _report(progress: dict, started: float, done: bool = False) -> dict:
+        elapsed = max(time.monotonic() - started, 1e-6)
+        return {
+            "rows": progress["rows"],
+            "written": dict(progress["written"]),
+            "skipped": progress["skipped"],
+            "rows_per_second": round(progress["rows"] / elapsed),
+            "done": done,
+        }
@@ -0,0 +1,72 @@
+from chainlit_graphql.repository.idempotency_key import (
+    IdempotencyKeyRepository,
+    idempotency_key_repo,
+)
+from chainlit_graphql.core.config import settings
+from collections import OrderedDict
+from typing import Optional, Tuple
+import time
+
+# Expired keys are deleted at most this often
+PURGE_INTERVAL_SECONDS = 60 * 60
+
+
+class IdempotencyService:
+    """
+    Remembers the responses of requests sent with an Idempotency-Key header.
+
+    Completed responses are kept in a bounded in-memory LRU in front of the
+    `idempotency_keys` table, which is shared by all replicas and also tracks
+    the requests that are still running.
+    """
+
+    def __init__(self, idempotency_key_repository: IdempotencyKeyRepository):
+        self.idempotency_key_repository = idempotency_key_repository
+        # key -> (stored at, fingerprint, response)
+        self._responses: "OrderedDict[str, Tuple[float, str, str]]" = OrderedDict()
+        self._purged_at = 0.0
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Claims a key before executing its request.
+
+        :param key: The idempotency key, scoped to the caller.
+        :param fingerprint: A hash of the request body.
+        :return: None when the request has to be executed, otherwise the
+            fingerprint and response (None while running) of the request that
+            already used the key.
+        """
+        now = time.monotonic()
+        cached = self._responses.get(key)
+        if cached is not None:
+            stored_at, cached_fingerprint, response = cached
+            if now - stored_at < settings.IDEMPOTENCY_TTL_SECONDS:
+                self._responses.move_to_end(key)
+                return cached_fingerprint, response
+            del self._responses[key]
+
+        if now - self._purged_at > PURGE_INTERVAL_SECONDS:
+            self._purged_at = now
+            await self.idempotency_key_repository.purge_expired()
+
+        record = await self.idempotency_key_repository.claim(key, fingerprint)
+        if record is not None and record[1] is not None:
+            self._remember(key, *record)
+        return record
+
+    async def complete(self, key: str, fingerprint: str, response: str):
+        await self.idempotency_key_repository.complete(key, response)
+        self._remember(key, fingerprint, response)
+
+    async def release(self, key: str):
+        # The request failed, a retry executes it again
+        await self.idempotency_key_repository.release(key)
+
+    def _remember(self, key: str, fingerprint: str, response: str):
+        self._responses[key] = (time.monotonic(), fingerprint, response)
+        self._responses.move_to_end(key)
+        while len(self._responses) > settings.IDEMPOTENCY_CACHE_SIZE:
+            self._responses.popitem(last=False)
+
+
+idempotency_service = IdempotencyService(idempotency_key_repo)
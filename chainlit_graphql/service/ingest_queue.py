@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+import zlib
+from typing import List, Optional, Tuple
+
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.core.mappers import MapperUtility
+from chainlit_graphql.repository.step import StepRepository, step_repo
+from chainlit_graphql.repository.thread import ThreadRepository, thread_repo
+
+# ("step", step row) or ("thread", upsert_thread keyword arguments)
+IngestItem = Tuple[str, dict]
+
+
+class IngestQueue:
+    """
+    Write-behind queue used when INGEST_MODE is "async".
+
+    Items are sharded by thread id, so the writes of a thread are applied in
+    the order they were received. Each worker drains its own shard in batches.
+    Items that cannot be written, and those still queued or being written at
+    shutdown, are saved to INGEST_SPOOL_PATH and replayed at the next start.
+    """
+
+    def __init__(
+        self, step_repository: StepRepository, thread_repository: ThreadRepository
+    ):
+        self.step_repository = step_repository
+        self.thread_repository = thread_repository
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        # Batch each worker is writing, spooled if the worker is cancelled
+        self._in_flight: List[List[IngestItem]] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        if self.running:
+            return
+        if settings.INGEST_MODE != "async":
+            # Items spooled by a previous run are written right away
+            await self._write(self._read_spool())
+            return
+
+        workers = max(1, settings.INGEST_WORKERS)
+        maxsize = max(1, settings.INGEST_QUEUE_SIZE // workers)
+        self._queues = [asyncio.Queue(maxsize=maxsize) for _ in range(workers)]
+        self._in_flight = [[] for _ in range(workers)]
+        self._workers = [
+            asyncio.create_task(self._work(index)) for index in range(workers)
+        ]
+
+        # Replay what was left over by the previous shutdown first
+        for item in self._read_spool():
+            await self._put(item)
+
+    async def stop(self):
+        if not self.running:
+            return
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)),
+                timeout=settings.INGEST_DRAIN_TIMEOUT_SECONDS,
+            )
+        except asyncio.TimeoutError:
+            print("Ingestion queue was not drained before the timeout")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+        # The interrupted batch of a shard comes before its queued items, an
+        # item written before the interruption is applied again by the replay
+        leftovers = []
+        for queue, batch in zip(self._queues, self._in_flight):
+            leftovers.extend(batch)
+            while not queue.empty():
+                leftovers.append(queue.get_nowait())
+        self._write_spool(leftovers)
+
+        self._queues, self._workers, self._in_flight = [], [], []
+
+    async def put_step(self, step_values: dict):
+        await self._put(("step", step_values))
+
+    async def put_thread(self, thread_kwargs: dict):
+        await self._put(("thread", thread_kwargs))
+
+    async def _put(self, item: IngestItem):
+        kind, payload = item
+        thread_id = payload["thread_id"] if kind == "step" else payload["id"]
+        # Same shard for a thread whether its id is encoded or not
+        shard = zlib.crc32(MapperUtility.decode_id(thread_id).encode())
+        # Waits for room when the shard is full
+        await self._queues[shard % len(self._queues)].put(item)
+
+    async def _work(self, index: int):
+        queue = self._queues[index]
+        while True:
+            items = [await queue.get()]
+            while len(items) < settings.INGEST_BATCH_SIZE and not queue.empty():
+                items.append(queue.get_nowait())
+
+            self._in_flight[index] = items
+            try:
+                await self._write(items)
+                self._in_flight[index] = []
+            finally:
+                for _ in items:
+                    queue.task_done()
+
+    async def _write(self, items: List[IngestItem]):
+        # Consecutive steps are written with one statement, a thread upsert
+        # flushes them first to keep the order of the shard
+        step_rows = []
+        for kind, payload in items + [("flush", {})]:
+            if kind == "step":
+                step_rows.append(payload)
+                continue
+
+            if step_rows:
+                rows = step_rows
+                await self._retry(
+                    lambda: self.step_repository.upsert_rows(rows),
+                    [("step", values) for values in rows],
+                )
+                step_rows = []
+
+            if kind == "thread":
+                await self._retry(
+                    lambda: self.thread_repository.upsert_thread(**payload),
+                    [(kind, payload)],
+                )
+
+    async def _retry(self, write, items: List[IngestItem]):
+        # Transient errors are retried with a backoff, then the items are
+        # spooled instead of being dropped
+        attempts = max(1, settings.INGEST_WRITE_ATTEMPTS)
+        for attempt in range(attempts):
+            try:
+                await write()
+                return
+            except Exception as e:
+                print(f"Failed to write {len(items)} queued items: {e}")
+                if attempt + 1 < attempts:
+                    delay = settings.INGEST_RETRY_DELAY_MS / 1000 * 2**attempt
+                    await asyncio.sleep(delay)
+        self._write_spool(items)
+
+    def spool_steps(self, rows: List[dict]):
+        """
+        Saves steps that could not be written, they are replayed at the next
+        start.
+        """
+        self._write_spool([("step", values) for values in rows])
+
+    def _read_spool(self) -> List[IngestItem]:
+        path: Optional[str] = settings.INGEST_SPOOL_PATH
+        if not path or not os.path.exists(path):
+            return []
+
+        items = []
+        with open(path) as spool:
+            for line in spool:
+                record = json.loads(line)
+                payload = record["payload"]
+                if record["kind"] == "step":
+                    payload = MapperUtility.deserialize_step_row(payload)
+                items.append((record["kind"], payload))
+        os.remove(path)
+
+        return items
+
+    def _write_spool(self, items: List[IngestItem]):
+        if not items:
+            return
+
+        path: Optional[str] = settings.INGEST_SPOOL_PATH
+        if not path:
+            print(f"Dropping {len(items)} queued items, INGEST_SPOOL_PATH is not set")
+            return
+
+        with open(path, "a") as spool:
+            for kind, payload in items:
+                if kind == "step":
+                    payload = MapperUtility.serialize_step_row(payload)
+                spool.write(json.dumps({"kind": kind, "payload": payload}) + "\n")
+
+
+ingest_queue = IngestQueue(step_repo, thread_repo)
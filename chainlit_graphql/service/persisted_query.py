@@ -0,0 +1,116 @@
+from chainlit_graphql.repository.persisted_query import (
+    PersistedQueryRepository,
+    persisted_query_repo,
+)
+from chainlit_graphql.core.config import settings
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+
+
+class PersistedQueryError(ValueError):
+    """
+    A persisted query request that cannot be executed, reported as a GraphQL
+    error with its code.
+    """
+
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.code = code
+
+
+class PersistedQueryService:
+    """
+    Automatic persisted queries (APQ).
+
+    Clients send the sha256 hash of a query in
+    `extensions.persistedQuery.sha256Hash` instead of its text, and send the
+    text along with the hash once when the server does not know it. Queries are
+    only registered once their request has been executed with a valid api key,
+    and kept in a bounded in-memory LRU, and in the `persisted_queries` table
+    for all the replicas when PERSISTED_QUERY_STORE_DB is set.
+    """
+
+    def __init__(self, persisted_query_repository: PersistedQueryRepository):
+        self.persisted_query_repository = persisted_query_repository
+        # hash -> query
+        self._queries: "OrderedDict[str, str]" = OrderedDict()
+
+    async def resolve(
+        self, query: Optional[str], extensions: Optional[dict]
+    ) -> Optional[str]:
+        """
+        The query text of a request.
+
+        :param query: The query sent with the request, if any.
+        :param extensions: The extensions sent with the request.
+        :return: The sent query, or the query registered under the sent hash.
+        :raises PersistedQueryError: When the hash is unknown or does not match
+            the sent query.
+        """
+        persisted_query = self._persisted_query(extensions)
+        if persisted_query is None:
+            return query
+        if persisted_query.get("version") != 1:
+            raise PersistedQueryError(
+                "Unsupported persisted query version", "PERSISTED_QUERY_NOT_SUPPORTED"
+            )
+
+        hash = persisted_query.get("sha256Hash")
+        if query is None:
+            query = await self._get(hash)
+            if query is None:
+                raise PersistedQueryError(
+                    "PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND"
+                )
+            return query
+
+        if hashlib.sha256(query.encode()).hexdigest() != hash:
+            raise PersistedQueryError(
+                "provided sha does not match query", "INVALID_SHA256_HASH"
+            )
+        return query
+
+    async def register(self, query: Optional[str], extensions: Optional[dict]):
+        """
+        Registers the query sent along with its hash, once `resolve` accepted
+        the request and it was executed.
+        """
+        persisted_query = self._persisted_query(extensions)
+        if query is None or persisted_query is None:
+            return
+
+        hash = persisted_query["sha256Hash"]
+        if hash not in self._queries and settings.PERSISTED_QUERY_STORE_DB:
+            await self.persisted_query_repository.save(hash, query)
+        self._remember(hash, query)
+
+    @staticmethod
+    def _persisted_query(extensions: Optional[dict]) -> Optional[dict]:
+        persisted_query = (
+            extensions.get("persistedQuery") if isinstance(extensions, dict) else None
+        )
+        return persisted_query if isinstance(persisted_query, dict) else None
+
+    async def _get(self, hash: Optional[str]) -> Optional[str]:
+        if not isinstance(hash, str):
+            return None
+        query = self._queries.get(hash)
+        if query is not None:
+            self._queries.move_to_end(hash)
+            return query
+
+        if settings.PERSISTED_QUERY_STORE_DB:
+            query = await self.persisted_query_repository.get(hash)
+            if query is not None:
+                self._remember(hash, query)
+        return query
+
+    def _remember(self, hash: str, query: str):
+        self._queries[hash] = query
+        self._queries.move_to_end(hash)
+        while len(self._queries) > settings.PERSISTED_QUERY_CACHE_SIZE:
+            self._queries.popitem(last=False)
+
+
+persisted_query_service = PersistedQueryService(persisted_query_repo)
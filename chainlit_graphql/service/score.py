@@ -1,6 +1,10 @@
 from chainlit_graphql.model.score import Score as ModelScore
 from chainlit_graphql.repository.score import ScoreRepository
-from chainlit_graphql.api.v1.graphql.schema.score import ScoreType, Score as SchemaScore
+from chainlit_graphql.api.v1.graphql.schema.score import (
+    ScoreInput,
+    ScoreType,
+    Score as SchemaScore,
+)
 from typing import List, Optional
 
 
@@ -47,6 +51,38 @@ class ScoreService:
             tags=score.tags,
         )
 
+    async def add_scores(self, scores: List[ScoreInput]) -> List[SchemaScore]:
+        created_scores = await self.score_repository.create_many(
+            [
+                ModelScore(
+                    name=score.name,
+                    type=score.type.value,
+                    value=score.value,
+                    step_id=score.stepId,
+                    generation_id=score.generationId,
+                    dataset_experiment_item_id=score.datasetExperimentItemId,
+                    comment=score.comment,
+                    tags=score.tags,
+                )
+                for score in scores
+            ]
+        )
+
+        return [
+            SchemaScore(
+                id=score.id,
+                name=score.name,
+                type=score.type,
+                value=score.value,
+                stepId=score.step_id,
+                generationId=score.generation_id,
+                datasetExperimentItemId=score.dataset_experiment_item_id,
+                comment=score.comment,
+                tags=score.tags,
+            )
+            for score in created_scores
+        ]
+
     async def update_score(
         self,
         id: str,
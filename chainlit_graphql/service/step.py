@@ -5,17 +5,49 @@ from chainlit_graphql.api.v1.graphql.schema.step import (
     StepType,
     GenerationPayloadInput,
     AttachmentPayloadInput,
+    StepInput,
 )
 from typing import Optional, List
 from datetime import datetime
 from chainlit_graphql.api.v1.graphql.scalars.json_scalar import Json
-import base64
+from chainlit_graphql.core.mappers import MapperUtility
+from chainlit_graphql.service.ingest_queue import ingest_queue
+from chainlit_graphql.service.step_coalescer import step_coalescer
 
 
 class StepService:
     def __init__(self, step_repository: StepRepository):
         self.step_repository = step_repository
 
+    @staticmethod
+    def _decode_thread_id(threadId: Optional[str]) -> Optional[str]:
+        return MapperUtility.decode_id(threadId)
+
+    @staticmethod
+    def _deferred() -> bool:
+        return step_coalescer.running or ingest_queue.running
+
+    async def _enqueue(self, steps: List[dict]) -> List[StepsType]:
+        step_types = []
+        for step in steps:
+            if step["threadId"] is None:
+                raise ValueError(f"Step {step['id']} must reference a thread.")
+            values = self.step_repository.build_step_row(**step)
+            if step_coalescer.running:
+                await step_coalescer.put_step(values)
+            else:
+                await ingest_queue.put_step(values)
+            step_types.append(
+                StepsType(
+                    id=values["id"],
+                    thread_id=values["thread_id"],
+                    createdAt=values["createdAt"],
+                    ok=True,
+                    message="Step queued for ingestion",
+                )
+            )
+        return step_types
+
     async def upsert(
         self,
         id: str,
@@ -33,20 +65,37 @@ class StepService:
         scores: Optional[List[ScorePayloadInput]] = None,
         generation: Optional[GenerationPayloadInput] = None,
         attachments: Optional[List[AttachmentPayloadInput]] = None,
+        returning: Optional[List[str]] = None,
     ) -> Optional[StepsType]:
 
-        try:
-            # Attempt to decode as base64
-            decoded_id = base64.b64decode(threadId).decode()
-            # Extract the ID part if it follows the 'Type:id' format
-            if ":" in decoded_id:
-                threadId = decoded_id.split(":")[1]
-        except (base64.binascii.Error, UnicodeDecodeError):
-            # If decoding fails, assume it's a regular UUID and do nothing
-            pass
+        threadId = self._decode_thread_id(threadId)
 
         type_str = type.value if type else None
 
+        if self._deferred():
+            (queued_step,) = await self._enqueue(
+                [
+                    {
+                        "id": id,
+                        "threadId": threadId,
+                        "startTime": startTime,
+                        "endTime": endTime,
+                        "type": type_str,
+                        "error": error,
+                        "input": input,
+                        "output": output,
+                        "metadata": metadata,
+                        "parentId": parentId,
+                        "name": name,
+                        "tags": tags,
+                        "scores": scores,
+                        "generation": generation,
+                        "attachments": attachments,
+                    }
+                ]
+            )
+            return queued_step
+
         created_step = await self.step_repository.upsert_step(
             id,
             threadId,
@@ -63,6 +112,35 @@ class StepService:
             scores,
             generation,
             attachments,
+            returning,
         )
 
         return created_step
+
+    async def upsert_many(
+        self, steps: List[StepInput], returning: Optional[List[str]] = None
+    ) -> List[StepsType]:
+        step_kwargs = [
+            {
+                "id": step.id,
+                "threadId": self._decode_thread_id(step.threadId),
+                "startTime": step.startTime,
+                "endTime": step.endTime,
+                "type": step.type.value if step.type else None,
+                "error": step.error,
+                "input": step.input,
+                "output": step.output,
+                "metadata": step.metadata,
+                "parentId": step.parentId,
+                "name": step.name,
+                "tags": step.tags,
+                "generation": step.generation,
+                "attachments": step.attachments,
+            }
+            for step in steps
+        ]
+
+        if self._deferred():
+            return await self._enqueue(step_kwargs)
+
+        return await self.step_repository.upsert_steps(step_kwargs, returning)
@@ -0,0 +1,93 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.repository.step import StepRepository, step_repo
+from chainlit_graphql.service.ingest_queue import ingest_queue
+
+
+class StepCoalescer:
+    """
+    Merges the updates of a step received within STEP_COALESCE_WINDOW_MS.
+
+    Streaming a message calls ingestStep with the same id for every chunk, only
+    the last state of each step is written once the window is over. A failed
+    write is retried with the next window, and spooled once it has failed
+    INGEST_WRITE_ATTEMPTS times or at shutdown. Updates are acknowledged before
+    they are written, so the coalescer only runs with INGEST_MODE "async".
+    """
+
+    def __init__(self, step_repository: StepRepository):
+        self.step_repository = step_repository
+        self._pending: Dict[str, dict] = {}
+        # step id -> failed writes of its pending update
+        self._attempts: Dict[str, int] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def start(self):
+        self._running = (
+            settings.INGEST_MODE == "async" and settings.STEP_COALESCE_WINDOW_MS > 0
+        )
+
+    async def stop(self):
+        self._running = False
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._flush()
+
+    async def put_step(self, step_values: dict):
+        self._pending.setdefault(step_values["id"], {}).update(step_values)
+
+        # The first update of a window schedules its flush
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Updates received while a window was being written get their own
+        # window, the task is only done once nothing is pending
+        while True:
+            await asyncio.sleep(settings.STEP_COALESCE_WINDOW_MS / 1000)
+            await self._flush()
+            if not self._pending:
+                return
+
+    async def _flush(self):
+        rows, self._pending = list(self._pending.values()), {}
+        if not rows:
+            return
+
+        try:
+            if ingest_queue.running:
+                for values in rows:
+                    await ingest_queue.put_step(values)
+            else:
+                await self.step_repository.upsert_rows(rows)
+        except Exception as e:
+            print(f"Failed to write {len(rows)} coalesced steps: {e}")
+            self._requeue(rows)
+        else:
+            for values in rows:
+                self._attempts.pop(values["id"], None)
+
+    def _requeue(self, rows: List[dict]):
+        # Updates received during the failed write are newer and merged in
+        spooled = []
+        for values in rows:
+            id = values["id"]
+            attempts = self._attempts.get(id, 0) + 1
+            if self._running and attempts < settings.INGEST_WRITE_ATTEMPTS:
+                self._attempts[id] = attempts
+                self._pending[id] = {**values, **self._pending.get(id, {})}
+            else:
+                self._attempts.pop(id, None)
+                spooled.append({**values, **self._pending.pop(id, {})})
+        if spooled:
+            ingest_queue.spool_steps(spooled)
+
+
+step_coalescer = StepCoalescer(step_repo)
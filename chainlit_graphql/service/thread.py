@@ -1,11 +1,29 @@
 from chainlit_graphql.repository.thread import ThreadRepository
+from chainlit_graphql.repository.thread_version import thread_version_repo
 from chainlit_graphql.api.v1.graphql.schema.thread import ThreadType, ThreadConnection
-from chainlit_graphql.api.v1.graphql.schema.thread import ThreadsInputType
-from typing import Optional, List
+from chainlit_graphql.api.v1.graphql.schema.thread import (
+    ThreadsInputType,
+    ThreadsOrderByInput,
+)
+from chainlit_graphql.api.v1.graphql.selection import ThreadProjection
+from typing import Optional, List, Tuple
 from datetime import datetime
 import strawberry
 from chainlit_graphql.api.v1.graphql.scalars.json_scalar import Json
+from chainlit_graphql.core.mappers import MapperUtility
+from chainlit_graphql.service.ingest_queue import ingest_queue
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.core.thread_cache import thread_cache
+from collections import OrderedDict
+from functools import partial
+import hashlib
 import json
+import time
+
+# Thread counts kept in memory, one per project and filters
+THREAD_COUNT_CACHE_SIZE = 1_000
+# key -> (counted at, count)
+_thread_counts: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
 
 
 class ThreadService:
@@ -41,9 +59,11 @@ class ThreadService:
         last: Optional[int] = None,
         projectId: Optional[str] = None,
         skip: Optional[int] = None,
+        projection: Optional[ThreadProjection] = None,
+        orderBy: Optional[ThreadsOrderByInput] = None,
     ) -> ThreadConnection:
         # Call the get_paginated_threads method with all the parameters
-        return await self.thread_repository.get_paginated_threads(
+        connection = await self.thread_repository.get_paginated_threads(
             after=after,
             before=before,
             cursorAnchor=cursorAnchor,
@@ -52,10 +72,53 @@ class ThreadService:
             last=last,
             projectId=projectId,
             skip=skip,
+            projection=projection,
+            orderBy=orderBy,
+        )
+        connection.count_threads = partial(
+            self.count_threads, projectId, cursorAnchor, filters
+        )
+        return connection
+
+    async def count_threads(
+        self,
+        projectId: Optional[str],
+        cursorAnchor: Optional[datetime],
+        filters: Optional[List[ThreadsInputType]],
+        estimated: bool = False,
+    ) -> int:
+        """
+        Number of threads of a threads query, cached per project and filters for
+        THREAD_COUNT_CACHE_TTL_SECONDS.
+
+        :param estimated: Accept the planner's estimate on large tables.
+        """
+        key = hashlib.sha256(
+            repr((projectId, cursorAnchor, filters, estimated)).encode()
+        ).hexdigest()
+        now = time.monotonic()
+        cached = _thread_counts.get(key)
+        if cached is not None and now - cached[0] < settings.THREAD_COUNT_CACHE_TTL_SECONDS:
+            return cached[1]
+
+        count = await self.thread_repository.count_threads(
+            cursorAnchor=cursorAnchor, filters=filters, estimated=estimated
         )
+        _thread_counts[key] = (now, count)
+        _thread_counts.move_to_end(key)
+        while len(_thread_counts) > THREAD_COUNT_CACHE_SIZE:
+            _thread_counts.popitem(last=False)
+        return count
 
-    async def get_by_id(self, id: str):
-        thread = await self.thread_repository._get_by_id_with_session(id)
+    async def get_by_id(self, id: str, projection: Optional[ThreadProjection] = None):
+        # Served from the cache until the version of the thread changes
+        id = MapperUtility.decode_id(id)
+        thread = await thread_cache.get_or_load(
+            id,
+            projection,
+            partial(thread_version_repo.get_version, id),
+            partial(self.thread_repository._get_by_id_with_session, id, projection),
+        )
         return thread
 
     async def upsert_thread(
@@ -72,6 +135,26 @@ class ThreadService:
         # metadata_obj = json.loads(metadata) if metadata else None
         tags_json = tags if tags is not None else []
 
+        if ingest_queue.running and id:
+            await ingest_queue.put_thread(
+                {
+                    "id": id,
+                    "name": name,
+                    "tags": tags_json,
+                    "metadata": metadata,
+                    "participantId": participantId,
+                    "environment": environment,
+                }
+            )
+            return ThreadType(
+                id=MapperUtility.decode_id(id),
+                name=name,
+                metadata=metadata,
+                environment=environment,
+                tags=tags_json,
+                participant_id=participantId,
+            )
+
         thread = await self.thread_repository.upsert_thread(
             id,
             name,
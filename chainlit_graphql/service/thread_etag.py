@@ -0,0 +1,199 @@
+from chainlit_graphql.repository.thread_version import (
+    ThreadVersionRepository,
+    thread_version_repo,
+)
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.core.mappers import MapperUtility
+from graphql import (
+    DocumentNode,
+    FieldNode,
+    GraphQLError,
+    OperationDefinitionNode,
+    OperationType,
+    StringValueNode,
+    VariableNode,
+)
+from graphql.execution.values import get_argument_values, get_variable_values
+from strawberry import Schema
+from strawberry.arguments import convert_arguments
+from typing import List, Optional
+import hashlib
+import json
+import time
+
+# Root fields whose response only changes with the versions of the threads
+THREAD_READ_FIELDS = {"threadDetail", "threads", "__typename"}
+
+
+class ThreadETagService:
+    """
+    Strong ETags of the GraphQL queries that only read threads, computed from
+    the threads table before executing the query.
+
+    A threadDetail response is stamped with the version of its thread, read
+    with a primary key lookup. A threads response is stamped with the number,
+    sum and maximum of the versions of the threads it pages through, read with
+    the filters of the query.
+    """
+
+    def __init__(self, thread_version_repository: ThreadVersionRepository):
+        self.thread_version_repository = thread_version_repository
+
+    @staticmethod
+    def reads_threads(
+        document: Optional[DocumentNode], operation_name: Optional[str]
+    ) -> bool:
+        """
+        Whether a parsed GraphQL request only reads threads, and gets an ETag.
+        """
+        return (
+            ThreadETagService._thread_read_fields(document, operation_name)
+            is not None
+        )
+
+    async def etag(
+        self,
+        schema: Schema,
+        document: Optional[DocumentNode],
+        query: Optional[str],
+        variables: Optional[dict] = None,
+        operation_name: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        The ETag of a GraphQL request, known before executing it.
+
+        :param document: The parsed query.
+        :return: The quoted ETag, None when the request does not only read
+            threads or has invalid arguments.
+        """
+        fields = self._thread_read_fields(document, operation_name)
+        if fields is None or not isinstance(variables, (dict, type(None))):
+            return None
+        variables = variables or {}
+
+        thread_ids = []
+        stamps = []
+        for field in fields:
+            if field.name.value == "threads":
+                arguments = self._threads_arguments(
+                    schema,
+                    self._query_operation(document, operation_name),
+                    field,
+                    variables,
+                )
+                if arguments is None:
+                    return None
+                try:
+                    stamps.append(
+                        await self.thread_version_repository.get_stamp(
+                            arguments.get("filters"), arguments.get("cursorAnchor")
+                        )
+                    )
+                except ValueError:
+                    # Reported when the query is executed
+                    return None
+            if field.name.value == "threadDetail":
+                id = self._argument(field, "id", variables)
+                if not isinstance(id, str):
+                    return None
+                thread_ids.append(MapperUtility.decode_id(id))
+        versions = (
+            await self.thread_version_repository.get_versions(thread_ids)
+            if thread_ids
+            else {}
+        )
+        stamps.extend(versions.get(id) for id in thread_ids)
+
+        # Signed attachment urls expire, responses are stamped with a window too
+        window = int(time.time() // settings.THREAD_ETAG_WINDOW_SECONDS)
+        digest = hashlib.sha256(
+            json.dumps(
+                [query, variables, operation_name, stamps, window],
+                sort_keys=True,
+                default=str,
+            ).encode()
+        ).hexdigest()
+        return f'"{digest}"'
+
+    @staticmethod
+    def _query_operation(
+        document: Optional[DocumentNode], operation_name: Optional[str]
+    ) -> Optional[OperationDefinitionNode]:
+        if document is None:
+            return None
+        operations = [
+            definition
+            for definition in document.definitions
+            if isinstance(definition, OperationDefinitionNode)
+            and (
+                operation_name is None
+                or (definition.name and definition.name.value == operation_name)
+            )
+        ]
+        if len(operations) != 1 or operations[0].operation != OperationType.QUERY:
+            return None
+        return operations[0]
+
+    @staticmethod
+    def _thread_read_fields(
+        document: Optional[DocumentNode], operation_name: Optional[str]
+    ) -> Optional[List[FieldNode]]:
+        operation = ThreadETagService._query_operation(document, operation_name)
+        if operation is None:
+            return None
+
+        fields = operation.selection_set.selections
+        # Fragments and directives at the root could select anything
+        if not all(
+            isinstance(field, FieldNode)
+            and field.name.value in THREAD_READ_FIELDS
+            and not field.directives
+            for field in fields
+        ):
+            return None
+        return list(fields)
+
+    @staticmethod
+    def _threads_arguments(
+        schema: Schema,
+        operation: OperationDefinitionNode,
+        field: FieldNode,
+        variables: dict,
+    ) -> Optional[dict]:
+        # The arguments the threads resolver gets, None when they are invalid
+        variables = get_variable_values(
+            schema._schema, operation.variable_definitions, variables
+        )
+        if isinstance(variables, list):
+            return None
+        try:
+            values = get_argument_values(
+                schema._schema.query_type.fields["threads"], field, variables
+            )
+        except GraphQLError:
+            return None
+        (threads_field,) = (
+            definition
+            for definition in schema.get_type_by_name("Query").fields
+            if definition.python_name == "threads"
+        )
+        return convert_arguments(
+            values,
+            threads_field.arguments,
+            scalar_registry=schema.schema_converter.scalar_registry,
+            config=schema.config,
+        )
+
+    @staticmethod
+    def _argument(field: FieldNode, name: str, variables: dict):
+        for argument in field.arguments:
+            if argument.name.value != name:
+                continue
+            if isinstance(argument.value, VariableNode):
+                return variables.get(argument.value.name.value)
+            if isinstance(argument.value, StringValueNode):
+                return argument.value.value
+        return None
+
+
+thread_etag_service = ThreadETagService(thread_version_repo)
@@ -0,0 +1,118 @@
+from chainlit_graphql.repository.thread_stream import ThreadStreamRepository
+from chainlit_graphql.repository.thread import ThreadRepository
+from chainlit_graphql.api.v1.graphql.selection import (
+    STEP_COLUMNS_BY_FIELD,
+    THREAD_COLUMNS_BY_FIELD,
+)
+from chainlit_graphql.core.mappers import MapperUtility
+from dataclasses import asdict
+from datetime import datetime
+from enum import Enum
+from strawberry import relay
+from typing import AsyncIterator
+import json
+
+# Boundary of the multipart/mixed response, as used by GraphQL incremental delivery
+BOUNDARY = "-"
+CONTENT_TYPE = f'multipart/mixed; boundary="{BOUNDARY}"'
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _part(payload: dict) -> str:
+    return (
+        f"\r\n--{BOUNDARY}\r\nContent-Type: application/json; charset=utf-8\r\n\r\n"
+        + json.dumps(payload, default=_json_default)
+    )
+
+
+class ThreadStreamService:
+    def __init__(self, thread_stream_repository: ThreadStreamRepository):
+        self.thread_stream_repository = thread_stream_repository
+
+    async def stream_thread_detail(self, id: str) -> AsyncIterator[str]:
+        """
+        The threadDetail of a thread as a multipart/mixed incremental response.
+
+        The first part holds the thread with its participant and an empty steps
+        list, the same payload as `threadDetail` with `steps @stream`. Each
+        following part appends a chunk of steps, with their scores, at
+        ["threadDetail", "steps", index]. The last part has "hasNext": false.
+
+        :param id: The thread id, or its global id.
+        :return: The parts of the response body, as they are produced.
+        """
+        index = 0
+        async for kind, record in self.thread_stream_repository.stream_thread(
+            MapperUtility.decode_id(id)
+        ):
+            if kind == "thread":
+                if record is None:
+                    yield _part({"data": {"threadDetail": None}, "hasNext": False})
+                    break
+                yield _part(
+                    {"data": {"threadDetail": self._thread(record)}, "hasNext": True}
+                )
+            else:
+                yield _part(
+                    {
+                        "incremental": [
+                            {
+                                "items": [
+                                    await self._step(step, scores)
+                                    for step, scores in record
+                                ],
+                                "path": ["threadDetail", "steps", index],
+                            }
+                        ],
+                        "hasNext": True,
+                    }
+                )
+                index += len(record)
+        else:
+            yield _part({"hasNext": False})
+        yield f"\r\n--{BOUNDARY}--\r\n"
+
+    @staticmethod
+    def _thread(thread) -> dict:
+        payload = {
+            field: getattr(thread, column)
+            for field, column in THREAD_COLUMNS_BY_FIELD.items()
+        }
+        # Same values as the ThreadType fields
+        payload["id"] = relay.to_base64("ThreadType", thread.id)
+        payload["duration"] = ThreadRepository._seconds(thread.duration)
+        participant = thread.participant
+        payload["participant"] = participant and {
+            "id": participant.id,
+            "identifier": participant.identifier,
+            "metadata": participant.meta_data,
+            "createdAt": participant.createdAt,
+        }
+        payload["steps"] = []
+        return payload
+
+    @staticmethod
+    async def _step(step, scores) -> dict:
+        payload = {
+            field: getattr(step, column)
+            for field, column in STEP_COLUMNS_BY_FIELD.items()
+        }
+        generation = MapperUtility.deserialize_generation_payload(step.generation)
+        attachments = MapperUtility.deserialize_attachments_payload(
+            step.attachments, step.thread_id, step.id
+        )
+        payload["generation"] = generation and asdict(generation)
+        payload["attachments"] = attachments and [
+            asdict(attachment) for attachment in attachments
+        ]
+        payload["scores"] = [
+            asdict(score) for score in await MapperUtility.map_scores_to_scoretypes(scores)
+        ]
+        return payload
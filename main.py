@@ -6,6 +6,8 @@ from chainlit_graphql.db.database import db
 
 from chainlit_graphql.api.v1.api import api_router
 from chainlit_graphql.db.initial_data import create_initial_data
+from chainlit_graphql.service.ingest_queue import ingest_queue
+from chainlit_graphql.service.step_coalescer import step_coalescer
 
 
 def init_app():
@@ -23,9 +25,14 @@ def init_app():
     async def startup():
         await create_all()
         await create_initial_data()
+        await ingest_queue.start()
+        await step_coalescer.start()
 
     @app.on_event("shutdown")
     async def shutdown():
+        # Write what is still queued before closing the connections
+        await step_coalescer.stop()
+        await ingest_queue.stop()
         await db.close()
 
     @app.get("/health")
@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import patch
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from chainlit_graphql.core.thread_cache import thread_cache
 from chainlit_graphql.db.base import create_all, drop_all
 from chainlit_graphql.db.database import DatabaseSession, db
 import subprocess
@@ -23,6 +24,8 @@ async def prepare_db():
         # Ensure the database is in a clean state before each test
         await drop_all()
         await create_all()
+        # Cached threads of the previous tests are gone with their database
+        thread_cache.backend = None
 
         yield
 
@@ -1,6 +1,8 @@
+import json
 import pytest
 from sqlalchemy import text
-from chainlit_graphql.db.base import drop_all
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.db.base import create_all, drop_all
 from chainlit_graphql.db.database import db
 
 
@@ -42,3 +44,45 @@ async def test_create_all_and_drop_all():
         assert "threads" not in tables, "Table 'participants' was not dropped"
         assert "steps" not in tables, "Table 'participants' was not dropped"
         assert "scores" not in tables, "Table 'participants' was not dropped"
+
+
+@pytest.mark.asyncio
+async def test_create_all_migrates_json_columns(monkeypatch):
+    monkeypatch.setattr(settings, "JSONB_MIGRATION_BATCH_SIZE", 2)
+    # A database created when the columns were json
+    async with db.engine.begin() as conn:
+        await conn.execute(text("DROP INDEX ix_threads_meta_data"))
+        await conn.execute(
+            text("ALTER TABLE threads ALTER COLUMN meta_data TYPE json")
+        )
+        for i in range(5):
+            await conn.execute(
+                text(
+                    "INSERT INTO threads (id, \"createdAt\", meta_data) "
+                    "VALUES (:id, now(), CAST(:meta_data AS json))"
+                ),
+                {"id": f"t{i}", "meta_data": json.dumps({"n": i})},
+            )
+
+    await create_all()
+
+    async with db.engine.connect() as conn:
+        data_type = await conn.scalar(
+            text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = 'threads' AND column_name = 'meta_data'"
+            )
+        )
+        assert data_type == "jsonb"
+        rows = await conn.execute(text("SELECT id, meta_data FROM threads ORDER BY id"))
+        assert [(row.id, row.meta_data) for row in rows] == [
+            (f"t{i}", {"n": i}) for i in range(5)
+        ]
+        index = await conn.scalar(
+            text("SELECT indexdef FROM pg_indexes WHERE indexname = 'ix_threads_meta_data'")
+        )
+        assert "jsonb_path_ops" in index
+        leftovers = await conn.scalar(
+            text("SELECT count(*) FROM pg_trigger WHERE tgname LIKE '%__jsonb_sync'")
+        )
+        assert leftovers == 0
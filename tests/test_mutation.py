@@ -1,13 +1,16 @@
 from datetime import datetime, timezone
-from chainlit_graphql.api.v1.graphql.schema.score import Score, ScoreType
+from chainlit_graphql.api.v1.graphql.schema.score import Score, ScoreInput, ScoreType
 import pytest
+from types import SimpleNamespace
 from unittest.mock import patch, AsyncMock
+from strawberry.types.nodes import InlineFragment, SelectedField
 
 from chainlit_graphql.api.v1.graphql.graphql_app import Mutation
 from chainlit_graphql.api.v1.graphql.schema.step import (
     AttachmentPayloadInput,
     GenerationPayloadInput,
     ScorePayloadInput,
+    StepInput,
     StepType,
     StepsType,
 )
@@ -206,9 +209,96 @@ async def test_ingest_step_success(mock_upsert_step):
         scores,
         generation,
         attachments,
+        returning=None,
     )
 
 
+@pytest.mark.asyncio
+@patch("chainlit_graphql.service.step.StepService.upsert", new_callable=AsyncMock)
+async def test_ingest_step_acknowledgement_selection(mock_upsert_step):
+    # Selection of `ingestStep { id ok ... on StepsType { threadId } }`
+    info = SimpleNamespace(
+        selected_fields=[
+            SelectedField(
+                name="ingestStep",
+                directives={},
+                arguments={},
+                selections=[
+                    SelectedField(name="id", directives={}, arguments={}, selections=[]),
+                    SelectedField(name="ok", directives={}, arguments={}, selections=[]),
+                    InlineFragment(
+                        type_condition="StepsType",
+                        directives={},
+                        selections=[
+                            SelectedField(
+                                name="threadId", directives={}, arguments={}, selections=[]
+                            )
+                        ],
+                    ),
+                ],
+            )
+        ]
+    )
+
+    mutation = Mutation()
+    await mutation.ingestStep(id="step-1", threadId="thread-123", info=info)
+
+    assert mock_upsert_step.await_args.kwargs["returning"] == ["id", "thread_id"]
+
+
+@pytest.mark.asyncio
+@patch("chainlit_graphql.service.step.StepService.upsert", new_callable=AsyncMock)
+async def test_ingest_step_full_selection(mock_upsert_step):
+    info = SimpleNamespace(
+        selected_fields=[
+            SelectedField(
+                name="ingestStep",
+                directives={},
+                arguments={},
+                selections=[
+                    SelectedField(name="id", directives={}, arguments={}, selections=[]),
+                    SelectedField(
+                        name="attachments",
+                        directives={},
+                        arguments={},
+                        selections=[
+                            SelectedField(
+                                name="url", directives={}, arguments={}, selections=[]
+                            )
+                        ],
+                    ),
+                ],
+            )
+        ]
+    )
+
+    mutation = Mutation()
+    await mutation.ingestStep(id="step-1", threadId="thread-123", info=info)
+
+    assert mock_upsert_step.await_args.kwargs["returning"] is None
+
+
+@pytest.mark.asyncio
+@patch("chainlit_graphql.service.step.StepService.upsert_many", new_callable=AsyncMock)
+async def test_ingest_steps_success(mock_upsert_many):
+    now = datetime.now(timezone.utc)
+    steps = [
+        StepInput(id="step-1", threadId="thread-123", name="First Step"),
+        StepInput(id="step-2", threadId="thread-123", name="Second Step"),
+    ]
+    mock_steps = [
+        StepsType(id="step-1", thread_id="thread-123", createdAt=now),
+        StepsType(id="step-2", thread_id="thread-123", createdAt=now),
+    ]
+    mock_upsert_many.return_value = mock_steps
+
+    mutation = Mutation()
+    result = await mutation.ingestSteps(steps=steps)
+
+    assert result == mock_steps
+    mock_upsert_many.assert_awaited_once_with(steps, returning=None)
+
+
 @pytest.mark.asyncio
 @patch(
     "chainlit_graphql.service.thread.ThreadService.add_thread", new_callable=AsyncMock
@@ -296,6 +386,39 @@ async def test_create_score_success(mock_add_score):
     )
 
 
+@pytest.mark.asyncio
+@patch(
+    "chainlit_graphql.service.score.ScoreService.add_scores",
+    new_callable=AsyncMock,
+)
+async def test_create_scores_success(mock_add_scores):
+    scores = [
+        ScoreInput(name="First", type=ScoreType.AI, value=1.0, stepId="step-1"),
+        ScoreInput(name="Second", type=ScoreType.AI, value=0.0, stepId="step-2"),
+    ]
+    mock_scores = [
+        Score(
+            id=f"score-{i}",
+            name=score.name,
+            type=score.type,
+            value=score.value,
+            stepId=score.stepId,
+            generationId=None,
+            datasetExperimentItemId=None,
+            comment=None,
+            tags=None,
+        )
+        for i, score in enumerate(scores)
+    ]
+    mock_add_scores.return_value = mock_scores
+
+    mutation = Mutation()
+    result = await mutation.createScores(scores=scores)
+
+    assert result == mock_scores
+    mock_add_scores.assert_awaited_once_with(scores)
+
+
 @pytest.mark.asyncio
 @patch(
     "chainlit_graphql.service.score.ScoreService.update_score",
@@ -1,7 +1,9 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import pytest
+from sqlalchemy import event
 from unittest.mock import patch, AsyncMock, MagicMock
-from chainlit_graphql.api.v1.graphql.graphql_app import Query
+from chainlit_graphql.api.v1.graphql.graphql_app import Query, schema
+from chainlit_graphql.api.v1.graphql.loaders import Loaders
 from chainlit_graphql.api.v1.graphql.schema.thread import (
     FilterAccessorEnum,
     FilterOperatorEnum,
@@ -14,6 +16,9 @@ from chainlit_graphql.api.v1.graphql.schema.thread import (
 from chainlit_graphql.api.v1.graphql.schema.participant import ParticipantType
 from chainlit_graphql.service.apikey import ApikeyService
 from chainlit_graphql.api.deps import IsValidApiKey
+from chainlit_graphql.db.database import db
+from chainlit_graphql.core.mappers import MapperUtility
+from chainlit_graphql.model import Participant, Score, Step, Thread
 
 
 @pytest.mark.asyncio
@@ -92,7 +97,7 @@ async def test_thread_detail_success(mock_get_by_id):
     result = await query.threadDetail(id=thread_id)
 
     assert result == mock_thread
-    mock_get_by_id.assert_awaited_once_with(thread_id)
+    mock_get_by_id.assert_awaited_once_with(thread_id, None)
 
 
 @pytest.mark.asyncio
@@ -164,4 +169,255 @@ async def test_threads_success(mock_get_threads_paginated):
         projectId=None,
         skip=None,
         cursorAnchor=None,
+        projection=None,
+        orderBy=None,
     )
+
+
+@pytest.mark.asyncio
+@patch.object(ApikeyService, "validate_apikey", new_callable=AsyncMock)
+async def test_threads_loads_selected_relations_only(mock_validate_apikey, prepare_db):
+    mock_validate_apikey.return_value = True
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    async with db.SessionLocal() as session:
+        participant = Participant(id="participant-1", identifier="user", createdAt=now)
+        threads = [
+            Thread(id=f"thread-{i}", name=f"Thread {i}", participant=participant, createdAt=now)
+            for i in range(3)
+        ]
+        steps = [
+            Step(id=f"step-{i}", thread=thread, createdAt=now)
+            for i, thread in enumerate(threads)
+        ]
+        scores = [
+            Score(id=f"score-{i}", name="score", value=1.0, step=step)
+            for i, step in enumerate(steps)
+        ]
+        session.add_all([participant, *threads, *steps, *scores])
+        await session.commit()
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async def execute(selection):
+        statements.clear()
+        event.listen(db.engine.sync_engine, "before_cursor_execute", record_statement)
+        try:
+            result = await schema.execute(
+                "{ threads(first: 10) { edges { node { %s } } } }" % selection,
+                context_value={"request": MagicMock(), "loaders": Loaders()},
+            )
+        finally:
+            event.remove(db.engine.sync_engine, "before_cursor_execute", record_statement)
+        assert result.errors is None
+        return [edge["node"] for edge in result.data["threads"]["edges"]]
+
+    # Names only, no step, score or participant is read
+    nodes = await execute("id name")
+    assert len(nodes) == 3
+    assert not any("FROM steps" in statement for statement in statements)
+    assert not any("FROM scores" in statement for statement in statements)
+    assert not any("FROM participant" in statement for statement in statements)
+    assert not any("count(" in statement for statement in statements)
+
+    # Each selected relation is read with one query for all the threads
+    nodes = await execute("id steps { id scores { id } } participant { identifier }")
+    assert sorted(node["steps"][0]["scores"][0]["id"] for node in nodes) == [
+        "score-0",
+        "score-1",
+        "score-2",
+    ]
+    assert all(node["participant"]["identifier"] == "user" for node in nodes)
+    assert sum("FROM steps" in statement for statement in statements) == 1
+    assert sum("FROM scores" in statement for statement in statements) == 1
+    assert sum("FROM participant" in statement for statement in statements) == 1
+
+
+@pytest.mark.asyncio
+@patch.object(ApikeyService, "validate_apikey", new_callable=AsyncMock)
+async def test_thread_queries_read_selected_columns_only(mock_validate_apikey, prepare_db):
+    mock_validate_apikey.return_value = True
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    async with db.SessionLocal() as session:
+        thread = Thread(id="thread-1", name="Sidebar", meta_data={"a": 1}, createdAt=now)
+        step = Step(
+            id="step-1",
+            thread=thread,
+            input={"content": "question"},
+            output={"content": "answer"},
+            generation={"model": "gpt"},
+            createdAt=now,
+        )
+        session.add_all([thread, step])
+        await session.commit()
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async def execute(query):
+        statements.clear()
+        event.listen(db.engine.sync_engine, "before_cursor_execute", record_statement)
+        try:
+            result = await schema.execute(
+                query, context_value={"request": MagicMock(), "loaders": Loaders()}
+            )
+        finally:
+            event.remove(db.engine.sync_engine, "before_cursor_execute", record_statement)
+        assert result.errors is None
+        return result.data
+
+    # A sidebar listing reads neither the thread metadata nor any step
+    data = await execute(
+        "{ threads(first: 10) { edges { node { ...Item } } } }"
+        " fragment Item on ThreadType { id name createdAt }"
+    )
+    assert data["threads"]["edges"][0]["node"]["name"] == "Sidebar"
+    assert not any("threads.meta_data" in statement for statement in statements)
+    assert not any("FROM steps" in statement for statement in statements)
+
+    # Only the selected step payloads are read
+    data = await execute(
+        '{ threadDetail(id: "thread-1") { name steps { id output } } }'
+    )
+    assert data["threadDetail"]["steps"] == [
+        {"id": "step-1", "output": {"content": "answer"}}
+    ]
+    (steps_statement,) = [s for s in statements if "FROM steps" in s]
+    assert "steps.output" in steps_statement
+    assert "steps.input" not in steps_statement
+    assert "steps.generation" not in steps_statement
+
+
+@pytest.mark.asyncio
+@patch.object(ApikeyService, "validate_apikey", new_callable=AsyncMock)
+async def test_thread_steps_connection(mock_validate_apikey, prepare_db):
+    mock_validate_apikey.return_value = True
+    now = datetime.now(timezone.utc)
+    async with db.SessionLocal() as session:
+        thread = Thread(id="thread-1", createdAt=now)
+        # Steps 3 and 4 share their creation time, the id breaks the tie
+        steps = [
+            Step(
+                id=f"step-{i}",
+                thread=thread,
+                type="tool" if i == 2 else "llm",
+                input={"content": "large"},
+                createdAt=now + timedelta(seconds=min(i, 3)),
+            )
+            for i in range(6)
+        ]
+        scores = [Score(id="score-1", name="quality", value=1, step=steps[1])]
+        session.add_all([thread, *steps, *scores])
+        await session.commit()
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async def page(arguments):
+        event.listen(db.engine.sync_engine, "before_cursor_execute", record_statement)
+        try:
+            result = await schema.execute(
+                '{ threadDetail(id: "thread-1") { stepsConnection(%s) {'
+                " edges { cursor node { id scores { name } } }"
+                " pageInfo { hasNextPage hasPreviousPage endCursor } } } }"
+                % arguments,
+                context_value={"request": MagicMock(), "loaders": Loaders()},
+            )
+        finally:
+            event.remove(db.engine.sync_engine, "before_cursor_execute", record_statement)
+        assert result.errors is None
+        return result.data["threadDetail"]["stepsConnection"]
+
+    ids = []
+    after = None
+    while True:
+        arguments = "first: 2, types: [llm]"
+        if after is not None:
+            arguments += f', after: "{after}"'
+        connection = await page(arguments)
+        ids.append([edge["node"]["id"] for edge in connection["edges"]])
+        assert connection["pageInfo"]["hasPreviousPage"] is (after is not None)
+        if not connection["pageInfo"]["hasNextPage"]:
+            break
+        after = connection["pageInfo"]["endCursor"]
+
+    assert ids == [["step-0", "step-1"], ["step-3", "step-4"], ["step-5"]]
+    # Only the selected columns of the page are read
+    step_statements = [s for s in statements if "FROM steps" in s]
+    assert step_statements
+    assert not any("steps.input" in statement for statement in step_statements)
+
+    connection = await page(f'since: "{(now + timedelta(seconds=3)).isoformat()}"')
+    assert [edge["node"]["id"] for edge in connection["edges"]] == [
+        "step-3",
+        "step-4",
+        "step-5",
+    ]
+    assert connection["pageInfo"]["hasNextPage"] is False
+
+    connection = await page("first: 2")
+    assert connection["edges"][1]["node"]["scores"] == [{"name": "quality"}]
+
+    # An unknown step type is an error, not an empty page
+    result = await schema.execute(
+        '{ threadDetail(id: "thread-1") { stepsConnection(types: [nope]) {'
+        " edges { cursor } } } }",
+        context_value={"request": MagicMock(), "loaders": Loaders()},
+    )
+    assert result.errors is not None
+
+
+@pytest.mark.asyncio
+@patch.object(ApikeyService, "validate_apikey", new_callable=AsyncMock)
+async def test_threads_steps_connection_is_batched(mock_validate_apikey, prepare_db):
+    mock_validate_apikey.return_value = True
+    now = datetime.now(timezone.utc)
+    async with db.SessionLocal() as session:
+        threads = [Thread(id=f"thread-{i}", createdAt=now) for i in range(3)]
+        steps = [
+            Step(
+                id=f"step-{i}-{j}",
+                thread=thread,
+                createdAt=now + timedelta(seconds=j),
+            )
+            for i, thread in enumerate(threads)
+            for j in range(i + 1)
+        ]
+        session.add_all([*threads, *steps])
+        await session.commit()
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        result = await schema.execute(
+            "{ threads(first: 10) { edges { node { id stepsConnection(first: 1) {"
+            " edges { node { id } } pageInfo { hasNextPage } } } } } }",
+            context_value={"request": MagicMock(), "loaders": Loaders()},
+        )
+    finally:
+        event.remove(db.engine.sync_engine, "before_cursor_execute", record_statement)
+
+    assert result.errors is None
+    pages = {
+        MapperUtility.decode_id(edge["node"]["id"]): edge["node"]["stepsConnection"]
+        for edge in result.data["threads"]["edges"]
+    }
+    assert pages == {
+        f"thread-{i}": {
+            "edges": [{"node": {"id": f"step-{i}-0"}}],
+            "pageInfo": {"hasNextPage": i > 0},
+        }
+        for i in range(3)
+    }
+    # The pages of all the threads are read with one query
+    assert len([s for s in statements if "FROM steps" in s]) == 1
@@ -3,6 +3,7 @@ from chainlit_graphql.api.v1.graphql.schema.score import ScoreType
 from chainlit_graphql.model.score import Score
 from chainlit_graphql.model.step import Step
 import pytest
+from sqlalchemy.sql import select
 from chainlit_graphql.db.database import db
 from chainlit_graphql.repository.score import score_repo
 
@@ -139,3 +140,51 @@ async def test_delete_score(prepare_db):
         # Ensure the score is actually deleted
         deleted_score_check = await session.get(Score, "score-3")
         assert deleted_score_check is None, "Score should not exist after deletion"
+
+
+@pytest.mark.asyncio
+async def test_create_many_scores(prepare_db):
+    async with db.SessionLocal() as session:
+        session.add_all([Step(id="step-1"), Step(id="step-2")])
+        await session.commit()
+
+    scores = [
+        Score(
+            name=f"Score {i}",
+            type=ScoreType.AI.value,
+            value=float(i),
+            step_id=f"step-{i % 2 + 1}",
+            dataset_experiment_item_id="item-1",
+        )
+        for i in range(50)
+    ]
+
+    created_scores = await score_repo.create_many(scores)
+
+    # Returned in input order
+    assert [score.id for score in created_scores] == [score.id for score in scores]
+    assert [score.value for score in created_scores] == [float(i) for i in range(50)]
+
+    async with db.SessionLocal() as session:
+        result = await session.execute(select(Score))
+        assert len(result.scalars().all()) == 50
+
+
+@pytest.mark.asyncio
+async def test_create_many_scores_missing_step(prepare_db):
+    async with db.SessionLocal() as session:
+        session.add(Step(id="step-1"))
+        await session.commit()
+
+    scores = [
+        Score(name="Valid", type=ScoreType.AI.value, value=1.0, step_id="step-1"),
+        Score(name="Invalid", type=ScoreType.AI.value, value=1.0, step_id="step-404"),
+    ]
+
+    with pytest.raises(ValueError, match="step-404"):
+        await score_repo.create_many(scores)
+
+    # Nothing is written when a step is missing
+    async with db.SessionLocal() as session:
+        result = await session.execute(select(Score))
+        assert result.scalars().all() == []
@@ -3,8 +3,13 @@ from chainlit_graphql.core.mappers import MapperUtility
 import pytest
 from chainlit_graphql.db.database import db
 from chainlit_graphql.repository.step import step_repo
-from chainlit_graphql.model import Thread, Step
+from chainlit_graphql.repository.thread import thread_repo
+from chainlit_graphql.model import Thread, Step, Participant, PendingStep, Score
 from datetime import datetime, timedelta, timezone
+from sqlalchemy import event, insert, text
+import base64
+import json
+from unittest.mock import AsyncMock, patch
 
 
 @pytest.mark.asyncio
@@ -142,3 +147,272 @@ async def test_upsert_step_update(prepare_db):
             assert updated_step.type == updated_type
             assert updated_step.input == updated_input
             assert updated_step.output == updated_output
+            # The step keeps its place in the step pages
+            assert updated_step.createdAt == now
+
+
+@pytest.mark.asyncio
+async def test_upsert_steps_batch(prepare_db):
+    async with db.SessionLocal() as session:
+        thread_id = "test-thread-id-batch"
+        now = datetime.now(timezone.utc)
+        session.add(Thread(id=thread_id, name="Test Thread for Batch", createdAt=now))
+        session.add(
+            Step(
+                id="existing-step",
+                thread_id=thread_id,
+                name="Existing Step",
+                output={"old_output_key": "old_output_value"},
+                createdAt=now,
+            )
+        )
+        await session.commit()
+
+    steps = await step_repo.upsert_steps(
+        [
+            {"id": "new-step", "threadId": thread_id, "name": "New Step"},
+            {"id": "existing-step", "threadId": thread_id, "name": "Renamed Step"},
+            {
+                "id": "new-step",
+                "threadId": thread_id,
+                "output": {"new_output_key": "new_output_value"},
+            },
+        ]
+    )
+
+    assert [step.id for step in steps] == ["new-step", "existing-step"]
+
+    async with db.SessionLocal() as session:
+        new_step = await session.get(Step, "new-step")
+        assert new_step.name == "New Step"
+        assert new_step.output == {"new_output_key": "new_output_value"}
+
+        existing_step = await session.get(Step, "existing-step")
+        assert existing_step.name == "Renamed Step"
+        # Fields missing from the batch keep their stored value
+        assert existing_step.output == {"old_output_key": "old_output_value"}
+
+
+@pytest.mark.asyncio
+async def test_upsert_step_returning_columns(prepare_db):
+    async with db.SessionLocal() as session:
+        thread_id = "test-thread-id-returning"
+        now = datetime.now(timezone.utc)
+        session.add(Thread(id=thread_id, name="Test Thread for Returning", createdAt=now))
+        await session.commit()
+
+    with patch.object(
+        MapperUtility, "map_step_to_stepstype", new_callable=AsyncMock
+    ) as mock_map_step:
+        step = await step_repo.upsert_step(
+            id="returning-step",
+            threadId=thread_id,
+            name="Returning Step",
+            output={"key": "value"},
+            returning=["id", "name"],
+        )
+
+    # The step is not reloaded and mapped, only the requested columns are set
+    mock_map_step.assert_not_called()
+    assert step.ok is True
+    assert step.id == "returning-step"
+    assert step.name == "Returning Step"
+    assert step.output is None
+    assert step.createdAt is not None
+
+
+@pytest.mark.asyncio
+async def test_upsert_steps_pending_thread(prepare_db):
+    async with db.SessionLocal() as session:
+        session.add(Participant(id="participant-1", identifier="participant"))
+        await session.commit()
+
+    thread_id = "test-thread-id-pending"
+    (pending_step,) = await step_repo.upsert_steps(
+        [{"id": "early-step", "threadId": thread_id, "name": "Early Step"}]
+    )
+    await step_repo.upsert_step(
+        id="early-step", threadId=thread_id, output={"key": "streamed"}
+    )
+
+    assert pending_step.ok is True
+    async with db.SessionLocal() as session:
+        assert await session.get(Step, "early-step") is None
+        assert await session.get(PendingStep, "early-step") is not None
+
+    # Another replica merges an update into the parked step, the staging table
+    # is what the thread creation writes
+    async with db.SessionLocal() as session:
+        await session.execute(
+            text(
+                """UPDATE pending_steps SET payload = payload || '{"tags": ["replica"]}'"""
+                " WHERE id = 'early-step'"
+            )
+        )
+        await session.commit()
+
+    # Creating the thread writes the parked step in the same transaction
+    thread_type = await thread_repo.upsert_thread(
+        id=thread_id,
+        name="Late Thread",
+        tags=[],
+        metadata={},
+        participantId="participant-1",
+    )
+
+    assert thread_type.id == thread_id
+    async with db.SessionLocal() as session:
+        step = await session.get(Step, "early-step")
+        assert step.thread_id == thread_id
+        assert step.name == "Early Step"
+        assert step.output == {"key": "streamed"}
+        assert step.tags == ["replica"]
+        assert await session.get(PendingStep, "early-step") is None
+
+
+@pytest.mark.asyncio
+async def test_upsert_steps_without_thread(prepare_db):
+    with pytest.raises(ValueError):
+        await step_repo.upsert_steps([{"id": "orphan-step", "threadId": None}])
+
+
+async def _create_thread(thread_id: str, existing_steps: int):
+    async with db.SessionLocal() as session:
+        now = datetime.now(timezone.utc)
+        session.add(Thread(id=thread_id, name="Benchmark Thread", createdAt=now))
+        await session.flush()
+        await session.execute(
+            insert(Step),
+            [
+                {"id": f"{thread_id}-{i}", "thread_id": thread_id, "createdAt": now}
+                for i in range(existing_steps)
+            ],
+        )
+        await session.execute(
+            insert(Score),
+            [
+                {"name": "score", "type": "AI", "value": 1.0, "step_id": f"{thread_id}-{i}"}
+                for i in range(existing_steps)
+            ],
+        )
+        await session.commit()
+        await session.execute(text("ANALYZE steps"))
+        await session.execute(text("ANALYZE scores"))
+
+
+async def _record_step_ingest(thread_id: str) -> list:
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        await step_repo.upsert_step(
+            id=f"{thread_id}-new", threadId=thread_id, output={"content": "token"}
+        )
+    finally:
+        event.remove(db.engine.sync_engine, "before_cursor_execute", record_statement)
+    return statements
+
+
+def _plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+@pytest.mark.asyncio
+async def test_upsert_step_cost_independent_of_thread_length(prepare_db):
+    await _create_thread("short-thread", 10)
+    await _create_thread("long-thread", 10_000)
+
+    short_thread_statements = await _record_step_ingest("short-thread")
+    long_thread_statements = await _record_step_ingest("long-thread")
+
+    # Same statements whatever the thread length, and no thread graph loads
+    assert [s for s, _ in short_thread_statements] == [
+        s for s, _ in long_thread_statements
+    ]
+    assert not any("JOIN steps" in s for s, _ in long_thread_statements)
+
+    # Replayed with EXPLAIN ANALYZE and rolled back, no statement reads more than
+    # a few of the 10k steps and scores of the long thread
+    async with db.engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+        for statement, parameters in long_thread_statements:
+            if not statement.lstrip().upper().startswith(
+                ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+            ):
+                continue
+            transaction = driver_connection.transaction()
+            await transaction.start()
+            try:
+                (result,) = await driver_connection.fetchval(
+                    "EXPLAIN (ANALYZE, FORMAT JSON) " + statement, *parameters
+                )
+            finally:
+                await transaction.rollback()
+            for node in _plan_nodes(result["Plan"]):
+                if node.get("Relation Name") in ("steps", "scores"):
+                    read = node["Actual Rows"] + node.get("Rows Removed by Filter", 0)
+                    assert read * node["Actual Loops"] < 100, (statement, node)
+
+
+@pytest.mark.asyncio
+async def test_get_page_uses_thread_order_index(prepare_db):
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        connection = await step_repo.get_page("thread-1", first=10)
+    finally:
+        event.remove(db.engine.sync_engine, "before_cursor_execute", record_statement)
+    assert connection.edges == []
+    assert connection.page_info.has_next_page is False
+
+    statement, parameters = statements[0]
+    async with db.engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        # The test table is empty, rule out the scans the planner would prefer
+        await raw_connection.driver_connection.execute("SET enable_seqscan = off")
+        plan = json.dumps(
+            await raw_connection.driver_connection.fetchval(
+                "EXPLAIN (FORMAT JSON) " + statement, *parameters
+            )
+        )
+
+    assert "ix_steps_thread_id_createdAt_id" in plan
+    assert '"Sort"' not in plan
+
+
+@pytest.mark.asyncio
+async def test_get_page_after_deleted_step(prepare_db):
+    thread_id = "thread-deleted-cursor"
+    now = datetime.now(timezone.utc)
+    async with db.SessionLocal() as session:
+        session.add(Thread(id=thread_id, name="Thread", createdAt=now))
+        for i in range(3):
+            session.add(
+                Step(
+                    id=f"step-{i}",
+                    thread_id=thread_id,
+                    createdAt=now + timedelta(seconds=i),
+                )
+            )
+        await session.commit()
+
+    connection = await step_repo.get_page(thread_id, first=1)
+    assert [edge.node.id for edge in connection.edges] == ["step-0"]
+    connection = await step_repo.get_page(thread_id, first=1, after="step-0")
+    assert [edge.node.id for edge in connection.edges] == ["step-1"]
+
+    # The cursor of a deleted step gives an empty page, not the first one again
+    for cursor in ["deleted", base64.b64encode(b"Step:deleted").decode()]:
+        connection = await step_repo.get_page(thread_id, first=1, after=cursor)
+        assert connection.edges == []
+        assert connection.page_info.has_next_page is False
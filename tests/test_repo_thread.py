@@ -1,8 +1,13 @@
+import re
 import pytest
 from unittest.mock import AsyncMock, patch
+from sqlalchemy import event, text
 from sqlalchemy.future import select
 from chainlit_graphql.api.v1.graphql.schema.step import StepsType
 from chainlit_graphql.api.v1.graphql.schema.participant import ParticipantType
+from chainlit_graphql.api.v1.graphql.loaders import Loaders
+from chainlit_graphql.api.v1.graphql.selection import ThreadProjection
+from chainlit_graphql.core.config import settings
 from chainlit_graphql.db.database import db
 from chainlit_graphql.repository.thread import thread_repo
 from chainlit_graphql.model import Thread, Participant, Step
@@ -11,9 +16,13 @@ from chainlit_graphql.api.v1.graphql.schema.thread import (
     ThreadType,
     ThreadsFieldEnumType,
     ThreadsInputType,
+    ThreadsOrderByInput,
+    ThreadsOrderByInputColumn,
+    Direction,
 )
 from datetime import datetime, timedelta, timezone
 import base64
+import json
 
 
 @pytest.mark.asyncio
@@ -47,22 +56,219 @@ async def test_get_paginated_threads(prepare_db):
             filters=filters, first=1
         )
 
-        assert threads_connection.total_count == 1
+        assert await thread_repo.count_threads(filters=filters) == 1
         assert len(threads_connection.edges) == 1
         first_edge = threads_connection.edges[0]
 
         assert hasattr(first_edge.node, "id"), "ThreadType does not have 'id' attribute"
         assert first_edge.node.id == str(thread.id), "Thread ID does not match"
 
-        assert hasattr(
-            first_edge.node, "participant"
-        ), "ThreadType does not have 'participant' attribute"
         assert (
-            first_edge.node.participant.identifier == participant.identifier
-        ), "Participant identifier does not match"
+            first_edge.node.participant_id == participant.id
+        ), "Participant ID does not match"
+        # The participant is left to its resolver
+        assert first_edge.node.preloaded_participant is None
 
-        decoded_cursor = base64.b64decode(first_edge.cursor).decode()
-        assert decoded_cursor == f"Thread:{thread.id}"
+        created_at, cursor_id = json.loads(base64.urlsafe_b64decode(first_edge.cursor))
+        assert cursor_id == thread.id
+        assert datetime.fromisoformat(created_at) == first_edge.node.createdAt
+
+
+@pytest.mark.asyncio
+async def test_get_paginated_threads_keyset(prepare_db):
+    utc_now = datetime.now(timezone.utc).replace(tzinfo=None)
+    async with db.SessionLocal() as session:
+        # Threads 2 and 3 share their creation time, the id breaks the tie
+        session.add_all(
+            Thread(id=f"thread-{i}", createdAt=utc_now - timedelta(minutes=minutes))
+            for i, minutes in enumerate([0, 1, 2, 2, 3, 4])
+        )
+        await session.commit()
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        pages = []
+        after = None
+        while True:
+            connection = await thread_repo.get_paginated_threads(after=after, first=2)
+            pages.append([edge.node.id for edge in connection.edges])
+            assert connection.page_info.has_previous_page is (after is not None)
+            if not connection.page_info.has_next_page:
+                break
+            after = connection.page_info.end_cursor
+    finally:
+        event.remove(db.engine.sync_engine, "before_cursor_execute", record_statement)
+
+    assert pages == [
+        ["thread-0", "thread-1"],
+        ["thread-3", "thread-2"],
+        ["thread-4", "thread-5"],
+    ]
+    # One query per page, the next page is told by the extra row
+    assert len(statements) == 3
+
+    # Paging backwards from the last page
+    connection = await thread_repo.get_paginated_threads(
+        before=connection.page_info.start_cursor, last=2
+    )
+    assert [edge.node.id for edge in connection.edges] == ["thread-3", "thread-2"]
+    assert connection.page_info.has_previous_page is True
+    assert connection.page_info.has_next_page is True
+
+    # Cursors of the former "Thread:<id>" form are still accepted
+    legacy_cursor = base64.b64encode(b"Thread:thread-1").decode()
+    connection = await thread_repo.get_paginated_threads(after=legacy_cursor, first=2)
+    assert [edge.node.id for edge in connection.edges] == ["thread-3", "thread-2"]
+
+    # The cursor of a deleted thread gives an empty page, not the first one again
+    for cursor in [base64.b64encode(b"Thread:deleted").decode(), "deleted"]:
+        connection = await thread_repo.get_paginated_threads(after=cursor, first=2)
+        assert connection.edges == []
+        assert connection.page_info.has_next_page is False
+        connection = await thread_repo.get_paginated_threads(before=cursor, last=2)
+        assert connection.edges == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("column", list(ThreadsOrderByInputColumn))
+@pytest.mark.parametrize("direction", list(Direction))
+async def test_get_paginated_threads_order_by(prepare_db, column, direction):
+    utc_now = datetime.now(timezone.utc)
+    async with db.SessionLocal() as session:
+        participants = [Participant(id=f"p{i}", identifier=f"p{i}") for i in range(2)]
+        session.add_all(participants)
+        # Repeated token counts and participants, the id breaks the ties
+        session.add_all(
+            Thread(
+                id=f"thread-{i}",
+                participant_id=None if i % 3 == 0 else f"p{i % 2}",
+                token_count=(i * 7) % 4,
+                createdAt=utc_now - timedelta(minutes=i % 5),
+            )
+            for i in range(9)
+        )
+        await session.commit()
+
+        sort_key = {
+            ThreadsOrderByInputColumn.createdAt: lambda thread: thread.createdAt,
+            ThreadsOrderByInputColumn.participant: lambda thread: thread.participant_id
+            or "",
+            ThreadsOrderByInputColumn.tokenCount: lambda thread: thread.token_count,
+        }[column]
+        threads = (await session.scalars(select(Thread))).all()
+        expected = [
+            thread.id
+            for thread in sorted(
+                threads,
+                key=lambda thread: (sort_key(thread), thread.id),
+                reverse=direction == Direction.DESC,
+            )
+        ]
+
+    order_by = ThreadsOrderByInput(column=column, direction=direction)
+    pages = []
+    after = None
+    while True:
+        connection = await thread_repo.get_paginated_threads(
+            after=after, first=2, orderBy=order_by
+        )
+        pages.extend(edge.node.id for edge in connection.edges)
+        if not connection.page_info.has_next_page:
+            break
+        after = connection.page_info.end_cursor
+    assert pages == expected
+
+    # Paging backwards from the last page
+    connection = await thread_repo.get_paginated_threads(
+        before=connection.page_info.start_cursor, last=3, orderBy=order_by
+    )
+    assert [edge.node.id for edge in connection.edges] == expected[-4:-1]
+
+    # A cursor of another order is looked up by its thread
+    connection = await thread_repo.get_paginated_threads(
+        after=base64.b64encode(b"Thread:" + expected[0].encode()).decode(),
+        first=1,
+        orderBy=order_by,
+    )
+    assert [edge.node.id for edge in connection.edges] == expected[1:2]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "column, index",
+    [
+        (ThreadsOrderByInputColumn.createdAt, "ix_threads_createdAt_id"),
+        (ThreadsOrderByInputColumn.participant, "ix_threads_participant_order"),
+        (ThreadsOrderByInputColumn.tokenCount, "ix_threads_token_count_id"),
+    ],
+)
+async def test_order_by_uses_index(prepare_db, column, index):
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        await thread_repo.get_paginated_threads(
+            first=10,
+            orderBy=ThreadsOrderByInput(column=column, direction=Direction.ASC),
+        )
+    finally:
+        event.remove(db.engine.sync_engine, "before_cursor_execute", record_statement)
+
+    statement, parameters = statements[0]
+    async with db.engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        # The test table is empty, rule out the scans the planner would prefer
+        await raw_connection.driver_connection.execute("SET enable_seqscan = off")
+        plan = json.dumps(
+            await raw_connection.driver_connection.fetchval(
+                "EXPLAIN (FORMAT JSON) " + statement, *parameters
+            )
+        )
+
+    assert index in plan
+    # The rows come in index order, without sorting the table
+    assert '"Sort"' not in plan
+
+
+@pytest.mark.asyncio
+async def test_count_threads_estimated(prepare_db):
+    utc_now = datetime.now(timezone.utc)
+    async with db.SessionLocal() as session:
+        session.add_all(
+            Thread(id=f"thread-{i}", environment="test", createdAt=utc_now)
+            for i in range(20)
+        )
+        await session.commit()
+    async with db.engine.begin() as conn:
+        await conn.execute(text("ANALYZE threads"))
+
+    filters = [
+        ThreadsInputType(
+            field=ThreadsFieldEnumType.participantId,
+            operator=FilterOperatorEnum.eq,
+            value="participant-1",
+        ),
+    ]
+
+    # Small tables are always counted
+    assert await thread_repo.count_threads(estimated=True) == 20
+
+    with patch.object(settings, "THREAD_COUNT_ESTIMATE_MIN_ROWS", 10):
+        # The statistics of the table, then the planner's estimate of the filters
+        assert await thread_repo.count_threads(estimated=True) == 20
+        estimate = await thread_repo.count_threads(
+            cursorAnchor=utc_now, filters=filters, estimated=True
+        )
+        assert isinstance(estimate, int)
+        assert await thread_repo.count_threads(cursorAnchor=utc_now) == 20
 
 
 @pytest.mark.asyncio
@@ -203,6 +409,43 @@ async def test_update_thread(prepare_db):
         ), "Database thread metadata did not update correctly"
 
 
+@pytest.mark.asyncio
+async def test_upsert_thread_single_statement(prepare_db):
+    async with db.SessionLocal() as session:
+        now = datetime.now(timezone.utc)
+        thread = Thread(id="long-thread", name="Long Thread", createdAt=now)
+        session.add(thread)
+        session.add_all(
+            [Step(id=f"step-{i}", thread=thread, createdAt=now) for i in range(100)]
+        )
+        await session.commit()
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        # No participant, the thread is only updated if it exists
+        thread_type = await thread_repo.upsert_thread(
+            id="long-thread", name=None, tags=None, metadata={"key": "value"}
+        )
+        missing_thread_type = await thread_repo.upsert_thread(
+            id="missing-thread", name="Missing", tags=None, metadata=None
+        )
+    finally:
+        event.remove(db.engine.sync_engine, "before_cursor_execute", record_statement)
+
+    # One statement per call, the steps of the thread are never read
+    assert len(statements) == 2
+    assert not any(re.search(r"\bsteps\b", statement) for statement in statements)
+    assert thread_type.name == "Long Thread"
+    assert thread_type.metadata == {"key": "value"}
+    assert thread_type.preloaded_steps is None
+    assert missing_thread_type is None
+
+
 @pytest.mark.asyncio
 async def test_get_thread_by_id_with_steps_and_participant(prepare_db):
     async with db.SessionLocal() as session:
@@ -272,7 +515,44 @@ async def test_get_by_id_with_session(prepare_db):
     assert (
         fetched_thread.participant_id == "participant-123"
     ), "Fetched thread participant ID mismatch"
-    assert len(fetched_thread.steps) == 2, "Incorrect number of steps fetched"
+    # Steps are left to the resolver, which loads them in createdAt order
+    assert fetched_thread.preloaded_steps is None
+    steps = await Loaders().steps_by_thread_id.load(fetched_thread.id)
+    assert [step.id for step in steps] == ["step-1", "step-2"]
+
+
+@pytest.mark.asyncio
+async def test_projection_does_not_load_participant_threads(prepare_db):
+    utc_now = datetime.now(timezone.utc).replace(tzinfo=None)
+    async with db.SessionLocal() as session:
+        participant = Participant(
+            id="participant-123", identifier="participant-identifier", createdAt=utc_now
+        )
+        session.add_all(
+            [participant]
+            + [
+                Thread(id=f"thread-{i}", participant=participant, createdAt=utc_now)
+                for i in range(3)
+            ]
+        )
+        await session.commit()
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    projection = ThreadProjection(thread_columns=["id", "name"], participant=True)
+    event.listen(db.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        thread = await thread_repo._get_by_id_with_session("thread-0", projection)
+    finally:
+        event.remove(db.engine.sync_engine, "before_cursor_execute", record_statement)
+
+    assert thread.preloaded_participant.id == "participant-123"
+    # The thread and its participant, the other threads of the participant are
+    # never read
+    assert len(statements) == 2
 
 
 @pytest.mark.asyncio
@@ -360,14 +640,15 @@ async def test_map_to_thread_type():
         assert result.tags == mock_thread.tags
         assert result.createdAt == mock_thread.createdAt
         assert result.participant_id == mock_thread.participant_id
-        assert len(result.steps) == 2
-        assert all(isinstance(step, StepsType) for step in result.steps)
+        assert len(result.preloaded_steps) == 2
+        assert all(isinstance(step, StepsType) for step in result.preloaded_steps)
 
         # Verify mapping of the participant
-        assert isinstance(result.participant, ParticipantType)
-        assert result.participant.id == mock_participant.id
-        assert result.participant.identifier == mock_participant.identifier
-        assert result.participant.createdAt == mock_participant.createdAt
+        participant = result.preloaded_participant
+        assert isinstance(participant, ParticipantType)
+        assert participant.id == mock_participant.id
+        assert participant.identifier == mock_participant.identifier
+        assert participant.createdAt == mock_participant.createdAt
 
         # Ensure the steps mapping function was called correctly
         mocked_mapper.assert_called()
@@ -0,0 +1,141 @@
+from chainlit_graphql.api.v1.graphql.schema.step import GenerationPayloadInput
+import pytest
+from chainlit_graphql.db.base import create_all
+from chainlit_graphql.db.database import db
+from chainlit_graphql.model import Participant, Step, Thread
+from chainlit_graphql.repository.step import step_repo
+from chainlit_graphql.repository.thread import thread_repo
+from chainlit_graphql.repository.thread_aggregate import thread_aggregate_repo
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from sqlalchemy.future import select
+
+NOW = datetime.now(timezone.utc)
+
+AGGREGATE_COLUMNS = [
+    "step_count",
+    "token_count",
+    "input_token_count",
+    "output_token_count",
+    "steps_started_at",
+    "steps_ended_at",
+    "duration",
+]
+
+
+async def aggregates(thread_id: str) -> dict:
+    async with db.SessionLocal() as session:
+        thread = await session.get(Thread, thread_id)
+        return {name: getattr(thread, name) for name in AGGREGATE_COLUMNS}
+
+
+async def refreshed(thread_id: str) -> dict:
+    async with db.SessionLocal() as session:
+        async with session.begin():
+            await thread_aggregate_repo.refresh([thread_id], session)
+    return await aggregates(thread_id)
+
+
+@pytest.fixture
+async def threads(prepare_db):
+    async with db.SessionLocal() as session:
+        session.add_all([Thread(id="t1", createdAt=NOW), Thread(id="t2", createdAt=NOW)])
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_step_upserts_maintain_thread_aggregates(threads):
+    await step_repo.upsert_steps(
+        [
+            {
+                "id": "s1",
+                "threadId": "t1",
+                "startTime": NOW,
+                "endTime": NOW + timedelta(seconds=4),
+                "generation": GenerationPayloadInput(tokenCount=10),
+            },
+            {
+                "id": "s2",
+                "threadId": "t1",
+                "startTime": NOW + timedelta(seconds=1),
+                "endTime": NOW + timedelta(seconds=9),
+                "generation": GenerationPayloadInput(
+                    inputTokenCount=3, outputTokenCount=4
+                ),
+            },
+        ]
+    )
+    assert await aggregates("t1") == {
+        "step_count": 2,
+        "token_count": 17,
+        "input_token_count": 3,
+        "output_token_count": 4,
+        "steps_started_at": NOW,
+        "steps_ended_at": NOW + timedelta(seconds=9),
+        "duration": 9,
+    }
+
+    # An update replaces the tokens of the step, a step without generation
+    # keeps them, a step moved to another thread leaves the first one
+    await step_repo.upsert_step(
+        id="s1", threadId="t1", generation=GenerationPayloadInput(tokenCount=1)
+    )
+    await step_repo.upsert_step(id="s1", threadId="t1", name="renamed")
+    await step_repo.upsert_step(id="s2", threadId="t2")
+
+    t1 = await aggregates("t1")
+    assert (t1["step_count"], t1["token_count"]) == (1, 1)
+    t2 = await aggregates("t2")
+    assert (t2["step_count"], t2["token_count"], t2["input_token_count"]) == (1, 7, 3)
+
+    assert await aggregates("t2") == await refreshed("t2")
+    assert (await refreshed("t1"))["token_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_pending_steps_are_counted_when_their_thread_is_created(prepare_db):
+    await step_repo.upsert_step(
+        id="s1", threadId="t1", generation=GenerationPayloadInput(tokenCount=5)
+    )
+    async with db.SessionLocal() as session:
+        session.add(Participant(id="p1", identifier="alice"))
+        await session.commit()
+    await thread_repo.upsert_thread("t1", None, None, None, participantId="p1")
+
+    assert (await aggregates("t1"))["token_count"] == 5
+
+
+@pytest.mark.asyncio
+async def test_create_all_backfills_the_aggregates_of_existing_threads(threads):
+    async with db.SessionLocal() as session:
+        session.add_all(
+            [
+                Step(id="s1", thread_id="t1", generation={"tokenCount": 2}),
+                Step(id="s2", thread_id="t1", generation={"tokenCount": 3}),
+            ]
+        )
+        await session.commit()
+    # A database created before the aggregates existed
+    async with db.engine.begin() as conn:
+        for name in AGGREGATE_COLUMNS + ["last_activity_at", "version"]:
+            await conn.execute(text(f"ALTER TABLE threads DROP COLUMN {name}"))
+
+    await create_all()
+
+    assert (await aggregates("t1"))["step_count"] == 2
+    assert (await aggregates("t1"))["token_count"] == 5
+    assert (await aggregates("t2"))["step_count"] == 0
+    async with db.SessionLocal() as session:
+        indexes = await session.scalars(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = 'threads'")
+        )
+        assert {
+            "ix_threads_token_count_id",
+            "ix_threads_duration",
+            "ix_threads_version",
+        } <= set(indexes)
+        versions = (await session.scalars(select(Thread.version))).all()
+        assert len(set(versions)) == 2 and None not in versions
+        assert await session.scalar(
+            select(Thread.id).where(Thread.token_count > 4)
+        ) == "t1"
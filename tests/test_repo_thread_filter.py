@@ -0,0 +1,263 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.future import select
+from chainlit_graphql.db.database import db
+from chainlit_graphql.model import Participant, Score, Step, Thread
+from chainlit_graphql.repository.thread import thread_repo
+from chainlit_graphql.repository.thread_aggregate import thread_aggregate_repo
+from chainlit_graphql.repository.thread_filter import ThreadFilterCompiler
+from chainlit_graphql.api.v1.graphql.schema.thread import (
+    FilterAccessorEnum,
+    FilterOperatorEnum as Op,
+    StringOrFloat,
+    ThreadsFieldEnumType as Field,
+    ThreadsInputType,
+)
+from datetime import datetime, timedelta, timezone
+
+
+NOW = datetime.now(timezone.utc)
+
+
+def thread_filter(field, operator, value=None, path=None, accessor=None):
+    return ThreadsInputType(
+        field=field,
+        operator=operator,
+        value=value,
+        path=[StringOrFloat(stringValue=element) for element in path or []],
+        accessor=accessor,
+    )
+
+
+@pytest.fixture
+async def threads(prepare_db):
+    async with db.SessionLocal() as session:
+        alice = Participant(id="p1", identifier="alice", createdAt=NOW)
+        bob = Participant(id="p2", identifier="bob", createdAt=NOW)
+        t1 = Thread(
+            id="t1",
+            name="Weather chat",
+            environment="production",
+            tags=["a", "b"],
+            meta_data={"user": {"plan": "pro"}, "n": 5},
+            participant=alice,
+            createdAt=NOW - timedelta(days=2),
+        )
+        t2 = Thread(
+            id="t2",
+            name="Billing",
+            environment="staging",
+            tags=["b"],
+            meta_data={"user": {"plan": "free"}, "n": 2},
+            participant=bob,
+            createdAt=NOW - timedelta(days=1),
+        )
+        t3 = Thread(id="t3", tags=None, createdAt=NOW)
+        s1 = Step(
+            id="s1",
+            thread=t1,
+            type="user_message",
+            name="ask",
+            input={"content": "forecast?"},
+            output={"content": "sunny day"},
+            generation={"tokenCount": 30},
+            start_time=NOW - timedelta(seconds=10),
+            end_time=NOW,
+        )
+        s2 = Step(
+            id="s2",
+            thread=t2,
+            type="assistant_message",
+            name="answer",
+            output={"content": "invoice"},
+            generation={"tokenCount": 5},
+        )
+        scores = [
+            Score(id="c1", name="quality", value=0.9, step=s1),
+            Score(id="c2", name="quality", value=0.2, step=s2),
+        ]
+        session.add_all([alice, bob, t1, t2, t3, s1, s2, *scores])
+        await session.commit()
+        # The steps were added without the step upserts
+        await thread_aggregate_repo.refresh(None, session)
+        await session.commit()
+
+
+YESTERDAY = (NOW - timedelta(hours=36)).isoformat()
+
+FILTER_MATRIX = [
+    (thread_filter(Field.createdAt, Op.gt, YESTERDAY), {"t2", "t3"}),
+    (thread_filter(Field.createdAt, Op.ngt, YESTERDAY), {"t1"}),
+    (thread_filter(Field.environment, Op.eq, "production"), {"t1"}),
+    (thread_filter(Field.environment, Op.neq, "production"), {"t2", "t3"}),
+    (thread_filter(Field.environment, Op.eq, ["production", "staging"]), {"t1", "t2"}),
+    (thread_filter(Field.environment, Op.nin, ["production"]), {"t2", "t3"}),
+    (thread_filter(Field.environment, Op.exists), {"t1", "t2"}),
+    (thread_filter(Field.environment, Op.nis, "production"), {"t2", "t3"}),
+    (thread_filter(Field.environment, Op.nis), {"t1", "t2"}),
+    (thread_filter(Field.name, Op.ilike, "%chat%"), {"t1"}),
+    (thread_filter(Field.name, Op.nilike, "%chat%"), {"t2", "t3"}),
+    (thread_filter(Field.name, Op.match, "bill"), {"t2"}),
+    (thread_filter(Field.name, Op.regexp, "^Bill"), {"t2"}),
+    (thread_filter(Field.name, Op.text_search, "weather chat"), {"t1"}),
+    (thread_filter(Field.name, Op.text_search_or, "weather billing"), {"t1", "t2"}),
+    (thread_filter(Field.id, Op.eq, "t3"), {"t3"}),
+    (thread_filter(Field.participantId, Op.eq, "p1"), {"t1"}),
+    (thread_filter(Field.tags, Op.overlap, ["a"]), {"t1"}),
+    (thread_filter(Field.tags, Op.eq, "b"), {"t1", "t2"}),
+    (thread_filter(Field.tags, Op.nin, ["a"]), {"t2", "t3"}),
+    (thread_filter(Field.tags, Op.nis, ["b"]), {"t1", "t3"}),
+    (thread_filter(Field.metadata, Op.eq, "pro", path=["user", "plan"]), {"t1"}),
+    (thread_filter(Field.metadata, Op.gt, 3, path=["n"]), {"t1"}),
+    (
+        thread_filter(
+            Field.metadata,
+            Op.eq,
+            {"plan": "free"},
+            path=["user"],
+            accessor=FilterAccessorEnum.json_get,
+        ),
+        {"t2"},
+    ),
+    (thread_filter(Field.metadata, Op.exists_key, "user"), {"t1", "t2"}),
+    (thread_filter(Field.metadata, Op.exists_key, "plan", path=["user"]), {"t1", "t2"}),
+    (thread_filter(Field.metadata, Op.exists_key, "plan"), set()),
+    (thread_filter(Field.participantIdentifiers, Op.eq, ["alice"]), {"t1"}),
+    (thread_filter(Field.participantIdentifiers, Op.nin, ["alice"]), {"t2", "t3"}),
+    (thread_filter(Field.stepType, Op.eq, "user_message"), {"t1"}),
+    (thread_filter(Field.stepType, Op.neq, "user_message"), {"t2", "t3"}),
+    (thread_filter(Field.stepName, Op.ilike, "ans%"), {"t2"}),
+    (thread_filter(Field.stepOutput, Op.ilike, "%sun%", path=["content"]), {"t1"}),
+    (thread_filter(Field.stepOutput, Op.text_search, "Sunny DAY"), {"t1"}),
+    (thread_filter(Field.stepOutput, Op.text_search, "sunny invoice"), set()),
+    (thread_filter(Field.stepOutput, Op.text_search_or, "sunny invoice"), {"t1", "t2"}),
+    (thread_filter(Field.stepInput, Op.text_search, "forecast"), {"t1"}),
+    (thread_filter(Field.stepInput, Op.eq, "forecast?", path=["content"]), {"t1"}),
+    (thread_filter(Field.scoreValue, Op.gte, 0.5), {"t1"}),
+    (thread_filter(Field.scoreValue, Op.lt, 0.5, path=["quality"]), {"t2"}),
+    (thread_filter(Field.duration, Op.gt, 5), {"t1"}),
+    (thread_filter(Field.tokenCount, Op.gte, 10), {"t1"}),
+    (thread_filter(Field.tokenCount, Op.lt, 10), {"t2", "t3"}),
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "filter, expected",
+    FILTER_MATRIX,
+    ids=[f"{f.field.value}-{f.operator.value}" for f, _ in FILTER_MATRIX],
+)
+async def test_filter_matrix(threads, filter, expected):
+    connection = await thread_repo.get_paginated_threads(filters=[filter], first=10)
+
+    assert {edge.node.id for edge in connection.edges} == expected
+    assert await thread_repo.count_threads(filters=[filter]) == len(expected)
+
+
+@pytest.mark.asyncio
+async def test_filters_are_combined(threads):
+    filters = [
+        thread_filter(Field.tags, Op.eq, "b"),
+        thread_filter(Field.stepType, Op.eq, "assistant_message"),
+    ]
+    connection = await thread_repo.get_paginated_threads(filters=filters, first=10)
+
+    assert [edge.node.id for edge in connection.edges] == ["t2"]
+
+
+@pytest.mark.asyncio
+async def test_step_search_ranks_threads(prepare_db):
+    async with db.SessionLocal() as session:
+        contents = ["one invoice", "invoice invoice invoice", "none", "invoice x invoice"]
+        for i, content in enumerate(contents):
+            thread = Thread(id=f"t{i}", createdAt=NOW - timedelta(minutes=i))
+            step = Step(id=f"s{i}", thread=thread, output={"content": content})
+            session.add_all([thread, step])
+        await session.commit()
+
+    filters = [thread_filter(Field.stepOutput, Op.text_search, "invoice")]
+    connection = await thread_repo.get_paginated_threads(filters=filters, first=10)
+    ranked = [edge.node.id for edge in connection.edges]
+    assert ranked == ["t1", "t3", "t0"]
+
+    # Pages follow the relevance order
+    pages = []
+    after = None
+    while True:
+        connection = await thread_repo.get_paginated_threads(
+            filters=filters, first=1, after=after
+        )
+        pages.extend(edge.node.id for edge in connection.edges)
+        if not connection.page_info.has_next_page:
+            break
+        after = connection.page_info.end_cursor
+    assert pages == ranked
+
+
+def test_unsupported_operator():
+    with pytest.raises(ValueError, match="like is not supported on tags"):
+        ThreadFilterCompiler.compile([thread_filter(Field.tags, Op.like, "a%")])
+    with pytest.raises(ValueError, match="nis takes a single value"):
+        ThreadFilterCompiler.compile(
+            [thread_filter(Field.environment, Op.nis, ["production"])]
+        )
+    with pytest.raises(ValueError, match="nis takes a list of tags"):
+        ThreadFilterCompiler.compile([thread_filter(Field.tags, Op.nis, "b")])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "filter, index",
+    [
+        (thread_filter(Field.createdAt, Op.gt, YESTERDAY), "ix_threads_createdAt_id"),
+        (thread_filter(Field.environment, Op.eq, "prod"), "ix_threads_environment"),
+        (thread_filter(Field.participantId, Op.eq, "p1"), "ix_threads_participant_id"),
+        (thread_filter(Field.tags, Op.overlap, ["a"]), "ix_threads_tags"),
+        (
+            thread_filter(Field.participantIdentifiers, Op.eq, ["alice"]),
+            "ix_participants_identifier",
+        ),
+        (
+            thread_filter(Field.metadata, Op.eq, "pro", path=["user", "plan"]),
+            "ix_threads_meta_data",
+        ),
+        (
+            thread_filter(
+                Field.metadata,
+                Op.eq,
+                {"plan": "free"},
+                path=["user"],
+                accessor=FilterAccessorEnum.json_get,
+            ),
+            "ix_threads_meta_data",
+        ),
+        (thread_filter(Field.metadata, Op.exists_key, "n"), "ix_threads_meta_data"),
+        (thread_filter(Field.tokenCount, Op.gte, 10), "ix_threads_token_count_id"),
+        (thread_filter(Field.duration, Op.gt, 5), "ix_threads_duration"),
+        (thread_filter(Field.stepName, Op.eq, "ask"), "ix_steps_thread_id"),
+        (thread_filter(Field.scoreValue, Op.gte, 0.5), "ix_scores_step_id"),
+        (
+            thread_filter(Field.stepOutput, Op.text_search, "sunny"),
+            "ix_steps_output_search",
+        ),
+        (
+            thread_filter(Field.stepInput, Op.text_search_or, "rain snow"),
+            "ix_steps_input_search",
+        ),
+    ],
+    ids=lambda value: value if isinstance(value, str) else None,
+)
+async def test_filter_uses_index(threads, filter, index):
+    query = select(Thread.id).where(*ThreadFilterCompiler.compile([filter]))
+    compiled = query.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    async with db.engine.connect() as conn:
+        # The test tables are tiny, rule out the scans the planner would prefer
+        await conn.execute(text("SET enable_seqscan = off"))
+        plan = await conn.scalar(
+            text("EXPLAIN (FORMAT JSON) " + str(compiled).replace(":", r"\:"))
+        )
+
+    assert index in str(plan)
@@ -0,0 +1,202 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi import Request, Response
+from strawberry.extensions import ParserCache
+from chainlit_graphql.api.v1.graphql.graphql_app import router
+from chainlit_graphql.api.v1.graphql.loaders import Loaders
+from chainlit_graphql.api.v1.graphql.schema.score import ScoreType
+from chainlit_graphql.db.database import db
+from chainlit_graphql.model import Participant
+from chainlit_graphql.repository.participant import participant_repo
+from chainlit_graphql.repository.score import score_repo
+from chainlit_graphql.repository.step import step_repo
+from chainlit_graphql.repository.thread import thread_repo
+from chainlit_graphql.repository.thread_version import thread_version_repo
+from chainlit_graphql.service.apikey import ApikeyService
+from chainlit_graphql.service.score import ScoreService
+from chainlit_graphql.service.thread import ThreadService
+
+THREAD_DETAIL = """
+query ThreadDetail($id: String!) {
+    threadDetail(id: $id) { id name steps { id scores { value } } }
+}
+"""
+
+THREADS = "{ threads(first: 10) { edges { node { id name } } } }"
+
+
+async def _post(query: str, variables: dict = None, headers: dict = None) -> Response:
+    body = json.dumps({"query": query, "variables": variables}).encode()
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    request = Request(
+        {
+            "type": "http",
+            "method": "POST",
+            "path": "/api/graphql",
+            "query_string": b"",
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"x-api-key", b"key"),
+                *(
+                    (name.encode(), value.encode())
+                    for name, value in (headers or {}).items()
+                ),
+            ],
+        },
+        receive,
+    )
+    router.temporal_response = Response()
+    return await router.run(
+        request,
+        context={"request": request, "response": Response(), "loaders": Loaders()},
+        root_value=None,
+    )
+
+
+@pytest.fixture(autouse=True)
+def valid_api_key():
+    with patch.object(
+        ApikeyService, "validate_apikey", new_callable=AsyncMock, return_value=True
+    ) as validate_apikey:
+        yield validate_apikey
+
+
+@pytest.fixture
+async def participant(prepare_db):
+    async with db.SessionLocal() as session:
+        session.add(Participant(id="p1", identifier="alice"))
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_thread_detail_not_modified(participant, valid_api_key):
+    await thread_repo.upsert_thread("t1", "First", None, None, participantId="p1")
+    variables = {"id": "t1"}
+
+    response = await _post(THREAD_DETAIL, variables)
+    etag = response.headers["etag"]
+    assert json.loads(response.body)["data"]["threadDetail"]["name"] == "First"
+
+    # Answered without executing the query
+    with patch.object(ThreadService, "get_by_id", new_callable=AsyncMock) as get_by_id:
+        response = await _post(THREAD_DETAIL, variables, {"if-none-match": etag})
+        assert (response.status_code, response.body) == (304, b"")
+        assert response.headers["etag"] == etag
+        get_by_id.assert_not_awaited()
+
+    # Every write to the thread, its steps, scores or participant changes it
+    etags = {etag}
+    await step_repo.upsert_step(id="s1", threadId="t1")
+    etags.add((await _post(THREAD_DETAIL, variables)).headers["etag"])
+    await ScoreService(score_repository=score_repo).add_score(
+        name="quality",
+        type=ScoreType.HUMAN,
+        value=1.0,
+        stepId="s1",
+        generationId=None,
+        datasetExperimentItemId=None,
+        comment=None,
+        tags=None,
+    )
+    etags.add((await _post(THREAD_DETAIL, variables)).headers["etag"])
+    await participant_repo.update(Participant(id="p1", identifier="bob"))
+    response = await _post(THREAD_DETAIL, variables, {"if-none-match": etag})
+    assert response.status_code == 200
+    etags.add(response.headers["etag"])
+    assert len(etags) == 4
+
+    # Without a valid api key the query is executed, and fails, before any
+    # version is read
+    valid_api_key.return_value = False
+    with patch.object(
+        thread_version_repo, "get_versions", new_callable=AsyncMock
+    ) as get_versions:
+        response = await _post(
+            THREAD_DETAIL, variables, {"if-none-match": response.headers["etag"]}
+        )
+        get_versions.assert_not_awaited()
+    assert json.loads(response.body)["errors"]
+    assert "etag" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_threads_etag_changes_with_any_thread(participant):
+    await thread_repo.upsert_thread("t1", "First", None, None, participantId="p1")
+    etag = (await _post(THREADS)).headers["etag"]
+    # Answered without executing the query
+    with patch.object(
+        ThreadService, "get_threads_paginated", new_callable=AsyncMock
+    ) as get_threads_paginated:
+        response = await _post(THREADS, headers={"if-none-match": etag})
+        assert (response.status_code, response.body) == (304, b"")
+        assert response.headers["etag"] == etag
+        get_threads_paginated.assert_not_awaited()
+
+    await thread_repo.upsert_thread("t2", "Second", None, None, participantId="p1")
+    second_etag = (await _post(THREADS)).headers["etag"]
+    assert second_etag != etag
+    # Back to the threads of the first response
+    await thread_repo.delete("t2")
+    assert (await _post(THREADS)).headers["etag"] == etag
+    await thread_repo.upsert_thread("t1", "Renamed", None, None)
+    assert (await _post(THREADS)).headers["etag"] not in {etag, second_etag}
+
+
+@pytest.mark.asyncio
+async def test_threads_etag_only_changes_with_filtered_threads(participant):
+    await thread_repo.upsert_thread(
+        "t1", "First", None, None, participantId="p1", environment="prod"
+    )
+    await thread_repo.upsert_thread(
+        "t2", "Second", None, None, participantId="p1", environment="dev"
+    )
+    query = """
+    query Threads($filters: [ThreadsInputType!]) {
+        threads(first: 10, filters: $filters) { edges { node { id name } } }
+    }
+    """
+    variables = {
+        "filters": [{"field": "environment", "operator": "eq", "value": "prod"}]
+    }
+    response = await _post(query, variables)
+    etag = response.headers["etag"]
+    assert [
+        edge["node"]["name"]
+        for edge in json.loads(response.body)["data"]["threads"]["edges"]
+    ] == ["First"]
+
+    # Writes to the other threads leave the filtered ones unchanged
+    await thread_repo.upsert_thread("t2", "Renamed", None, None)
+    response = await _post(query, variables, {"if-none-match": etag})
+    assert response.status_code == 304
+
+    # A thread entering the filtered ones changes it
+    await thread_repo.upsert_thread("t2", None, None, None, environment="prod")
+    response = await _post(query, variables, {"if-none-match": etag})
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_etag_parses_the_query_once(participant):
+    (parser_cache,) = (
+        extension
+        for extension in router.schema.extensions
+        if isinstance(extension, ParserCache)
+    )
+    parser_cache.cached_parse_document.cache_clear()
+    await _post(THREADS)
+    cache_info = parser_cache.cached_parse_document.cache_info()
+    # Read for the ETag, then reused by the execution
+    assert (cache_info.misses, cache_info.hits) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_other_operations_have_no_etag(participant):
+    response = await _post('mutation { deleteThread(id: "t1") { id } }')
+    assert "etag" not in response.headers
+    response = await _post('{ participant(identifier: "alice") { id } }')
+    assert "etag" not in response.headers
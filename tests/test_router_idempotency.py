@@ -0,0 +1,97 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi import Request, Response
+from strawberry.http.exceptions import HTTPException
+from chainlit_graphql.api.v1.graphql.graphql_app import router
+from chainlit_graphql.api.v1.graphql.schema.score import Score, ScoreType
+from chainlit_graphql.service.apikey import ApikeyService
+from chainlit_graphql.service.idempotency import idempotency_service
+from chainlit_graphql.service.score import ScoreService
+
+CREATE_SCORE = """
+mutation {
+    createScore(name: "quality", type: AI, value: 1.0) { id name }
+}
+"""
+
+
+async def _post(query: str, headers: dict) -> Response:
+    body = json.dumps({"query": query}).encode()
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    request = Request(
+        {
+            "type": "http",
+            "method": "POST",
+            "path": "/api/graphql",
+            "query_string": b"",
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"x-api-key", b"key"),
+                *((name.encode(), value.encode()) for name, value in headers.items()),
+            ],
+        },
+        receive,
+    )
+    router.temporal_response = Response()
+    return await router.run(
+        request, context={"request": request, "response": Response()}, root_value=None
+    )
+
+
+@pytest.fixture(autouse=True)
+def valid_api_key():
+    with patch.object(
+        ApikeyService, "validate_apikey", new_callable=AsyncMock, return_value=True
+    ):
+        yield
+    # Responses remembered by a test are gone with its database
+    idempotency_service._responses.clear()
+
+
+@pytest.mark.asyncio
+@patch.object(ScoreService, "add_score", new_callable=AsyncMock)
+async def test_retried_mutation_is_applied_once(mock_add_score, prepare_db):
+    mock_add_score.return_value = Score(
+        id="score-1",
+        name="quality",
+        type=ScoreType.AI,
+        value=1.0,
+        stepId=None,
+        generationId=None,
+        datasetExperimentItemId=None,
+        comment=None,
+        tags=None,
+    )
+
+    response = await _post(CREATE_SCORE, {"idempotency-key": "retry-1"})
+    retried_response = await _post(CREATE_SCORE, {"idempotency-key": "retry-1"})
+
+    mock_add_score.assert_awaited_once()
+    assert json.loads(response.body)["data"]["createScore"]["id"] == "score-1"
+    assert retried_response.body == response.body
+    assert retried_response.headers["idempotent-replayed"] == "true"
+
+    # Same key for another request
+    with pytest.raises(HTTPException) as error:
+        await _post(CREATE_SCORE.replace("1.0", "0.5"), {"idempotency-key": "retry-1"})
+    assert error.value.status_code == 422
+
+    # Without a key every request is executed
+    await _post(CREATE_SCORE, {})
+    assert mock_add_score.await_count == 2
+
+
+@pytest.mark.asyncio
+@patch.object(ScoreService, "add_score", new_callable=AsyncMock)
+async def test_failed_mutation_is_not_remembered(mock_add_score, prepare_db):
+    mock_add_score.side_effect = ValueError("Database unavailable")
+
+    response = await _post(CREATE_SCORE, {"idempotency-key": "retry-1"})
+    assert json.loads(response.body)["errors"]
+
+    await _post(CREATE_SCORE, {"idempotency-key": "retry-1"})
+    assert mock_add_score.await_count == 2
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from urllib.parse import urlencode
+from fastapi import Request, Response
+from strawberry.http.exceptions import HTTPException
+from chainlit_graphql.api.v1.graphql.graphql_app import router
+from chainlit_graphql.api.v1.graphql.loaders import Loaders
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.service.apikey import ApikeyService
+from chainlit_graphql.db.database import db
+from chainlit_graphql.model import PersistedQuery
+from chainlit_graphql.repository.persisted_query import persisted_query_repo
+from chainlit_graphql.service.persisted_query import persisted_query_service
+from sqlalchemy import select
+
+HELLO = "query Hello { __typename }"
+HELLO_HASH = hashlib.sha256(HELLO.encode()).hexdigest()
+
+
+def _extensions(hash: str) -> dict:
+    return {"persistedQuery": {"version": 1, "sha256Hash": hash}}
+
+
+async def _run(method: str, params: dict) -> Response:
+    body = b""
+    query_string = b""
+    headers = [(b"x-api-key", b"key")]
+    if method == "GET":
+        query_string = urlencode(
+            {
+                name: value if isinstance(value, str) else json.dumps(value)
+                for name, value in params.items()
+            }
+        ).encode()
+    else:
+        body = json.dumps(params).encode()
+        headers.append((b"content-type", b"application/json"))
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    request = Request(
+        {
+            "type": "http",
+            "method": method,
+            "path": "/api/graphql",
+            "query_string": query_string,
+            "headers": headers,
+        },
+        receive,
+    )
+    router.temporal_response = Response()
+    return await router.run(
+        request,
+        context={"request": request, "response": Response(), "loaders": Loaders()},
+        root_value=None,
+    )
+
+
+@pytest.fixture(autouse=True)
+def valid_api_key():
+    with patch.object(
+        ApikeyService, "validate_apikey", new_callable=AsyncMock, return_value=True
+    ) as validate_apikey:
+        yield validate_apikey
+    # Queries registered by a test are gone with its database
+    persisted_query_service._queries.clear()
+
+
+@pytest.mark.asyncio
+async def test_persisted_query_is_registered_then_sent_by_hash(prepare_db):
+    response = await _run("POST", {"extensions": _extensions(HELLO_HASH)})
+    (error,) = json.loads(response.body)["errors"]
+    assert error["extensions"]["code"] == "PERSISTED_QUERY_NOT_FOUND"
+
+    response = await _run("POST", {"query": HELLO, "extensions": _extensions(HELLO_HASH)})
+    assert json.loads(response.body)["data"] == {"__typename": "Query"}
+
+    # Read-only operations can then be sent as short GETs
+    for method in ("POST", "GET"):
+        response = await _run(method, {"extensions": _extensions(HELLO_HASH)})
+        assert json.loads(response.body)["data"] == {"__typename": "Query"}
+
+    response = await _run("POST", {"query": HELLO, "extensions": _extensions("0" * 64)})
+    (error,) = json.loads(response.body)["errors"]
+    assert error["extensions"]["code"] == "INVALID_SHA256_HASH"
+
+
+@pytest.mark.asyncio
+async def test_mutations_are_not_accepted_as_get(prepare_db):
+    mutation = 'mutation { deleteThread(id: "t1") { id } }'
+    hash = hashlib.sha256(mutation.encode()).hexdigest()
+    await _run("POST", {"query": mutation, "extensions": _extensions(hash)})
+
+    with pytest.raises(HTTPException) as error:
+        await _run("GET", {"extensions": _extensions(hash)})
+    assert error.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_persisted_queries_are_shared_through_the_database(prepare_db):
+    with patch.object(settings, "PERSISTED_QUERY_STORE_DB", True):
+        await _run("POST", {"query": HELLO, "extensions": _extensions(HELLO_HASH)})
+        # Another replica, or this one after a restart
+        persisted_query_service._queries.clear()
+
+        response = await _run("GET", {"extensions": _extensions(HELLO_HASH)})
+        assert json.loads(response.body)["data"] == {"__typename": "Query"}
+
+
+@pytest.mark.asyncio
+async def test_queries_are_only_registered_with_a_valid_api_key(
+    prepare_db, valid_api_key
+):
+    valid_api_key.return_value = False
+    # Executed, a query without resolvers needs no api key, but not registered
+    response = await _run("POST", {"query": HELLO, "extensions": _extensions(HELLO_HASH)})
+    assert json.loads(response.body)["data"] == {"__typename": "Query"}
+
+    valid_api_key.return_value = True
+    response = await _run("POST", {"extensions": _extensions(HELLO_HASH)})
+    (error,) = json.loads(response.body)["errors"]
+    assert error["extensions"]["code"] == "PERSISTED_QUERY_NOT_FOUND"
+
+
+@pytest.mark.asyncio
+async def test_stored_persisted_queries_expire(prepare_db):
+    other = "query Other { __typename }"
+    other_hash = hashlib.sha256(other.encode()).hexdigest()
+
+    with patch.object(settings, "PERSISTED_QUERY_STORE_DB", True):
+        await _run("POST", {"query": HELLO, "extensions": _extensions(HELLO_HASH)})
+        assert await persisted_query_repo.get(HELLO_HASH) == HELLO
+
+        with patch.object(settings, "PERSISTED_QUERY_TTL_SECONDS", 0):
+            assert await persisted_query_repo.get(HELLO_HASH) is None
+            # Saving a query deletes the expired ones
+            await _run(
+                "POST", {"query": other, "extensions": _extensions(other_hash)}
+            )
+
+    async with db.SessionLocal() as session:
+        hashes = (await session.scalars(select(PersistedQuery.hash))).all()
+    assert hashes == [other_hash]
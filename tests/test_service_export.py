@@ -0,0 +1,107 @@
+import io
+import json
+import sys
+import pytest
+from unittest.mock import AsyncMock, patch
+from chainlit_graphql import cli
+from datetime import datetime, timedelta, timezone
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.db.database import db
+from chainlit_graphql.model import Participant, Score, Step, Thread
+from chainlit_graphql.repository.bulk_export import bulk_export_repo
+from chainlit_graphql.repository.bulk_import import bulk_import_repo
+from chainlit_graphql.service.bulk_export import ExportService
+from chainlit_graphql.service.bulk_import import ImportService
+
+
+async def _export(**filters):
+    export_service = ExportService(bulk_export_repo)
+    return [chunk async for chunk in export_service.export_ndjson(**filters)]
+
+
+@pytest.mark.asyncio
+async def test_export_ndjson(prepare_db):
+    now = datetime.now(timezone.utc)
+    async with db.SessionLocal() as session:
+        participant = Participant(id="participant-1", identifier="user", createdAt=now)
+        thread = Thread(
+            id="thread-1",
+            name="Exported Thread",
+            environment="production",
+            tags=["tag"],
+            participant=participant,
+            createdAt=now,
+        )
+        step = Step(id="step-1", thread=thread, output={"key": "value"}, createdAt=now)
+        score = Score(id="score-1", name="quality", value=1.0, step=step)
+        other_thread = Thread(
+            id="thread-2", environment="staging", createdAt=now - timedelta(days=1)
+        )
+        other_step = Step(id="step-2", thread=other_thread, createdAt=now)
+        session.add_all([participant, thread, step, score, other_thread, other_step])
+        await session.commit()
+
+    with patch.object(settings, "EXPORT_FETCH_SIZE", 2):
+        chunks = await _export(environment="production")
+
+    records = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    # Parents come before their children
+    assert [(record["kind"], record["id"]) for record in records] == [
+        ("participant", "participant-1"),
+        ("thread", "thread-1"),
+        ("step", "step-1"),
+        ("score", "score-1"),
+    ]
+    assert all(len(chunk.splitlines()) <= 2 for chunk in chunks)
+    assert records[1]["tags"] == ["tag"]
+    assert records[2]["output"] == {"key": "value"}
+    assert datetime.fromisoformat(records[1]["createdAt"]) == now
+
+    chunks = await _export(createdBefore=now - timedelta(hours=1))
+    records = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    assert [record["id"] for record in records] == ["thread-2", "step-2"]
+
+
+@pytest.mark.asyncio
+async def test_export_import_round_trip(prepare_db):
+    now = datetime.now(timezone.utc)
+    async with db.SessionLocal() as session:
+        thread = Thread(id="thread-1", meta_data={"key": "value"}, createdAt=now)
+        step = Step(id="step-1", thread=thread, start_time=now, createdAt=now)
+        session.add_all([thread, step])
+        await session.commit()
+
+    lines = "".join(await _export()).splitlines()
+
+    async with db.SessionLocal() as session:
+        await session.delete(await session.get(Thread, "thread-1"))
+        await session.commit()
+
+    async def _lines():
+        for line in lines:
+            yield line
+
+    import_service = ImportService(bulk_import_repo)
+    reports = [report async for report in import_service.import_ndjson(_lines())]
+
+    assert reports[-1]["written"] == {"thread": 1, "step": 1}
+    async with db.SessionLocal() as session:
+        assert (await session.get(Thread, "thread-1")).meta_data == {"key": "value"}
+        assert (await session.get(Step, "step-1")).start_time == now
+
+
+@pytest.mark.asyncio
+async def test_cli_leaves_the_std_streams_open():
+    async def export_ndjson(self, **filters):
+        yield '{"kind": "thread"}\n'
+
+    stdin, stdout = io.StringIO('{"kind": "thread"}\n'), io.StringIO()
+    with patch.object(sys, "stdin", stdin), patch.object(sys, "stdout", stdout):
+        assert [line async for line in cli._read_lines("-")] == ['{"kind": "thread"}\n']
+        with patch.object(ExportService, "export_ndjson", export_ndjson), patch.object(
+            db, "close", AsyncMock()
+        ):
+            await cli.export_file("-")
+
+    assert not stdin.closed and not stdout.closed
+    assert stdout.getvalue() == '{"kind": "thread"}\n'
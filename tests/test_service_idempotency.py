@@ -0,0 +1,64 @@
+import pytest
+from unittest.mock import patch
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import update
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.db.database import db
+from chainlit_graphql.model import IdempotencyKey
+from chainlit_graphql.repository.idempotency_key import idempotency_key_repo
+from chainlit_graphql.service.idempotency import IdempotencyService
+
+
+@pytest.mark.asyncio
+async def test_claim_complete_and_replay(prepare_db):
+    service = IdempotencyService(idempotency_key_repo)
+
+    assert await service.claim("key-1", "fingerprint-1") is None
+    # Running, a concurrent retry sees the claim
+    assert await service.claim("key-1", "fingerprint-1") == ("fingerprint-1", None)
+
+    await service.complete("key-1", "fingerprint-1", '{"data": {}}')
+    assert await service.claim("key-1", "fingerprint-1") == (
+        "fingerprint-1",
+        '{"data": {}}',
+    )
+
+    # Another replica finds the response in the table
+    other_service = IdempotencyService(idempotency_key_repo)
+    assert await other_service.claim("key-1", "fingerprint-1") == (
+        "fingerprint-1",
+        '{"data": {}}',
+    )
+
+
+@pytest.mark.asyncio
+async def test_release_and_stale_claims(prepare_db):
+    service = IdempotencyService(idempotency_key_repo)
+
+    assert await service.claim("key-1", "fingerprint-1") is None
+    await service.release("key-1")
+    # A failed request can be retried
+    assert await service.claim("key-1", "fingerprint-1") is None
+
+    # A claim whose request never completed is taken over after the lock expires
+    async with db.SessionLocal() as session:
+        await session.execute(
+            update(IdempotencyKey).values(
+                createdAt=datetime.now(timezone.utc) - timedelta(minutes=5)
+            )
+        )
+        await session.commit()
+    with patch.object(settings, "IDEMPOTENCY_LOCK_SECONDS", 60):
+        assert await service.claim("key-1", "fingerprint-2") is None
+
+
+@pytest.mark.asyncio
+async def test_responses_cache_is_bounded(prepare_db):
+    service = IdempotencyService(idempotency_key_repo)
+
+    with patch.object(settings, "IDEMPOTENCY_CACHE_SIZE", 2):
+        for key in ["key-1", "key-2", "key-3"]:
+            assert await service.claim(key, "fingerprint") is None
+            await service.complete(key, "fingerprint", "{}")
+
+    assert list(service._responses) == ["key-2", "key-3"]
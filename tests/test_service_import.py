@@ -0,0 +1,168 @@
+import json
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+from fastapi import HTTPException, Request
+from chainlit_graphql.api.v1.endpoint.import_routes import import_ndjson
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.db.database import db
+from chainlit_graphql.model import Participant, Score, Step, Thread
+from chainlit_graphql.repository.bulk_import import bulk_import_repo
+from chainlit_graphql.service.bulk_import import ImportService
+
+
+async def _lines(records):
+    for record in records:
+        yield json.dumps(record)
+
+
+@pytest.mark.asyncio
+async def test_import_ndjson(prepare_db):
+    async with db.SessionLocal() as session:
+        session.add(
+            Thread(id="thread-1", name="Stored Thread", environment="production")
+        )
+        await session.commit()
+
+    records = [
+        {"kind": "participant", "id": "participant-1", "identifier": "user"},
+        {
+            "kind": "thread",
+            "id": "thread-1",
+            "participant_id": "participant-1",
+            "meta_data": {"key": "value"},
+            "tags": ["imported"],
+            "createdAt": "2024-04-01T10:00:00+00:00",
+        },
+        {"kind": "step", "id": "step-1", "thread_id": "thread-1", "name": "Old Name"},
+        {"kind": "step", "id": "step-2", "thread_id": "thread-1", "output": {"a": 1}},
+        # The last row of an id wins
+        {"kind": "step", "id": "step-1", "thread_id": "thread-1", "name": "Step"},
+        # Parent missing, skipped
+        {"kind": "step", "id": "orphan-step", "thread_id": "missing-thread"},
+        {
+            "kind": "score",
+            "id": "score-1",
+            "step_id": "step-1",
+            "name": "quality",
+            "type": "HUMAN",
+            "value": 1,
+            "tags": ["good"],
+        },
+    ]
+
+    import_service = ImportService(bulk_import_repo)
+    with patch.object(settings, "IMPORT_BATCH_SIZE", 5):
+        reports = [report async for report in import_service.import_ndjson(_lines(records))]
+
+    assert [report["rows"] for report in reports] == [5, 7, 7]
+    assert reports[-1]["done"] is True
+    assert reports[-1]["written"] == {
+        "participant": 1,
+        "thread": 1,
+        "step": 2,
+        "score": 1,
+    }
+    assert reports[-1]["skipped"] == 2
+    assert all(report["rows_per_second"] >= 0 for report in reports)
+
+    async with db.SessionLocal() as session:
+        assert (await session.get(Participant, "participant-1")).identifier == "user"
+
+        thread = await session.get(Thread, "thread-1")
+        # Missing values keep the stored ones
+        assert thread.name == "Stored Thread"
+        assert thread.environment == "production"
+        assert thread.participant_id == "participant-1"
+        assert thread.meta_data == {"key": "value"}
+        assert thread.tags == ["imported"]
+
+        assert (await session.get(Step, "step-1")).name == "Step"
+        assert (await session.get(Step, "step-2")).output == {"a": 1}
+        assert await session.get(Step, "orphan-step") is None
+
+        score = await session.get(Score, "score-1")
+        assert score.value == 1
+        assert score.tags == ["good"]
+
+
+@pytest.mark.asyncio
+async def test_import_ndjson_unknown_kind(prepare_db):
+    import_service = ImportService(bulk_import_repo)
+
+    with pytest.raises(ValueError):
+        async for _ in import_service.import_ndjson(_lines([{"kind": "user"}])):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_reimport_without_created_at_keeps_it(prepare_db):
+    created_at = "2024-04-01T10:00:00+00:00"
+    import_service = ImportService(bulk_import_repo)
+
+    async def run(records):
+        async for _ in import_service.import_ndjson(_lines(records)):
+            pass
+
+    await run(
+        [
+            {"kind": "thread", "id": "thread-1", "createdAt": created_at},
+            {
+                "kind": "step",
+                "id": "step-1",
+                "thread_id": "thread-1",
+                "createdAt": created_at,
+            },
+        ]
+    )
+    await run(
+        [
+            {"kind": "thread", "id": "thread-1", "name": "Renamed"},
+            {"kind": "step", "id": "step-1", "thread_id": "thread-1", "name": "Step"},
+            # A new row without createdAt is created now
+            {"kind": "step", "id": "step-2", "thread_id": "thread-1"},
+        ]
+    )
+
+    async with db.SessionLocal() as session:
+        thread = await session.get(Thread, "thread-1")
+        step = await session.get(Step, "step-1")
+        new_step = await session.get(Step, "step-2")
+    assert (thread.name, step.name) == ("Renamed", "Step")
+    assert thread.createdAt == datetime.fromisoformat(created_at)
+    assert step.createdAt == datetime.fromisoformat(created_at)
+    assert new_step.createdAt > datetime.fromisoformat(created_at)
+
+
+def _request(body: bytes) -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request(
+        {"type": "http", "method": "POST", "path": "/api/import", "headers": []},
+        receive,
+    )
+
+
+@pytest.mark.asyncio
+async def test_import_endpoint_rejects_invalid_records(prepare_db):
+    with pytest.raises(HTTPException) as error:
+        await import_ndjson(_request(b'{"kind": "user"}\n'))
+    assert error.value.status_code == 400
+    assert "unknown record kind 'user'" in error.value.detail
+
+
+@pytest.mark.asyncio
+async def test_import_endpoint_reports_later_failures_in_the_stream(prepare_db):
+    body = "\n".join(
+        [json.dumps({"kind": "participant", "id": "p1", "identifier": "alice"})]
+        + ["not json"]
+    ).encode()
+
+    with patch.object(settings, "IMPORT_BATCH_SIZE", 1):
+        response = await import_ndjson(_request(body))
+        reports = [json.loads(chunk) async for chunk in response.body_iterator]
+
+    assert reports[0]["written"] == {"participant": 1}
+    assert reports[-1]["done"] is True
+    assert "error" in reports[-1]
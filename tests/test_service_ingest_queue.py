@@ -0,0 +1,134 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from datetime import datetime, timezone
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.db.database import db
+from chainlit_graphql.model import Participant, Step, Thread
+from chainlit_graphql.repository.step import step_repo
+from chainlit_graphql.repository.thread import thread_repo
+from chainlit_graphql.service.ingest_queue import IngestQueue
+from chainlit_graphql.service.step import StepService
+from chainlit_graphql.service.thread import ThreadService
+
+
+@pytest.fixture
+def async_ingestion(tmp_path):
+    queue = IngestQueue(step_repo, thread_repo)
+    with patch.object(settings, "INGEST_MODE", "async"), patch.object(
+        settings, "INGEST_SPOOL_PATH", str(tmp_path / "ingest.spool")
+    ), patch("chainlit_graphql.service.step.ingest_queue", queue), patch(
+        "chainlit_graphql.service.thread.ingest_queue", queue
+    ):
+        yield queue
+
+
+@pytest.mark.asyncio
+async def test_async_ingestion_acknowledges_and_drains(prepare_db, async_ingestion):
+    async with db.SessionLocal() as session:
+        session.add(Participant(id="participant-1", identifier="participant"))
+        await session.commit()
+
+    await async_ingestion.start()
+
+    step = await StepService(step_repo).upsert(
+        id="step-1", threadId="thread-1", name="Queued Step"
+    )
+    thread = await ThreadService(thread_repo).upsert_thread(
+        id="thread-1",
+        name="Queued Thread",
+        tags=None,
+        metadata={"key": "value"},
+        participantId="participant-1",
+    )
+
+    assert step.ok is True
+    assert step.message == "Step queued for ingestion"
+    assert thread.id == "thread-1"
+
+    # Shutdown drains the queue into the database
+    await async_ingestion.stop()
+
+    async with db.SessionLocal() as session:
+        db_thread = await session.get(Thread, "thread-1")
+        db_step = await session.get(Step, "step-1")
+        assert db_thread.name == "Queued Thread"
+        assert db_step.thread_id == "thread-1"
+        assert db_step.name == "Queued Step"
+
+
+@pytest.mark.asyncio
+async def test_spool_round_trip(async_ingestion):
+    now = datetime.now(timezone.utc)
+    items = [
+        ("thread", {"id": "thread-1", "name": "Spooled Thread", "tags": []}),
+        ("step", {"id": "step-1", "thread_id": "thread-1", "createdAt": now}),
+    ]
+
+    async_ingestion._write_spool(items)
+
+    assert async_ingestion._read_spool() == items
+    # The spool is consumed once replayed
+    assert async_ingestion._read_spool() == []
+
+
+@pytest.mark.asyncio
+async def test_interrupted_batch_is_spooled(async_ingestion):
+    blocked = asyncio.Event()
+
+    async def upsert_rows(rows):
+        blocked.set()
+        await asyncio.Event().wait()
+
+    with patch.object(settings, "INGEST_DRAIN_TIMEOUT_SECONDS", 0.05), patch.object(
+        async_ingestion.step_repository, "upsert_rows", upsert_rows
+    ):
+        await async_ingestion.start()
+        await async_ingestion.put_step({"id": "step-1", "thread_id": "thread-1"})
+        await blocked.wait()
+        await async_ingestion.stop()
+
+    # The batch the worker was writing when it was cancelled is not lost
+    assert async_ingestion._read_spool() == [
+        ("step", {"id": "step-1", "thread_id": "thread-1"})
+    ]
+
+
+@pytest.mark.asyncio
+async def test_failed_writes_are_retried_then_spooled(async_ingestion):
+    upsert_rows = AsyncMock(side_effect=RuntimeError("database unavailable"))
+    upsert_thread = AsyncMock(side_effect=[RuntimeError("timeout"), None])
+
+    with patch.object(settings, "INGEST_WRITE_ATTEMPTS", 2), patch.object(
+        settings, "INGEST_RETRY_DELAY_MS", 0
+    ), patch.object(
+        async_ingestion.step_repository, "upsert_rows", upsert_rows
+    ), patch.object(
+        async_ingestion.thread_repository, "upsert_thread", upsert_thread
+    ):
+        await async_ingestion.start()
+        await async_ingestion.put_step({"id": "step-1", "thread_id": "thread-1"})
+        await async_ingestion.put_thread({"id": "thread-1", "name": "Retried"})
+        await async_ingestion.stop()
+
+    assert upsert_rows.await_count == 2
+    # The thread was written by its second attempt, only the step is spooled
+    assert upsert_thread.await_count == 2
+    assert async_ingestion._read_spool() == [
+        ("step", {"id": "step-1", "thread_id": "thread-1"})
+    ]
+
+
+@pytest.mark.asyncio
+async def test_spool_is_replayed_in_sync_mode(async_ingestion):
+    async_ingestion._write_spool([("thread", {"id": "thread-1", "name": "Spooled"})])
+
+    upsert_thread = AsyncMock()
+    with patch.object(settings, "INGEST_MODE", "sync"), patch.object(
+        async_ingestion.thread_repository, "upsert_thread", upsert_thread
+    ):
+        await async_ingestion.start()
+
+    assert async_ingestion.running is False
+    upsert_thread.assert_awaited_once_with(id="thread-1", name="Spooled")
+    assert async_ingestion._read_spool() == []
@@ -3,7 +3,11 @@ from unittest.mock import patch, AsyncMock
 from chainlit_graphql.service.score import ScoreService
 from chainlit_graphql.model.score import Score as ModelScore
 from chainlit_graphql.repository.score import score_repo
-from chainlit_graphql.api.v1.graphql.schema.score import ScoreType, Score as SchemaScore
+from chainlit_graphql.api.v1.graphql.schema.score import (
+    ScoreInput,
+    ScoreType,
+    Score as SchemaScore,
+)
 
 
 @pytest.fixture
@@ -57,6 +61,29 @@ async def test_add_score(mock_create, score_service):
     mock_create.assert_awaited_once()
 
 
+@pytest.mark.asyncio
+@patch(
+    "chainlit_graphql.repository.score.ScoreRepository.create_many",
+    new_callable=AsyncMock,
+)
+async def test_add_scores(mock_create_many, score_service):
+    scores = [
+        ScoreInput(name="First", type=ScoreType.AI, value=1.0, stepId="step-1"),
+        ScoreInput(name="Second", type=ScoreType.HUMAN, value=0.5, comment="ok"),
+    ]
+    mock_create_many.side_effect = lambda models: models
+
+    result = await score_service.add_scores(scores)
+
+    assert [score.name for score in result] == ["First", "Second"]
+    assert [score.type for score in result] == ["AI", "HUMAN"]
+    assert result[0].stepId == "step-1"
+    assert result[1].comment == "ok"
+    (models,) = mock_create_many.await_args.args
+    assert all(isinstance(model, ModelScore) for model in models)
+    assert len({model.id for model in models}) == 2
+
+
 # Test for update_score
 @pytest.mark.asyncio
 @patch(
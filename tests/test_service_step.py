@@ -10,6 +10,7 @@ from chainlit_graphql.api.v1.graphql.schema.step import (
     StepType,
     GenerationPayloadInput,
     AttachmentPayloadInput,
+    StepInput,
 )
 import json
 
@@ -70,3 +71,26 @@ async def test_upsert(mock_upsert_step, step_service):
     assert result == mock_step
     # Check if the mock was called correctly, without the 'any' matcher for dates to simplify
     mock_upsert_step.assert_called_once()
+
+
+@pytest.mark.asyncio
+@patch(
+    "chainlit_graphql.repository.step.step_repo.upsert_steps", new_callable=AsyncMock
+)
+async def test_upsert_many(mock_upsert_steps, step_service):
+    now = datetime.now(timezone.utc)
+    mock_step = StepsType(id="step-1", thread_id="thread-1", createdAt=now)
+    mock_upsert_steps.return_value = [mock_step]
+
+    thread_id_encoded = base64.b64encode(b"Thread:thread-1").decode("utf-8")
+    result = await step_service.upsert_many(
+        [StepInput(id="step-1", threadId=thread_id_encoded, type=StepType.llm)]
+    )
+
+    assert result == [mock_step]
+    mock_upsert_steps.assert_called_once()
+    steps, returning = mock_upsert_steps.call_args.args
+    assert returning is None
+    assert steps[0]["id"] == "step-1"
+    assert steps[0]["threadId"] == "thread-1"
+    assert steps[0]["type"] == "llm"
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from unittest.mock import patch, AsyncMock
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.repository.step import step_repo
+from chainlit_graphql.repository.thread import thread_repo
+from chainlit_graphql.service.step import StepService
+from chainlit_graphql.service.ingest_queue import IngestQueue
+from chainlit_graphql.service.step_coalescer import StepCoalescer
+
+
+@pytest.mark.asyncio
+@patch(
+    "chainlit_graphql.repository.step.step_repo.upsert_rows", new_callable=AsyncMock
+)
+async def test_streamed_updates_are_written_once(mock_upsert_rows):
+    coalescer = StepCoalescer(step_repo)
+    with patch.object(settings, "INGEST_MODE", "async"), patch.object(
+        settings, "STEP_COALESCE_WINDOW_MS", 50
+    ), patch("chainlit_graphql.service.step.step_coalescer", coalescer):
+        await coalescer.start()
+
+        step_service = StepService(step_repo)
+        content = ""
+        for token in ["Hello", " streamed", " world"]:
+            content += token
+            step = await step_service.upsert(
+                id="step-1", threadId="thread-1", output={"content": content}
+            )
+            assert step.ok is True
+        await step_service.upsert(id="step-2", threadId="thread-1", name="Other")
+
+        await coalescer.stop()
+
+    # One write for the whole window, holding the last state of each step
+    mock_upsert_rows.assert_awaited_once()
+    (rows,) = mock_upsert_rows.call_args.args
+    assert [row["id"] for row in rows] == ["step-1", "step-2"]
+    assert rows[0]["output"] == {"content": "Hello streamed world"}
+
+
+@pytest.mark.asyncio
+async def test_coalescer_disabled_by_default():
+    coalescer = StepCoalescer(step_repo)
+    await coalescer.start()
+    assert coalescer.running is False
+
+
+@pytest.mark.asyncio
+@patch(
+    "chainlit_graphql.repository.step.step_repo.upsert_step", new_callable=AsyncMock
+)
+async def test_sync_mode_writes_before_acknowledging(mock_upsert_step):
+    coalescer = StepCoalescer(step_repo)
+    with patch.object(settings, "INGEST_MODE", "sync"), patch.object(
+        settings, "STEP_COALESCE_WINDOW_MS", 50
+    ), patch("chainlit_graphql.service.step.step_coalescer", coalescer):
+        await coalescer.start()
+        assert coalescer.running is False
+
+        await StepService(step_repo).upsert(id="step-1", threadId="thread-1")
+        mock_upsert_step.assert_awaited_once()
+        await coalescer.stop()
+
+
+@pytest.mark.asyncio
+async def test_updates_received_while_writing_are_flushed():
+    writing = asyncio.Event()
+    release = asyncio.Event()
+    written = []
+
+    async def upsert_rows(rows):
+        written.append(rows)
+        if len(written) == 1:
+            writing.set()
+            await release.wait()
+
+    coalescer = StepCoalescer(step_repo)
+    with patch.object(settings, "INGEST_MODE", "async"), patch.object(
+        settings, "STEP_COALESCE_WINDOW_MS", 10
+    ), patch.object(step_repo, "upsert_rows", upsert_rows):
+        await coalescer.start()
+        await coalescer.put_step({"id": "step-1", "output": {"content": "Hello"}})
+        await writing.wait()
+
+        # Lands while the first window is being written
+        await coalescer.put_step({"id": "step-1", "output": {"content": "Hello world"}})
+        release.set()
+        await asyncio.wait_for(coalescer._flush_task, timeout=1)
+
+        assert [rows[0]["output"]["content"] for rows in written] == [
+            "Hello",
+            "Hello world",
+        ]
+        await coalescer.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_write_is_retried_then_spooled(tmp_path):
+    upsert_rows = AsyncMock(side_effect=RuntimeError("database unavailable"))
+    coalescer = StepCoalescer(step_repo)
+    queue = IngestQueue(step_repo, thread_repo)
+    with patch.object(settings, "INGEST_MODE", "async"), patch.object(
+        settings, "STEP_COALESCE_WINDOW_MS", 10
+    ), patch.object(settings, "INGEST_WRITE_ATTEMPTS", 2), patch.object(
+        settings, "INGEST_SPOOL_PATH", str(tmp_path / "ingest.spool")
+    ), patch.object(
+        step_repo, "upsert_rows", upsert_rows
+    ), patch(
+        "chainlit_graphql.service.step_coalescer.ingest_queue", queue
+    ):
+        await coalescer.start()
+        await coalescer.put_step({"id": "step-1", "thread_id": "thread-1"})
+        await asyncio.wait_for(coalescer._flush_task, timeout=1)
+
+        # Retried with the next window, then kept for the next start
+        assert upsert_rows.await_count == 2
+        assert queue._read_spool() == [
+            ("step", {"id": "step-1", "thread_id": "thread-1"})
+        ]
+        await coalescer.stop()
@@ -1,9 +1,23 @@
 import pytest
 import json
 from unittest.mock import patch, AsyncMock
-from chainlit_graphql.service.thread import ThreadService
+from sqlalchemy import update
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.service.thread import ThreadService, _thread_counts
 from chainlit_graphql.repository.thread import thread_repo
 from chainlit_graphql.api.v1.graphql.schema.thread import ThreadConnection, ThreadType
+from chainlit_graphql.api.v1.graphql.schema.score import ScoreType
+from chainlit_graphql.api.v1.graphql.selection import ThreadProjection
+from chainlit_graphql.core.thread_cache import (
+    MemoryThreadCacheBackend,
+    ThreadCacheBackend,
+)
+from chainlit_graphql.db.database import db
+from chainlit_graphql.model import Thread
+from chainlit_graphql.model.thread import THREAD_VERSION_SEQUENCE
+from chainlit_graphql.repository.score import score_repo
+from chainlit_graphql.repository.step import step_repo
+from chainlit_graphql.service.score import ScoreService
 
 
 @pytest.fixture
@@ -57,6 +71,47 @@ async def test_get_threads_paginated(mock_get_paginated_threads, thread_service)
     mock_get_paginated_threads.assert_called_once()
 
 
+@pytest.mark.asyncio
+@patch(
+    "chainlit_graphql.repository.thread.thread_repo.count_threads",
+    new_callable=AsyncMock,
+)
+@patch(
+    "chainlit_graphql.repository.thread.thread_repo.get_paginated_threads",
+    new_callable=AsyncMock,
+)
+async def test_total_count_is_lazy_and_cached(
+    mock_get_paginated_threads, mock_count_threads, thread_service
+):
+    _thread_counts.clear()
+    mock_get_paginated_threads.side_effect = lambda **kwargs: ThreadConnection(
+        page_info=None, edges=[]
+    )
+    mock_count_threads.return_value = 42
+
+    connection = await thread_service.get_threads_paginated(projectId="project-1")
+    # Nothing is counted until totalCount is resolved
+    mock_count_threads.assert_not_called()
+
+    assert await connection.total_count() == 42
+    connection = await thread_service.get_threads_paginated(projectId="project-1")
+    assert await connection.total_count() == 42
+    mock_count_threads.assert_awaited_once_with(
+        cursorAnchor=None, filters=None, estimated=False
+    )
+
+    # Another project, or the estimated mode, is counted on its own
+    connection = await thread_service.get_threads_paginated(projectId="project-2")
+    assert await connection.total_count() == 42
+    assert await connection.total_count(estimated=True) == 42
+    assert mock_count_threads.await_count == 3
+
+    # Counts expire after the TTL
+    with patch.object(settings, "THREAD_COUNT_CACHE_TTL_SECONDS", 0):
+        assert await connection.total_count() == 42
+    assert mock_count_threads.await_count == 4
+
+
 # Test for get_by_id
 @pytest.mark.asyncio
 @patch(
@@ -69,7 +124,7 @@ async def test_get_by_id(mock_get_by_id, thread_service):
 
     result = await thread_service.get_by_id("123")
     assert result == mock_thread
-    mock_get_by_id.assert_called_once_with("123")
+    mock_get_by_id.assert_called_once_with("123", None)
 
 
 # Test for upsert_thread
@@ -109,3 +164,85 @@ async def test_delete(mock_delete, thread_service):
     result = await thread_service.delete("123")
     assert result == mock_thread
     mock_delete.assert_called_once_with("123")
+
+
+@pytest.mark.asyncio
+async def test_get_by_id_is_cached_until_the_thread_changes(thread_service):
+    async with db.SessionLocal() as session:
+        session.add(Thread(id="t1", name="First"))
+        await session.commit()
+
+    projection = ThreadProjection(
+        ["id", "name", "createdAt", "participant_id"],
+        step_columns=["id", "thread_id", "createdAt"],
+        step_scores=True,
+    )
+    loads = []
+    load = thread_repo._get_by_id_with_session
+
+    async def counted(*args):
+        loads.append(args)
+        return await load(*args)
+
+    with patch.object(thread_repo, "_get_by_id_with_session", counted):
+
+        async def get():
+            return await thread_service.get_by_id("t1", projection)
+
+        async def name():
+            return (await get()).name
+
+        assert await name() == "First"
+        assert await name() == "First"
+        assert len(loads) == 1
+
+        # Each write through the repositories invalidates the thread
+        await thread_repo.upsert_thread("t1", "Renamed", None, None)
+        assert await name() == "Renamed"
+        await step_repo.upsert_step(id="s1", threadId="t1")
+        assert len((await get()).preloaded_steps) == 1
+        score_service = ScoreService(score_repository=score_repo)
+        await score_service.add_score(
+            name="quality",
+            type=ScoreType.HUMAN,
+            value=1.0,
+            stepId="s1",
+            generationId=None,
+            datasetExperimentItemId=None,
+            comment=None,
+            tags=None,
+        )
+        (step,) = (await get()).preloaded_steps
+        assert step.preloaded_scores[0].value == 1.0
+        assert len(loads) == 4
+
+        # A write by another replica gives the thread a new version as well
+        async with db.SessionLocal() as session:
+            await session.execute(
+                update(Thread)
+                .where(Thread.id == "t1")
+                .values(name="Elsewhere", version=THREAD_VERSION_SEQUENCE.next_value())
+            )
+            await session.commit()
+        assert await name() == "Elsewhere"
+        assert len(loads) == 5
+
+        await thread_repo.delete("t1")
+        assert await get() is None
+
+
+@pytest.mark.asyncio
+async def test_memory_thread_cache_is_bounded_by_bytes():
+    backend = MemoryThreadCacheBackend(max_bytes=10)
+    await backend.set("a", b"12345", ttl=60)
+    await backend.set("b", b"12345", ttl=60)
+    assert await backend.get("a") == b"12345"
+    # "b" is the least recently used
+    await backend.set("c", b"123", ttl=60)
+    assert (await backend.get("b"), backend.size) == (None, 8)
+    await backend.set("d", b"12345678901", ttl=60)
+    assert await backend.get("d") is None
+
+    # Shared backends implement get and set
+    with pytest.raises(TypeError):
+        ThreadCacheBackend()
@@ -0,0 +1,77 @@
+import json
+import pytest
+from unittest.mock import patch
+from datetime import datetime, timedelta, timezone
+from chainlit_graphql.core.config import settings
+from chainlit_graphql.db.database import db
+from chainlit_graphql.model import Participant, Score, Step, Thread
+from chainlit_graphql.repository.thread_stream import thread_stream_repo
+from chainlit_graphql.service.thread_stream import ThreadStreamService
+
+
+async def _stream(id):
+    thread_stream_service = ThreadStreamService(thread_stream_repo)
+    return [chunk async for chunk in thread_stream_service.stream_thread_detail(id)]
+
+
+def _payloads(chunks):
+    body = "".join(chunks)
+    assert body.endswith("\r\n-----\r\n")
+    parts = body[: -len("\r\n-----\r\n")].split("\r\n---\r\n")[1:]
+    return [json.loads(part.split("\r\n\r\n", 1)[1]) for part in parts]
+
+
+@pytest.mark.asyncio
+async def test_stream_thread_detail(prepare_db):
+    now = datetime.now(timezone.utc)
+    async with db.SessionLocal() as session:
+        participant = Participant(id="participant-1", identifier="user", createdAt=now)
+        thread = Thread(
+            id="thread-1", name="Streamed", participant=participant, createdAt=now
+        )
+        steps = [
+            Step(
+                id=f"step-{i}",
+                thread=thread,
+                output={"content": str(i)},
+                generation={"tokenCount": i} if i == 2 else None,
+                createdAt=now + timedelta(seconds=i),
+            )
+            for i in range(3)
+        ]
+        score = Score(id="score-1", name="quality", value=1.0, step=steps[1])
+        session.add_all([participant, thread, *steps, score])
+        await session.commit()
+
+    with patch.object(settings, "THREAD_STREAM_CHUNK_SIZE", 2):
+        chunks = await _stream("thread-1")
+
+    # The header is sent before any step is read
+    header, *increments, last = _payloads(chunks)
+    detail = header["data"]["threadDetail"]
+    assert header["hasNext"] is True
+    assert (detail["name"], detail["steps"]) == ("Streamed", [])
+    assert detail["participant"]["identifier"] == "user"
+
+    assert [increment["incremental"][0]["path"] for increment in increments] == [
+        ["threadDetail", "steps", 0],
+        ["threadDetail", "steps", 2],
+    ]
+    items = [
+        item
+        for increment in increments
+        for item in increment["incremental"][0]["items"]
+    ]
+    assert [item["id"] for item in items] == ["step-0", "step-1", "step-2"]
+    assert items[0]["output"] == {"content": "0"}
+    assert items[1]["scores"][0]["value"] == 1.0
+    assert items[2]["generation"]["tokenCount"] == 2
+    assert datetime.fromisoformat(items[0]["createdAt"]) == now
+    assert last == {"hasNext": False}
+
+
+@pytest.mark.asyncio
+async def test_stream_missing_thread(prepare_db):
+    assert _payloads(await _stream("missing")) == [
+        {"data": {"threadDetail": None}, "hasNext": False}
+    ]